@@ -29,6 +29,7 @@ public class EndEffectorNoPenetration : MonoBehaviour
 
     public bool IsContacting { get; private set; }
     public int  BumpCount    { get; private set; }
+    public Vector3 DesiredTip { get; private set; }   // 本帧夹紧前的期望位置（供 TrajectoryLogger 记录）
 
     Vector3 _lastSafeTip, _lastSafeRoot;
     bool    _initialized = false, _wasContacting = false;
@@ -42,6 +43,7 @@ public class EndEffectorNoPenetration : MonoBehaviour
     void LateUpdate()
     {
         if (droneRoot == null || tip == null) return;
+        DesiredTip = tip.position;
 
         Vector3 up = tip.up;
         Vector3 back = -up;
@@ -0,0 +1,110 @@
+// TrajectoryLogger.cs
+using System;
+using System.IO;
+using UnityEngine;
+
+// 逐帧轨迹日志（二进制定长记录，Python 端 aerial_analysis.trajectory 直接内存映射读取）。
+// 文件头 32 字节：magic "AMTRAJ\0\x01", version(u16), record_size(u16), flags(u32), t0_unix(f64), reserved(u64)
+// 每帧一条 64 字节记录（小端，version 2）：
+//   t(f64) trial(u32) frame(u32) tip.xyz(3×f32) drone.xyz(3×f32) gap(f32) contact(u8) mode(u8) reserved(u16)
+//   desired.xyz(3×f32，夹紧前的期望末端位置，离线重放用) reserved(u32)
+[DisallowMultipleComponent]
+[DefaultExecutionOrder(10001)] // 在 EndEffectorNoPenetration（10000）夹紧之后记录
+public class TrajectoryLogger : MonoBehaviour
+{
+    const int Version = 2;
+    const int RecordSize = 64;
+    static readonly byte[] Magic = { (byte)'A', (byte)'M', (byte)'T', (byte)'R', (byte)'A', (byte)'J', 0, 1 };
+
+    [Header("对象引用")]
+    public DroneController drone;
+    public EndEffectorNoPenetration endEffector;
+
+    [Header("输出")]
+    [Tooltip("相对 Application.persistentDataPath；为空则为 trajectory_<时间>.amtraj")]
+    public string fileName = "";
+    [Tooltip("每隔多少秒把缓冲写到磁盘（便于实验中途读取）")]
+    public float flushInterval = 0.25f;
+
+    [Header("gap 测量（与 CSV 的 gap_to_wall 同口径：球面到最近墙面的距离）")]
+    public float maxGapSearch = 2f;
+
+    [Header("当前试次（由实验流程脚本设置）")]
+    public int trialId = 0;
+
+    public string FilePath { get; private set; }
+
+    BinaryWriter _writer;
+    float _lastFlush;
+    Collider[] _nearCache = new Collider[16];
+
+    void OnEnable()
+    {
+        string name = string.IsNullOrEmpty(fileName)
+            ? $"trajectory_{DateTime.Now:yyyyMMdd_HHmmss}.amtraj"
+            : fileName;
+        FilePath = Path.Combine(Application.persistentDataPath, name);
+        var stream = new FileStream(FilePath, FileMode.Create, FileAccess.Write, FileShare.Read, 1 << 16);
+        _writer = new BinaryWriter(stream);
+        _writer.Write(Magic);
+        _writer.Write((ushort)Version);
+        _writer.Write((ushort)RecordSize);
+        _writer.Write(0u);
+        _writer.Write((DateTime.UtcNow - new DateTime(1970, 1, 1)).TotalSeconds - Time.timeAsDouble);
+        _writer.Write(0ul);
+        _writer.Flush();
+        _lastFlush = Time.unscaledTime;
+    }
+
+    void OnDisable()
+    {
+        if (_writer == null) return;
+        _writer.Flush();
+        _writer.Dispose();
+        _writer = null;
+    }
+
+    void LateUpdate()
+    {
+        if (_writer == null || endEffector == null || endEffector.tip == null) return;
+
+        Vector3 tip = endEffector.tip.position;
+        Vector3 root = endEffector.droneRoot != null ? endEffector.droneRoot.position : Vector3.zero;
+        bool contact = endEffector.IsContacting;
+
+        _writer.Write(Time.timeAsDouble);
+        _writer.Write((uint)trialId);
+        _writer.Write((uint)Time.frameCount);
+        _writer.Write(tip.x); _writer.Write(tip.y); _writer.Write(tip.z);
+        _writer.Write(root.x); _writer.Write(root.y); _writer.Write(root.z);
+        _writer.Write(contact ? 0f : MeasureGap(tip));
+        _writer.Write((byte)(contact ? 1 : 0));
+        _writer.Write((byte)(drone != null && drone.ControlModeName == "Arm" ? 1 : 0));
+        _writer.Write((ushort)0);
+        Vector3 desired = endEffector.DesiredTip;
+        _writer.Write(desired.x); _writer.Write(desired.y); _writer.Write(desired.z);
+        _writer.Write(0u);
+
+        if (Time.unscaledTime - _lastFlush >= flushInterval)
+        {
+            _writer.Flush();
+            _lastFlush = Time.unscaledTime;
+        }
+    }
+
+    float MeasureGap(Vector3 tip)
+    {
+        float r = endEffector.radius;
+        int n = Physics.OverlapSphereNonAlloc(tip, r + maxGapSearch, _nearCache, endEffector.wallMask,
+            endEffector.includeTriggersAsWalls ? QueryTriggerInteraction.Collide : QueryTriggerInteraction.Ignore);
+        float best = float.PositiveInfinity;
+        for (int i = 0; i < n; i++)
+        {
+            var c = _nearCache[i];
+            if (endEffector.droneRoot != null && c.transform.IsChildOf(endEffector.droneRoot)) continue;
+            float d = Vector3.Distance(tip, c.ClosestPoint(tip)) - r;
+            if (d < best) best = d;
+        }
+        return float.IsPositiveInfinity(best) ? float.NaN : Mathf.Max(0f, best);
+    }
+}
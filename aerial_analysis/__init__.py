@@ -0,0 +1,13 @@
+"""
+Analysis package for the aerial-manipulation feedback study.
+
+Stages are plain functions in ``objective`` (Unity trial log) and
+``subjective`` (questionnaire workbook); ``python -m aerial_analysis`` runs
+them from the command line.  Importing the package does not import
+matplotlib or scipy -- those are loaded by the stages that need them.
+"""
+
+from .modes import CONDITION_ORDER, normalize_modes, reorder_columns
+from .objective import compute_metrics
+
+__all__ = ["CONDITION_ORDER", "normalize_modes", "reorder_columns", "compute_metrics"]
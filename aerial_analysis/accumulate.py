@@ -0,0 +1,110 @@
+# accumulate.py
+# Per-(participant, mode) trial accumulators shared by the streaming,
+# incremental and live-tail ingest paths: chunks of the trial CSV are folded
+# into counts and sorted buffers of successful gaps, from which the same wide
+# tables as objective.trial_tables (and, via curves.state_groups, the same
+# precision curves) are produced.
+
+import numpy as np
+import pandas as pd
+
+from .modes import normalize_modes, reorder_columns
+
+CSV_COLUMNS = ["participant", "mode", "failure", "gap_to_wall"]
+
+def read_chunks(source, chunksize, **kwargs):
+    """分块读取试次 CSV（participant/mode/failure 读为 category）"""
+    return pd.read_csv(
+        source, chunksize=chunksize, usecols=CSV_COLUMNS,
+        dtype={"participant": "category", "mode": "category", "failure": "category"},
+        keep_default_na=False,   # "None" 是条件名，不能被当成缺失值
+        **kwargs,
+    )
+
+def new_state():
+    """
+    空累加器：
+    counts:   (participant, mode) -> [n_trials, n_fail, n_success]
+    gaps:     (participant, mode) -> [np.ndarray, ...]（新折叠进来的成功试次 gap，未排序）
+    sorted:   (participant, mode) -> np.ndarray（已归并、排序的成功试次 gap）
+    mappings: 原始 mode 拼写 -> normalize_modes 的映射记录
+    dirty:    自上次 group_rows 以来有新试次的 (participant, mode)
+    """
+    return {"counts": {}, "gaps": {}, "sorted": {}, "mappings": {}, "dirty": set()}
+
+def _category_lookup(col, names):
+    """category 列 -> (每行的名字下标, 清洗后的名字表)"""
+    return col.cat.codes.to_numpy().astype(np.int64), list(names)
+
+def fold_chunk(state, chunk):
+    """
+    把一块试次折叠进累加器。字符串清洗只作用在该块的 categories 上，
+    failure 折算为布尔（yes=失败，no=成功，其余两者皆非）。
+    """
+    counts, gaps = state["counts"], state["gaps"]
+    p_codes, p_names = _category_lookup(
+        chunk["participant"], chunk["participant"].cat.categories.astype(str).str.strip())
+    m_cats = normalize_modes(pd.DataFrame({"mode": chunk["mode"].cat.categories}), "mode")
+    m_codes, m_names = _category_lookup(chunk["mode"], m_cats["mode"])
+    for rec in m_cats.attrs["mode_mapping"]:
+        state["mappings"].setdefault(rec["raw"], rec)
+    f_codes, f_names = _category_lookup(
+        chunk["failure"], chunk["failure"].cat.categories.astype(str).str.strip().str.lower())
+    f_names = np.asarray(f_names)
+    is_fail = (f_names == "yes")[f_codes]
+    is_succ = (f_names == "no")[f_codes]
+    gap = pd.to_numeric(chunk["gap_to_wall"], errors="coerce").to_numpy(float)
+
+    n_m = len(m_names)
+    key = p_codes * n_m + m_codes
+    size = len(p_names) * n_m
+    n_all = np.bincount(key, minlength=size)
+    n_fail = np.bincount(key, weights=is_fail, minlength=size)
+    n_succ = np.bincount(key, weights=is_succ, minlength=size)
+    for k in np.flatnonzero(n_all):
+        name = (p_names[k // n_m], m_names[k % n_m])
+        acc = counts.setdefault(name, [0, 0, 0])
+        acc[0] += int(n_all[k]); acc[1] += int(n_fail[k]); acc[2] += int(n_succ[k])
+        state["dirty"].add(name)
+
+    keep = is_succ & ~np.isnan(gap)
+    k_keep, g_keep = key[keep], gap[keep]
+    order = np.argsort(k_keep, kind="stable")
+    k_keep, g_keep = k_keep[order], g_keep[order]
+    uniq, starts = np.unique(k_keep, return_index=True)
+    for k, part in zip(uniq, np.split(g_keep, starts[1:])):
+        gaps.setdefault((p_names[k // n_m], m_names[k % n_m]), []).append(part)
+
+def sorted_gaps(state, key):
+    """该组全部成功 gap（已排序）；新缓冲先排序再归并进已排序数组"""
+    merged = state["sorted"].get(key, np.empty(0))
+    parts = state["gaps"].pop(key, None)
+    if parts:
+        new = np.sort(np.concatenate(parts))
+        merged = np.insert(merged, np.searchsorted(merged, new), new)
+        state["sorted"][key] = merged
+    return merged
+
+def group_row(state, key):
+    """一个 (participant, mode) 组的汇总行（Precision@delta 见 curves.state_groups）"""
+    n, n_fail, n_succ = state["counts"][key]
+    g = sorted_gaps(state, key)
+    return {"participant": key[0], "mode": key[1], "n_trials": n,
+            "collision_rate": n_fail / n, "n_success": n_succ,
+            "median_safe_distance": float(np.median(g)) if len(g) else np.nan}
+
+def group_rows(state, keys=None):
+    """汇总行（keys=None 为全部组）；处理过的组从 dirty 中移除"""
+    keys = list(state["counts"]) if keys is None else list(keys)
+    state["dirty"].difference_update(keys)
+    return [group_row(state, k) for k in keys]
+
+def wide_tables(agg, mappings=()):
+    """汇总行表 -> coll_wide, prec_wide（与 trial_tables 相同的宽表）"""
+    def wide_of(frame, value):
+        return reorder_columns(frame.pivot(index="participant", columns="mode", values=value))
+
+    coll_wide = wide_of(agg, "collision_rate")
+    prec_wide = wide_of(agg[agg["n_success"] > 0], "median_safe_distance")
+    coll_wide.attrs["mode_mapping"] = list(mappings)
+    return coll_wide, prec_wide
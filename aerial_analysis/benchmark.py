@@ -0,0 +1,142 @@
+# benchmark.py
+# Scaling benchmarks for both pipelines on synthetic inputs (synthetic.py).
+# Each stage is timed separately at every input size and the results are
+# written as JSON, so runs on the same machine can be compared against a
+# baseline file and hot-path regressions flagged.
+
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from . import objective, subjective
+from .bootstrap import N_BOOT
+from .instrument import machine_info
+from .modes import fuzzy_mode_report
+from .synthetic import synth_questionnaire, synth_trials
+
+OBJECTIVE_SIZES = [10, 100, 1_000, 10_000, 100_000, 1_000_000]   # 试次数
+SUBJECTIVE_SIZES = [10, 100, 1_000, 10_000]                      # 问卷人数
+BENCH_DIR = "benchmarks"
+REGRESSION_TOLERANCE = 1.5   # 比基线慢 50% 以上算回退
+MIN_SECONDS = 0.05           # 基线短于此的阶段不比较（计时噪声）
+
+def _timed(records, base, stage, func, repeat=1, rows=None):
+    """运行 func repeat 次并记录最短耗时；rows 为行数或 结果 -> 行数 的函数；返回最后一次的结果"""
+    best = np.inf
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        out = func()
+        best = min(best, time.perf_counter() - t0)
+    n = rows(out) if callable(rows) else rows
+    records.append({**base, "stage": stage, "seconds": round(best, 6),
+                    "rows": None if n is None else int(n)})
+    return out
+
+def bench_objective(n_trials, workdir, seed=0, repeat=1, n_boot=N_BOOT, plots=True, workers=None):
+    """客观分析各阶段：generate / load / normalize / metrics / stream_ingest / stats / export / plot"""
+    rec, base = [], {"pipeline": "objective", "size": n_trials}
+    path = os.path.join(workdir, f"trials_{n_trials}.csv")
+    _timed(rec, base, "generate", lambda: synth_trials(n_trials, seed=seed, path=path), rows=n_trials)
+    raw = _timed(rec, base, "load", lambda: objective.read_trials(path), repeat, rows=len)
+    # normalize_modes 原地改列，每次在副本上做
+    df = _timed(rec, base, "normalize", lambda: objective.normalize_trials(raw.copy()), repeat, rows=len)
+    metrics = _timed(rec, base, "metrics",
+                     lambda: objective.metric_tables(*objective.trial_tables(df)), repeat, rows=len(df))
+    metrics["mode_report"] = fuzzy_mode_report(df)
+    _timed(rec, base, "stream_ingest", lambda: objective.stream_trial_tables(path), repeat,
+           rows=n_trials)
+
+    n_p = len(metrics["coll_wide"])
+    stats = _timed(rec, base, "stats",
+                   lambda: objective.compute_stats(metrics, n_boot=n_boot, seed=seed), repeat, rows=n_p)
+    outdir = os.path.join(workdir, f"objective_{n_trials}")
+    os.makedirs(outdir, exist_ok=True)
+    _timed(rec, base, "export", lambda: objective.export_tables(outdir, metrics, stats), repeat, rows=n_p)
+    if plots:
+        _timed(rec, base, "plot", lambda: objective.plot_figures(
+            outdir, metrics, stats, cache_dir=None, workers=workers), repeat, rows=n_p)
+    return rec
+
+def bench_subjective(n_respondents, workdir, seed=0, repeat=1, plots=True, workers=None):
+    """主观问卷各阶段：generate / load / headers / reshape / code_preferences / describe / stats / export / plot"""
+    rec, base = [], {"pipeline": "subjective", "size": n_respondents}
+    path = os.path.join(workdir, f"questionnaire_{n_respondents}.xlsx")
+    _timed(rec, base, "generate", lambda: synth_questionnaire(n_respondents, seed=seed, path=path),
+           rows=n_respondents)
+    df = _timed(rec, base, "load", lambda: subjective.read_workbook(path, cache_dir=None), repeat,
+                rows=len)
+    hidx = _timed(rec, base, "headers", lambda: subjective.header_index(df.columns), repeat,
+                  rows=len(df.columns))
+    long, help_long = _timed(
+        rec, base, "reshape",
+        lambda: (subjective.build_long(df, hidx), subjective.build_help_long(df, hidx)),
+        repeat, rows=len(df))
+    pref = _timed(rec, base, "code_preferences",
+                  lambda: subjective.code_preferences(subjective.pref_texts(df, hidx)), repeat,
+                  rows=len(df))
+    desc = _timed(rec, base, "describe", lambda: subjective.describe(long, help_long, pref), repeat,
+                  rows=len(long))
+    stats = _timed(rec, base, "stats", lambda: subjective.run_all_stats(long, help_long), repeat,
+                   rows=len(long))
+    outdir = os.path.join(workdir, f"subjective_{n_respondents}")
+    os.makedirs(outdir, exist_ok=True)
+    _timed(rec, base, "export",
+           lambda: subjective.export_tables(outdir, long, help_long, desc, stats, hidx, pref), repeat,
+           rows=len(long))
+    if plots:
+        _timed(rec, base, "plot", lambda: subjective.plot_figures(
+            outdir, long, help_long, cache_dir=None, workers=workers), repeat, rows=len(long))
+    return rec
+
+def run_benchmarks(objective_sizes=OBJECTIVE_SIZES, subjective_sizes=SUBJECTIVE_SIZES, out=None,
+                   workdir=None, seed=0, repeat=1, n_boot=N_BOOT, plots=True, workers=None,
+                   verbose=True):
+    """
+    依次跑两条流程的各个规模，结果写成 JSON：
+    {"meta": {...环境与参数}, "results": [{pipeline, size, stage, seconds, rows}, ...]}。
+    workdir=None 时合成数据与输出放在临时目录并在结束后删除。返回结果字典。
+    """
+    if out is None:
+        out = os.path.join(BENCH_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    meta = {"created": datetime.now().isoformat(timespec="seconds"), "seed": seed,
+            "repeat": repeat, "n_boot": n_boot, "plots": plots, "workers": workers,
+            **machine_info()}
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        jobs = [(bench_objective, n, {"n_boot": n_boot}) for n in objective_sizes]
+        jobs += [(bench_subjective, n, {}) for n in subjective_sizes]
+        for func, n, extra in jobs:
+            rec = func(n, workdir, seed=seed, repeat=repeat, plots=plots, workers=workers, **extra)
+            results += rec
+            if verbose:
+                stages = "  ".join(f"{r['stage']}={r['seconds']:.3f}s" for r in rec)
+                print(f"{rec[0]['pipeline']:>10} n={n:<8} {stages}")
+
+    result = {"meta": meta, "results": results}
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=1)
+    if verbose:
+        print(f"\nBenchmark results -> {out}")
+    return result
+
+def compare(result, baseline, tolerance=REGRESSION_TOLERANCE, min_seconds=MIN_SECONDS):
+    """
+    与基线结果比较，返回慢于 tolerance × 基线的阶段（DataFrame：pipeline, size, stage,
+    seconds, baseline, ratio）；generate 阶段与基线短于 min_seconds 的阶段不比较。
+    """
+    key = ["pipeline", "size", "stage"]
+    cur = pd.DataFrame(result["results"])
+    base = pd.DataFrame(baseline["results"])[key + ["seconds"]].rename(columns={"seconds": "baseline"})
+    both = cur.merge(base, on=key)
+    both = both[(both["stage"] != "generate") & (both["baseline"] >= min_seconds)]
+    both["ratio"] = both["seconds"] / both["baseline"]
+    slow = both[both["ratio"] > tolerance]
+    return slow[key + ["seconds", "baseline", "ratio"]].reset_index(drop=True)
@@ -0,0 +1,199 @@
+# bootstrap.py
+# Batched, memory-bounded bootstrap CIs: a participant-level bootstrap of
+# per-participant metric tables, and a hierarchical (participants, then
+# trials) bootstrap of the trial-level metrics in which both levels are
+# drawn as multinomial count weights instead of materialized resamples.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+N_BOOT = 5000                     # 论文终稿可调到 50000
+BOOT_CHUNK_BYTES = 64 * 2**20     # bootstrap 每块重抽样矩阵的内存上限
+POOL_MIN_DRAWS = 5 * 10**7        # 抽样量（重抽样次数 × 参与者 × 类别）超过此值才开进程池
+
+def bootstrap_ci_table(tables, n_boot=N_BOOT, alpha=0.05, rng=None,
+                       max_chunk_bytes=BOOT_CHUNK_BYTES):
+    """
+    批量 Bootstrap mean ±CI：一次性处理所有宽表的所有列（自动忽略NaN）。
+    tables: {metric: wide}，wide 的 index=participant, columns=conditions。
+    有效样本量 n 相同的列共享同一组重抽样下标；重抽样按块进行
+    （每块约 max_chunk_bytes），用计数矩阵 @ 数据 代替 (n_boot, n) 的拷贝。
+    返回 index=(metric, condition)，columns=[mean, ci_lo, ci_hi, n]。
+    """
+    rng = np.random.default_rng(rng)
+    keys, cols = [], []
+    for name, wide in tables.items():
+        for c in wide.columns:
+            v = np.asarray(wide[c].values, float)
+            keys.append((name, c))
+            cols.append(v[~np.isnan(v)])
+    ns = np.array([len(v) for v in cols], dtype=int)
+    stats = np.full((len(cols), 3), np.nan)
+
+    for n in np.unique(ns[ns > 0]):
+        sel = np.flatnonzero(ns == n)
+        vals = np.column_stack([cols[j] for j in sel])          # (n, k)
+        boots = np.empty((n_boot, len(sel)))
+        step = max(1, int(max_chunk_bytes // (16 * n)))         # int64 下标 + 计数
+        for start in range(0, n_boot, step):
+            m = min(step, n_boot - start)
+            idx = rng.integers(0, n, size=(m, n))
+            idx += np.arange(m)[:, None] * n
+            counts = np.bincount(idx.ravel(), minlength=m * n).reshape(m, n)
+            boots[start:start + m] = counts @ vals / n
+        lo, hi = np.quantile(boots, [alpha/2, 1-alpha/2], axis=0)
+        stats[sel, 0] = vals.mean(axis=0)
+        stats[sel, 1] = lo
+        stats[sel, 2] = hi
+
+    index = pd.MultiIndex.from_tuples(keys, names=["metric", "condition"])
+    return pd.DataFrame({"mean": stats[:, 0], "ci_lo": stats[:, 1],
+                         "ci_hi": stats[:, 2], "n": ns}, index=index)
+
+def bootstrap_mean_ci(arr, n_boot=N_BOOT, alpha=0.05, rng=None):
+    """Bootstrap mean ±95%CI（单列；自动忽略NaN）"""
+    row = bootstrap_ci_table({"x": pd.DataFrame({"x": np.asarray(arr, float)})},
+                             n_boot=n_boot, alpha=alpha, rng=rng).iloc[0]
+    return float(row["mean"]), (float(row["ci_lo"]), float(row["ci_hi"]))
+
+# ---------- 分层（participant → trial）bootstrap ----------
+def _median_sampler(gaps):
+    """
+    对已排序的 s 个成功 gap 有放回重抽 s 个后的中位数的精确分布（不生成重抽样本）。
+    N_j = 重抽中下标 <= j 的个数 ~ Bin(s, j/s)，第 r 个次序统计量 <= g_j 当且仅当 N_j >= r。
+    s 为偶数时中位数 = (X_(r) + X_(r+1)) / 2，r = s/2：先按边缘分布抽 X_(r) 的下标 i，
+    再以 p_same[i] 的概率取 X_(r+1) = g_i，否则为其余 r 个落在 i 之后的抽样的最小值。
+    返回 {"gaps", "cdf", "p_same"}（奇数时 p_same 为 None）。
+    """
+    from scipy.special import gammaln
+    from scipy.stats import binom
+
+    s = len(gaps)
+    j = np.arange(s + 1)
+    r = (s + 1) // 2 if s % 2 else s // 2
+    cdf = binom.sf(r - 1, s, j / s)                   # P(X_(r) 的下标 <= j)
+    cdf[0], cdf[-1] = 0.0, 1.0
+    if s % 2:
+        return {"gaps": gaps, "cdf": cdf, "p_same": None}
+    i = np.arange(1, s + 1)
+    with np.errstate(divide="ignore"):
+        both_r = np.exp(gammaln(s + 1) - 2 * gammaln(r + 1)
+                        + r * np.log((i - 1) / s) + r * np.log((s - i) / s))
+    # P(N_{i-1} <= r-1, N_i >= r+1) / P(X_(r) 的下标 = i)
+    num = binom.cdf(r - 1, s, (i - 1) / s) - binom.cdf(r, s, i / s) + both_r
+    den = np.diff(cdf)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p_same = np.where(den > 0, np.clip(num / den, 0.0, 1.0), 1.0)
+    return {"gaps": gaps, "cdf": cdf, "p_same": p_same}
+
+def sample_boot_medians(sampler, size, rng):
+    """从 _median_sampler 的分布中抽 size 个重抽样中位数"""
+    gaps, cdf, p_same = sampler["gaps"], sampler["cdf"], sampler["p_same"]
+    i = np.searchsorted(cdf, rng.random(size), side="right")      # 1..s
+    if p_same is None:
+        return gaps[i - 1]
+    s, r = len(gaps), len(gaps) // 2
+    same = rng.random(size) < p_same[i - 1]
+    m = np.maximum(s - i, 1)                       # i 之后的下标个数（same 时不用）
+    k = np.floor(m * (1 - (1 - rng.random(size)) ** (1 / r))).astype(np.int64) + 1
+    j = np.where(same, i, np.minimum(i + k, s))
+    return (gaps[i - 1] + gaps[j - 1]) / 2
+
+def _hier_chunk(job):
+    """
+    一块分层重抽样（m 次）：第一层对 participant 抽多项分布份数 k，
+    第二层把 k 份试次重抽合并为一次多项分布抽样（k·n 次、按各类别试次占比），
+    比率类指标只需要各类别计数；中位数按份数从精确分布中抽。返回 (m, 指标数) 数组。
+    """
+    m, rng = job["m"], np.random.default_rng(job["seed"])
+    out = []
+    n_t, probs = job["n_trials"], job["probs"]
+    if len(n_t):
+        P = len(n_t)
+        k = rng.multinomial(P, np.full(P, 1 / P), size=m)              # (m, P)
+        counts = rng.multinomial(k * n_t, probs)                         # (m, P, K)
+        sums = (counts / n_t[:, None]).sum(axis=1) / P                   # (m, K)
+        out.append(sums[:, :1])                                          # collision_rate
+        out.append(np.cumsum(sums[:, 1:-1], axis=1)[:, job["delta_pos"]])  # precision@delta
+    else:
+        out.append(np.full((m, 1 + len(job["delta_pos"])), np.nan))
+    samplers = job["medians"]
+    if samplers:
+        P = len(samplers)
+        k = rng.multinomial(P, np.full(P, 1 / P), size=m)
+        total = np.zeros(m)
+        for p, sampler in enumerate(samplers):
+            draws = sample_boot_medians(sampler, int(k[:, p].sum()), rng)
+            total += np.bincount(np.repeat(np.arange(m), k[:, p]), weights=draws, minlength=m)
+        out.append((total / P)[:, None])
+    else:
+        out.append(np.full((m, 1), np.nan))
+    return np.hstack(out)
+
+def hierarchical_ci_table(groups, deltas, participants, modes, n_boot=N_BOOT, alpha=0.05,
+                          rng=None, max_chunk_bytes=BOOT_CHUNK_BYTES, workers=None):
+    """
+    分层 bootstrap mean ±CI：先有放回抽 participant，再在每个被抽中的 participant 内有放回抽试次。
+    groups: {(participant, mode): (n_trials, 成功 gap 升序数组, n_fail)}（见 curves.frame_groups）。
+    碰撞率与 Precision@delta 重抽所有试次；中位安全距离重抽该 participant 的成功试次。
+    两层都以多项分布计数表示，不生成重抽样本：比率只需类别计数，中位数从其精确分布中抽，
+    成本与 participant 级 bootstrap 同阶。重抽样按块进行（每块约 max_chunk_bytes），
+    每块一个独立子种子，结果与 workers 无关；抽样量大时各块分给 workers 个进程。
+    返回与 bootstrap_ci_table 相同的表：index=(metric, condition)，columns=[mean, ci_lo, ci_hi, n]。
+    """
+    deltas = [float(d) for d in deltas]
+    grid = np.unique(deltas)
+    delta_pos = np.searchsorted(grid, deltas)
+    names = ["collision_rate", *[f"precision_at_{d:.3f}m" for d in deltas], "median_safe_distance"]
+    seq = rng.bit_generator.seed_seq if isinstance(rng, np.random.Generator) else np.random.SeedSequence(rng)
+
+    jobs, keys, point, ns = [], [], [], []
+    for mode in modes:
+        rows = [groups[(p, mode)] for p in participants if (p, mode) in groups]
+        n_t = np.array([g[0] for g in rows], dtype=np.int64)
+        # 类别：失败 | 成功且 gap 落在 (grid[j-1], grid[j]] | 其它（更远、无 gap、非 yes/no）
+        probs = np.array([np.diff(np.r_[0, g[2], g[2] + np.searchsorted(g[1], grid, side="right"),
+                                        g[0]]) / g[0] for g in rows]).reshape(len(rows), len(grid) + 2)
+        medians = [_median_sampler(g[1]) for g in rows if len(g[1])]
+        rates = probs[:, :1], np.cumsum(probs[:, 1:-1], axis=1)[:, delta_pos]
+        point.append(np.r_[np.mean(np.hstack(rates), axis=0) if len(rows) else
+                           np.full(1 + len(deltas), np.nan),
+                           np.mean([np.median(g[1]) for g in rows if len(g[1])])
+                           if medians else np.nan])
+        ns.append([len(rows)] * (1 + len(deltas)) + [len(medians)])
+        keys.append(mode)
+        width = max(1, len(rows) * (len(grid) + 2))
+        step = max(1, int(max_chunk_bytes // (8 * width)))
+        for start in range(0, n_boot, step):
+            jobs.append({"m": min(step, n_boot - start), "n_trials": n_t, "probs": probs,
+                         "delta_pos": delta_pos, "medians": medians, "mode": mode})
+    for job, child in zip(jobs, seq.spawn(len(jobs))):
+        job["seed"] = child
+
+    draws = sum(job["m"] * max(1, len(job["n_trials"])) * job["probs"].shape[-1] for job in jobs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(jobs))
+    if workers <= 1 or draws < POOL_MIN_DRAWS:
+        parts = [_hier_chunk(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_hier_chunk, jobs))
+
+    records = []
+    for c, mode in enumerate(keys):
+        boots = np.vstack([part for job, part in zip(jobs, parts) if job["mode"] == mode])
+        with np.errstate(invalid="ignore"):
+            lo, hi = np.quantile(boots, [alpha/2, 1-alpha/2], axis=0)
+        for k, name in enumerate(names):
+            records.append(((name, mode), point[c][k], lo[k], hi[k], ns[c][k]))
+    order = {name: i for i, name in enumerate([names[0], names[-1], *names[1:-1]])}
+    records.sort(key=lambda r: order[r[0][0]])          # 与 bootstrap_ci_table 相同：按指标分块
+    index = pd.MultiIndex.from_tuples([r[0] for r in records], names=["metric", "condition"])
+    table = pd.DataFrame([r[1:] for r in records], index=index,
+                         columns=["mean", "ci_lo", "ci_hi", "n"])
+    table["n"] = table["n"].astype(int)
+    return table
@@ -0,0 +1,287 @@
+# cli.py
+# Command-line entry point:  python -m aerial_analysis {objective,cohorts,subjective,follow,results,trajectory,replay,power,synth,bench} ...
+
+import argparse
+import json
+import sys
+
+import pandas as pd
+
+from . import benchmark, cohorts, follow, geometry, objective, power, store, subjective, trajectory
+from .bootstrap import N_BOOT
+from .modes import CONDITION_ORDER
+from .synthetic import FAIL_RATE, synth_questionnaire, synth_trajectories, synth_trials
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m aerial_analysis",
+        description="Objective (trial log) and subjective (questionnaire) analyses.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("objective", help="collision / precision analysis of the Unity trial CSV")
+    p.add_argument("csv", help="end_effector_not_touch_trials.csv")
+    p.add_argument("--outdir", help="output directory (default: results_<timestamp>)")
+    p.add_argument("--deltas", type=float, nargs="+", default=objective.PRECISION_DELTAS,
+                   help="Precision@delta thresholds in meters")
+    p.add_argument("--streaming", action="store_true", help="chunked streaming ingest for large CSVs")
+    p.add_argument("--incremental", action="store_true",
+                   help="reuse the previous run's per-participant aggregates (kept in --cache-dir)")
+    p.add_argument("--chunk-rows", type=int, default=objective.CHUNK_ROWS)
+    p.add_argument("--n-boot", type=int, default=N_BOOT)
+    p.add_argument("--seed", type=int, default=objective.RNG_SEED)
+    p.add_argument("--ci", choices=["hierarchical", "participant"], default=objective.CI_METHOD,
+                   help="bootstrap CIs resampling participants then trials, or participant means only")
+    p.add_argument("--na-string", action="store_true",
+                   help="write N/A instead of blanks in paper-friendly tables")
+    p.add_argument("--all-plots", action="store_true", help="also export the heatmaps")
+    p.add_argument("--curves", action="store_true",
+                   help="export precision-vs-threshold curves (0-10 cm in 1 mm steps)")
+    p.add_argument("--swarm", choices=["auto", "points", "density"], default=objective.SWARM,
+                   help="individual layer of the figures: jittered points, binned density strips, "
+                        "or density above the large-N threshold (default: %(default)s)")
+    _add_common(p, objective.CACHE_DIR)
+
+    c = sub.add_parser("cohorts", help="objective analysis of several trial CSVs (one per cohort) in parallel")
+    c.add_argument("manifest", help="CSV with cohort and csv columns; other columns are kept as labels")
+    c.add_argument("--outdir", help="output directory (default: cohorts_<timestamp>)")
+    c.add_argument("--deltas", type=float, nargs="+", default=objective.PRECISION_DELTAS,
+                   help="Precision@delta thresholds in meters")
+    c.add_argument("--streaming", action="store_true", help="chunked streaming ingest for large CSVs")
+    c.add_argument("--n-boot", type=int, default=N_BOOT)
+    c.add_argument("--seed", type=int, default=objective.RNG_SEED)
+    c.add_argument("--ci", choices=["hierarchical", "participant"], default=objective.CI_METHOD,
+                   help="bootstrap CIs resampling participants then trials, or participant means only")
+    c.add_argument("--no-pooled", action="store_true", help="skip the CI row pooling all cohorts")
+    c.add_argument("--per-cohort", action="store_true",
+                   help="also write each cohort's full tables to <outdir>/<cohort>/")
+    c.add_argument("--cache-dir", default=objective.CACHE_DIR,
+                   help="parsed-input cache (default: %(default)s)")
+    c.add_argument("--no-cache", action="store_true", help="always re-parse the source files")
+    c.add_argument("--store", default=store.STORE_PATH,
+                   help="results database each cohort is added to (default: %(default)s)")
+    c.add_argument("--no-store", action="store_true", help="do not record the cohorts in the results store")
+    c.add_argument("--workers", type=int, help="worker processes, one cohort each (default: CPU count)")
+    c.add_argument("--quiet", action="store_true", help="no console summary")
+
+    s = sub.add_parser("subjective", help="NASA-TLX / SSQ / helpfulness analysis of the questionnaire")
+    s.add_argument("xlsx", nargs="+",
+                   help="questionnaire workbook(s); directories and glob patterns are expanded")
+    s.add_argument("--sheet", nargs="+", default=["0"],
+                   help="sheet name(s) or index(es), or 'all' (default: 0)")
+    s.add_argument("--outroot", default=subjective.OUTROOT)
+    s.add_argument("--outdir", help="output directory (default: <outroot>/run_<timestamp>)")
+    _add_common(s, subjective.CACHE_DIR)
+
+    f = sub.add_parser("follow", help="live summary of the trial CSV while Unity is appending to it")
+    f.add_argument("csv", help="end_effector_not_touch_trials.csv (may not exist yet)")
+    f.add_argument("--outdir", help="write live_summary.csv (and figures with --plots) here")
+    f.add_argument("--deltas", type=float, nargs="+", default=objective.PRECISION_DELTAS,
+                   help="Precision@delta thresholds in meters")
+    f.add_argument("--poll", type=float, default=follow.POLL_SECONDS,
+                   help="seconds between file checks (default: %(default)s)")
+    f.add_argument("--debounce", type=float, default=follow.DEBOUNCE_SECONDS,
+                   help="refresh the summary at most this often (default: %(default)s)")
+    f.add_argument("--plots", action="store_true",
+                   help="also redraw the collision / precision figures into --outdir")
+    f.add_argument("--plot-every", type=float, default=follow.PLOT_SECONDS,
+                   help="seconds between figure refreshes (default: %(default)s)")
+    f.add_argument("--idle-exit", type=float, help="stop after this many seconds without new trials")
+
+    q = sub.add_parser("results", help="query the results store of past runs")
+    q.add_argument("--store", default=store.STORE_PATH, help="results database (default: %(default)s)")
+    qs = q.add_subparsers(dest="action", required=True)
+    qr = qs.add_parser("runs", help="list stored runs")
+    qr.add_argument("--pipeline", choices=["objective", "subjective"])
+    qh = qs.add_parser("history", help="participant mean of one metric per condition across runs")
+    qh.add_argument("metric", help="e.g. collision_rate, precision_at_0.030m, TLX_overall")
+    qh.add_argument("--pipeline", choices=["objective", "subjective"])
+    qh.add_argument("--out", help="also write the table to this CSV")
+    qe = qs.add_parser("export", help="write the paper-friendly CSVs of one run")
+    qe.add_argument("run_id", type=int, nargs="?", help="default: the latest run")
+    qe.add_argument("--outdir", required=True)
+    qe.add_argument("--na-string", action="store_true", help="write N/A instead of blanks")
+
+    t = sub.add_parser("trajectory", help="per-trial metrics from binary per-frame trajectory logs")
+    t.add_argument("logs", nargs="+", help="trajectory files written by TrajectoryLogger.cs")
+    t.add_argument("--out", default="trajectory_metrics.csv", help="output CSV (default: %(default)s)")
+    t.add_argument("--proximity", type=float, default=trajectory.PROXIMITY_M,
+                   help="gap threshold for time_in_proximity_s in meters (default: %(default)s)")
+    t.add_argument("--window", type=float, default=trajectory.APPROACH_WINDOW_S,
+                   help="seconds before the minimum gap used for approach_velocity (default: %(default)s)")
+
+    r = sub.add_parser("replay", help="re-run the wall clamp offline on trajectory logs under other settings")
+    r.add_argument("logs", nargs="+", help="trajectory files written by TrajectoryLogger.cs")
+    r.add_argument("--walls", required=True, help="wall model JSON (planes and boxes)")
+    r.add_argument("--radius", type=float, nargs="+", default=[geometry.RADIUS],
+                   help="sphere radii in meters (default: %(default)s)")
+    r.add_argument("--epsilon", type=float, nargs="+", default=[geometry.BINARY_SEARCH_EPSILON],
+                   help="bisection epsilons in meters (default: %(default)s)")
+    r.add_argument("--iters", type=int, default=geometry.BINARY_SEARCH_ITERS,
+                   help="bisection iterations (default: %(default)s)")
+    r.add_argument("--up", type=float, nargs=3, default=list(geometry.UP), help="tip up axis")
+    r.add_argument("--trials", help="CSV mapping trial (and source) to participant and mode; "
+                                    "summarises collision / precision per setting and condition")
+    r.add_argument("--deltas", type=float, nargs="+", default=objective.PRECISION_DELTAS,
+                   help="Precision@delta thresholds in meters")
+    r.add_argument("--out", default="replay.csv", help="output CSV (default: %(default)s)")
+
+    w = sub.add_parser("power", help="Monte Carlo power of the Friedman / pairwise Wilcoxon tests over N")
+    w.add_argument("--n", type=int, nargs="+", default=power.N_GRID,
+                   help="participant counts (default: %(default)s)")
+    w.add_argument("--reps", type=int, default=power.N_REPS, help="simulated studies per N")
+    w.add_argument("--kind", choices=["rate", "normal"], default="rate",
+                   help="rate: per-participant collision rates from --trials trials; normal: continuous")
+    w.add_argument("--means", type=float, nargs="+",
+                   help=f"one per condition ({', '.join(CONDITION_ORDER)}); default for rate: "
+                        f"the synthetic failure rates {[FAIL_RATE[c] for c in CONDITION_ORDER]}")
+    w.add_argument("--sd", type=float, default=0.5,
+                   help="participant-level SD (logit scale for rate) (default: %(default)s)")
+    w.add_argument("--corr", type=float, default=0.5,
+                   help="between-condition correlation of the participant effects (default: %(default)s)")
+    w.add_argument("--trials", type=int, default=20, help="rate only: trials per participant and condition")
+    w.add_argument("--decimals", type=int, help="normal only: round values (creates ties, e.g. 0 for TLX)")
+    w.add_argument("--alpha", type=float, default=power.ALPHA)
+    w.add_argument("--correction", choices=["bonferroni", "holm", "none"], default="bonferroni",
+                   help="pairwise correction within the condition pairs (default: %(default)s)")
+    w.add_argument("--protected", action="store_true",
+                   help="count pairwise results only when the Friedman test is significant")
+    w.add_argument("--target", type=float, default=power.TARGET_POWER, help="power for the N summary")
+    w.add_argument("--seed", type=int, default=0)
+    w.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    w.add_argument("--out", default="power.csv", help="output CSV (default: %(default)s)")
+
+    g = sub.add_parser("synth", help="write a seeded synthetic trial CSV or questionnaire workbook")
+    g.add_argument("kind", choices=["trials", "questionnaire", "trajectory"])
+    g.add_argument("out", help="output .csv (trials), .xlsx (questionnaire) or trajectory log")
+    g.add_argument("-n", type=int, required=True, help="number of trials / respondents")
+    g.add_argument("--frames", type=int, default=600, help="trajectory only: frames per trial")
+    g.add_argument("--participants", type=int, help="trials only (default: about one per 80 trials)")
+    g.add_argument("--seed", type=int, default=0)
+
+    b = sub.add_parser("bench", help="time every stage of both pipelines on synthetic inputs")
+    b.add_argument("--trials", type=int, nargs="*", default=benchmark.OBJECTIVE_SIZES,
+                   help="objective input sizes in trials (default: %(default)s)")
+    b.add_argument("--respondents", type=int, nargs="*", default=benchmark.SUBJECTIVE_SIZES,
+                   help="questionnaire sizes (default: %(default)s)")
+    b.add_argument("--out", help="results JSON (default: benchmarks/bench_<timestamp>.json)")
+    b.add_argument("--workdir", help="keep the synthetic inputs and outputs here")
+    b.add_argument("--seed", type=int, default=0)
+    b.add_argument("--repeat", type=int, default=1, help="runs per stage, the fastest is kept")
+    b.add_argument("--n-boot", type=int, default=N_BOOT)
+    b.add_argument("--no-plots", action="store_true", help="skip the figure stages")
+    b.add_argument("--workers", type=int, help="figure rendering processes (default: CPU count)")
+    b.add_argument("--baseline", help="earlier results JSON; exit with status 1 on regressions")
+    b.add_argument("--tolerance", type=float, default=benchmark.REGRESSION_TOLERANCE,
+                   help="slowdown factor counted as a regression (default: %(default)s)")
+    return parser
+
+def _add_common(p, cache_dir):
+    p.add_argument("--cache-dir", default=cache_dir, help="parsed-input cache (default: %(default)s)")
+    p.add_argument("--no-cache", action="store_true", help="always re-parse the source file")
+    p.add_argument("--no-plots", action="store_true", help="skip the figure stage")
+    p.add_argument("--store", default=store.STORE_PATH,
+                   help="results database the run is added to (default: %(default)s)")
+    p.add_argument("--no-store", action="store_true", help="do not record the run in the results store")
+    p.add_argument("--workers", type=int,
+                   help="worker processes for figures, bootstrap and workbook ingest (default: CPU count)")
+    p.add_argument("--quiet", action="store_true", help="no console summary")
+    p.add_argument("--profile", metavar="STAGE",
+                   help="cProfile one stage (e.g. load, aggregate, bootstrap, plot) into the outdir")
+    p.add_argument("--trace-memory", action="store_true",
+                   help="per-stage peak memory via tracemalloc in the run manifest (slower)")
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    cache_dir = None if getattr(args, "no_cache", True) else args.cache_dir
+    store_path = None if getattr(args, "no_store", False) else getattr(args, "store", None)
+    if args.command == "objective":
+        objective.run(args.csv, outdir=args.outdir, deltas=args.deltas,
+                      streaming=args.streaming, incremental=args.incremental,
+                      chunk_rows=args.chunk_rows,
+                      cache_dir=cache_dir, n_boot=args.n_boot, seed=args.seed,
+                      na_as_blank=not args.na_string, simple_plots=not args.all_plots,
+                      plots=not args.no_plots, workers=args.workers, verbose=not args.quiet,
+                      curves=args.curves, profile=args.profile, ci_method=args.ci,
+                      trace_memory=args.trace_memory, store=store_path, swarm=args.swarm)
+    elif args.command == "cohorts":
+        cohorts.run(args.manifest, outdir=args.outdir, deltas=args.deltas, streaming=args.streaming,
+                    cache_dir=cache_dir, n_boot=args.n_boot, seed=args.seed, ci_method=args.ci,
+                    workers=args.workers, pooled=not args.no_pooled, per_cohort=args.per_cohort,
+                    verbose=not args.quiet, store=store_path)
+    elif args.command == "follow":
+        follow.follow(args.csv, outdir=args.outdir, deltas=args.deltas, poll_seconds=args.poll,
+                      debounce=args.debounce, plots=args.plots, plot_seconds=args.plot_every,
+                      idle_exit=args.idle_exit)
+    elif args.command == "results":
+        if args.action == "runs":
+            runs = store.list_runs(args.store, args.pipeline)
+            print(runs[["run_id", "pipeline", "started", "fingerprint", "outdir"]]
+                  .assign(fingerprint=runs["fingerprint"].str[:12]).to_string(index=False))
+        elif args.action == "history":
+            table = store.metric_history(args.store, args.metric, args.pipeline)
+            table.index = table.index.set_levels(table.index.levels[2].str[:12], level=2)
+            print(table.to_string(float_format=lambda x: f"{x:.3f}"))
+            if args.out:
+                table.to_csv(args.out)
+        else:
+            run_id = args.run_id if args.run_id is not None else store.latest_run(args.store)
+            if run_id is None:
+                raise SystemExit(f"no runs in {args.store}")
+            written = store.export_run(args.store, run_id, args.outdir,
+                                       na_as_blank=not args.na_string)
+            print(f"run {run_id}: {len(written)} files -> {args.outdir}")
+    elif args.command == "trajectory":
+        table = trajectory.file_metrics(args.logs, proximity=args.proximity, window=args.window)
+        table.to_csv(args.out, index=False)
+        print(f"{len(table)} trials from {len(args.logs)} log(s) -> {args.out}")
+    elif args.command == "replay":
+        tables = geometry.sweep_logs(args.logs, geometry.load_walls(args.walls), args.radius,
+                                     args.epsilon, iters=args.iters, up=args.up)
+        if args.trials:
+            info = pd.read_csv(args.trials, dtype={"participant": str}, keep_default_na=False)
+            table = geometry.replay_sweep(tables, info, args.deltas)
+        else:
+            table = pd.concat([t.assign(radius=r, epsilon=e) for (r, e), t in tables.items()],
+                              ignore_index=True)
+        table.to_csv(args.out, index=False)
+        print(f"{len(tables)} setting(s) x {len(args.logs)} log(s) -> {args.out}")
+    elif args.command == "power":
+        means = args.means
+        if means is None:
+            if args.kind != "rate":
+                raise SystemExit("--means is required for --kind normal")
+            means = [FAIL_RATE[c] for c in CONDITION_ORDER]
+        table = power.power_grid(args.n, args.reps, means, corr=args.corr, sd=args.sd,
+                                 kind=args.kind, trials=args.trials, decimals=args.decimals,
+                                 alpha=args.alpha, correction=args.correction,
+                                 protected=args.protected, seed=args.seed, workers=args.workers)
+        table.to_csv(args.out, index=False)
+        print(power.required_n(table, args.target).to_string(index=False))
+        print(f"-> {args.out}")
+    elif args.command == "synth":
+        if args.kind == "trials":
+            synth_trials(args.n, args.participants, seed=args.seed, path=args.out)
+        elif args.kind == "trajectory":
+            synth_trajectories(args.n, args.frames, seed=args.seed, path=args.out)
+        else:
+            synth_questionnaire(args.n, seed=args.seed, path=args.out)
+    elif args.command == "bench":
+        result = benchmark.run_benchmarks(args.trials, args.respondents, out=args.out,
+                                          workdir=args.workdir, seed=args.seed,
+                                          repeat=args.repeat, n_boot=args.n_boot,
+                                          plots=not args.no_plots, workers=args.workers)
+        if args.baseline:
+            with open(args.baseline) as f:
+                slow = benchmark.compare(result, json.load(f), tolerance=args.tolerance)
+            if len(slow):
+                print(f"\nRegressions (> {args.tolerance}x baseline):\n", slow.to_string(index=False))
+                sys.exit(1)
+            print("\nNo regressions against", args.baseline)
+    else:
+        sheets = [int(s) if s.isdigit() else s for s in args.sheet]
+        sheet = None if "all" in sheets else sheets[0] if len(sheets) == 1 else sheets
+        xlsx = args.xlsx[0] if len(args.xlsx) == 1 else args.xlsx
+        subjective.run(xlsx, sheet=sheet, outroot=args.outroot, outdir=args.outdir,
+                       cache_dir=cache_dir, plots=not args.no_plots, workers=args.workers,
+                       verbose=not args.quiet, profile=args.profile,
+                       trace_memory=args.trace_memory, store=store_path)
@@ -0,0 +1,94 @@
+# coding.py
+# Dictionary-based coding of free-text answers.  A vocabulary {code: terms} is
+# compiled once into a single prefix-tree regex; a whole column is normalized
+# and joined into one NUL-separated string, scanned with one finditer pass per
+# vocabulary, and the matches are mapped back to rows with searchsorted, so
+# there are no per-row searches.
+
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+SEP = "\x00"      # 行分隔符（\s 不匹配它，规范化后位置不变）
+
+def normalize_text(text):
+    """NFKC（NBSP -> 空格）、casefold、合并空白；与 modes.canonical_mode 的清洗一致"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).casefold()
+
+def _trie_pattern(node, term_order):
+    """
+    前缀树 -> 正则：共享前缀只比较一次。每个词的结尾是一个空捕获组 ()，
+    匹配后 lastindex 即该词的组号；term_order 按组号顺序收集 (词, code 下标)。
+    子节点排在结尾之前，同一位置较长的词优先；词中的空格匹配任意空白。
+    """
+    alts = [(r"\s+" if ch == " " else re.escape(ch)) + _trie_pattern(child, term_order)
+            for ch, child in sorted(node.items()) if ch != ""]
+    if "" in node:
+        term, k, whole = node[""]
+        term_order.append((term, k))
+        alts.append(("" if whole else r"\w*") + r"(?!\w)()")
+    return alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+
+def compile_vocabulary(vocab, whole_words=()):
+    """
+    {code: [词, ...]} -> matcher。词按前缀匹配（"distract" 也匹配 "distracting"），
+    whole_words 中的词只匹配整个单词（如 "none"、"nf"）。全部词编译成一个前缀树形的正则，
+    同一位置较长的词优先；同一个词出现在多个 code 下时取第一个。
+    返回 {"regex", "codes", "term_code"}：term_code[组号-1] 为该词的 code 下标。
+    """
+    codes = list(vocab)
+    whole = {normalize_text(w) for w in whole_words}
+    root = {}
+    for k, code in enumerate(codes):
+        for term in map(normalize_text, vocab[code]):
+            node = root
+            for ch in term:
+                node = node.setdefault(ch, {})
+            node.setdefault("", (term, k, term in whole))
+    order = []
+    pattern = r"(?<!\w)" + _trie_pattern(root, order)
+    return {"regex": re.compile(pattern), "codes": codes,
+            "term_code": np.array([k for _, k in order], dtype=np.int64)}
+
+def join_column(texts):
+    """
+    一列文本 -> (以 SEP 连接、NFKC + casefold 后的整串, 各 SEP 的位置)；缺失值按空串处理。
+    空白不合并（词表里的空格在正则中已是 \\s+）。
+    """
+    s = pd.Series(texts, dtype=object)
+    parts = s.where(s.notna(), "").astype(str).str.replace(SEP, " ", regex=False)
+    text = unicodedata.normalize("NFKC", SEP.join(parts.to_list())).casefold()
+    seps = np.flatnonzero(np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32) == 0)
+    return text, seps
+
+def match_column(joined, matcher):
+    """
+    join_column 的结果一次扫描：返回 (row, code)，每个命中一项，按出现顺序排列
+    （row 为原列中的位置，code 为 matcher["codes"] 的下标）。
+    """
+    text, seps = joined
+    found = [(m.start(), m.lastindex) for m in matcher["regex"].finditer(text)]
+    if not found:
+        empty = np.empty(0, np.int64)
+        return empty, empty
+    start, group = np.array(found, dtype=np.int64).T
+    return np.searchsorted(seps, start), matcher["term_code"][group - 1]
+
+def code_column(texts, *matchers):
+    """
+    一列文本 -> 每个 matcher 一个 (hits, first)：hits 为 [行, code] 布尔矩阵（提到过该 code），
+    first 为每行最先提到的 code 下标（没有命中为 -1）。文本只规范化、拼接一次。
+    """
+    joined = join_column(texts)
+    out = []
+    for matcher in matchers:
+        row, code = match_column(joined, matcher)
+        hits = np.zeros((len(texts), len(matcher["codes"])), bool)
+        hits[row, code] = True
+        first = np.full(len(texts), -1, np.int64)
+        rows, idx = np.unique(row, return_index=True)      # 命中按出现顺序，每行第一个
+        first[rows] = code[idx]
+        out.append((hits, first))
+    return out
@@ -0,0 +1,228 @@
+# cohorts.py
+# Multi-cohort batch runs of the objective pipeline.  A manifest CSV lists one
+# trial log per cohort (lab, pilot round, DroneYRandomizer / hover-amplitude
+# variant, ...); load -> metrics -> stats runs for each cohort as one
+# process-pool task, and the results are stacked into cross-cohort tables of
+# collision rate, median safe distance and Precision@delta.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from . import instrument
+from .bootstrap import N_BOOT, bootstrap_ci_table, hierarchical_ci_table
+from .instrument import MANIFEST_NAME, recording, stage
+from .modes import reorder_columns
+from .objective import (CACHE_DIR, CI_METHOD, PRECISION_DELTAS, RNG_SEED, compute_metrics,
+                        compute_stats, export_tables, save_results)
+from .stats import join_posthoc
+from .store import STORE_PATH, report_strings
+
+POOLED = "pooled"        # 全部队列的参与者合在一起的那一行
+
+# ---------- 清单 ----------
+def read_manifest(path):
+    """
+    队列清单 CSV：必须有 cohort 与 csv 两列，每个队列一行；其它列（lab、round、variant 等）
+    作为标签原样带进汇总表。csv 的相对路径按清单所在目录解析。
+    """
+    manifest = pd.read_csv(path, dtype=str, keep_default_na=False)
+    manifest.columns = manifest.columns.str.strip()
+    missing = sorted({"cohort", "csv"} - set(manifest.columns))
+    if missing:
+        raise ValueError(f"{path}: manifest needs the column(s) {missing}")
+    manifest["cohort"] = manifest["cohort"].str.strip()
+    bad = manifest["cohort"][manifest["cohort"].duplicated() | manifest["cohort"].isin(["", POOLED])]
+    if len(bad):
+        raise ValueError(f"{path}: cohort labels must be unique, non-empty and not "
+                         f"{POOLED!r}: {sorted(set(bad))}")
+    base = os.path.dirname(os.path.abspath(path))
+    manifest["csv"] = [os.path.normpath(os.path.join(base, p.strip())) for p in manifest["csv"]]
+    return manifest
+
+# ---------- 每个队列 ----------
+def _trial_count(metrics):
+    return int(sum(g[0] for g in metrics["groups"].values()))
+
+def _cohort_task(task):
+    """
+    一个队列：compute_metrics + compute_stats（outdir 不为 None 时另写出该队列的全部表）。
+    返回 {"cohort", "metrics"（不含曲线数组）, "stats", "info"（耗时/内存）}。
+    """
+    def work():
+        metrics = compute_metrics(task["csv"], task["deltas"], streaming=task["streaming"],
+                                  cache_dir=task["cache_dir"])
+        stats = compute_stats(metrics, n_boot=task["n_boot"], seed=task["seed"],
+                              ci_method=task["ci_method"], workers=task["workers"])
+        if task["outdir"] is not None:
+            os.makedirs(task["outdir"], exist_ok=True)
+            export_tables(task["outdir"], metrics, stats)
+        metrics.pop("curves")
+        return metrics, stats
+
+    (metrics, stats), info = instrument.measured(work)
+    return {"cohort": task["cohort"], "metrics": metrics, "stats": stats, "info": info}
+
+def run_cohorts(manifest, deltas=PRECISION_DELTAS, streaming=False, cache_dir=CACHE_DIR,
+                n_boot=N_BOOT, seed=RNG_SEED, ci_method=CI_METHOD, workers=None, outdir=None):
+    """
+    清单（read_manifest 的表）中每个队列跑 load → metrics → stats，每个队列一个进程池任务
+    （workers<=1 则在本进程内顺序运行，此时 bootstrap 自己可以用进程池）。所有队列用同一组
+    deltas / n_boot / seed / ci_method。outdir 不为 None 时每个队列的表写到 outdir/<cohort>/。
+    返回按清单顺序的结果列表（见 _cohort_task）；正在记录的 run 里每个队列记一个 cohort:<label> 阶段。
+    """
+    tasks = [{"cohort": row.cohort, "csv": row.csv, "deltas": list(deltas), "streaming": streaming,
+              "cache_dir": cache_dir, "n_boot": n_boot, "seed": seed, "ci_method": ci_method,
+              "workers": 1, "outdir": None if outdir is None else os.path.join(outdir, row.cohort)}
+             for row in manifest.itertuples()]
+    procs = min((os.cpu_count() or 1) if workers is None else workers, len(tasks))
+    if procs <= 1:
+        done = []
+        for task in tasks:
+            with stage(f"cohort:{task['cohort']}") as st:
+                done.append(_cohort_task({**task, "workers": workers}))
+                st["rows"] = _trial_count(done[-1]["metrics"])
+        return done
+    with ProcessPoolExecutor(max_workers=procs) as pool:
+        done = list(pool.map(_cohort_task, tasks))
+    for res in done:
+        instrument.add_record(f"cohort:{res['cohort']}", rows=_trial_count(res["metrics"]),
+                              worker=True, **res["info"])
+    return done
+
+# ---------- 跨队列汇总 ----------
+def pooled_ci(results, deltas=PRECISION_DELTAS, n_boot=N_BOOT, seed=RNG_SEED,
+              ci_method=CI_METHOD, workers=None):
+    """
+    全部队列的参与者合在一起（参与者键为 (cohort, participant)）的 bootstrap CI，
+    方法/重抽样次数/种子与各队列相同；返回与 compute_stats 的 ci_table 相同的表。
+    """
+    keys = [r["cohort"] for r in results]
+
+    def stacked(get):
+        return reorder_columns(pd.concat([get(r["metrics"]) for r in results], keys=keys))
+
+    coll_wide = stacked(lambda m: m["coll_wide"])
+    if ci_method == "hierarchical":
+        groups = {((r["cohort"], p), mode): g
+                  for r in results for (p, mode), g in r["metrics"]["groups"].items()}
+        return hierarchical_ci_table(groups, list(deltas), list(coll_wide.index),
+                                     list(coll_wide.columns), n_boot=n_boot, rng=seed,
+                                     workers=workers)
+    if ci_method == "participant":
+        tables = {"collision_rate": coll_wide,
+                  "median_safe_distance": stacked(lambda m: m["prec_wide"]),
+                  **{f"precision_at_{d:.3f}m": stacked(lambda m, d=d: m["prec_at"][d])
+                     for d in deltas}}
+        return bootstrap_ci_table(tables, n_boot=n_boot, rng=seed)
+    raise ValueError(f"unknown ci_method {ci_method!r}")
+
+def _labelled(parts, manifest):
+    """各队列的表（带 cohort 列）-> 一张长表，cohort 后接清单的标签列，按清单顺序排列"""
+    labels = manifest.drop(columns="csv")
+    table = pd.concat(parts, ignore_index=True)
+    rest = [c for c in table.columns if c != "cohort"]
+    table = labels.merge(table, on="cohort", how="right")
+    return table[[*labels.columns, *rest]]
+
+def cohort_ci_table(results, manifest, pooled=None):
+    """
+    长表 cohort, <标签列>, metric, condition, mean, ci_lo, ci_hi, n：按指标分块，
+    块内按清单顺序列出各队列（pooled 不为 None 时最后一行为合并的 POOLED）。
+    """
+    parts = [r["stats"]["ci_table"].reset_index().assign(cohort=r["cohort"]) for r in results]
+    if pooled is not None:
+        parts.append(pooled.reset_index().assign(cohort=POOLED))
+    table = _labelled(parts, manifest)
+    order = {m: i for i, m in enumerate(table["metric"].unique())}
+    rank = table["metric"].map(order)
+    return table.iloc[rank.argsort(kind="stable")].reset_index(drop=True)
+
+def cohort_report(ci_long, fmt=".3f"):
+    """
+    cohort_ci_table -> 论文用宽表：行 (metric, cohort)，列为条件，格为 "mean [ci_lo, ci_hi]"
+    （无 CI 时只有均值，无数据为空；整列格式化，见 store.report_strings）。
+    """
+    text = report_strings(ci_long[["mean", "ci_lo", "ci_hi"]], fmt, "")
+    cell = (text["mean"] + " [" + text["ci_lo"] + ", " + text["ci_hi"] + "]").where(
+        text["ci_lo"] != "", text["mean"])
+    table = ci_long[["metric", "cohort", "condition"]].assign(cell=cell.to_numpy())
+    wide = table.pivot(index=["metric", "cohort"], columns="condition", values="cell")
+    wide = wide.reindex(index=pd.MultiIndex.from_frame(
+        table[["metric", "cohort"]].drop_duplicates()))
+    return reorder_columns(wide).fillna("")
+
+def cohort_friedman(results, manifest):
+    """各队列的 Friedman 汇总 -> cohort, <标签列>, metric, n, k, chi2, p, kendall_w"""
+    return _labelled([r["stats"]["friedman_table"].assign(cohort=r["cohort"]) for r in results],
+                     manifest)
+
+def cohort_posthoc(results, manifest):
+    """各队列的成对 Wilcoxon（碰撞率、中位安全距离）-> cohort, <标签列>, metric, A, B, ..."""
+    parts = []
+    for r in results:
+        pairs = {"collision_rate": r["stats"]["pair_coll"],
+                 "median_safe_distance": r["stats"]["pair_prec"]}
+        pairs = {m: t for m, t in pairs.items() if len(t)}
+        if pairs:
+            parts.append(join_posthoc(pairs).assign(cohort=r["cohort"]))
+    return _labelled(parts, manifest) if parts else pd.DataFrame()
+
+# ---------- 入口 ----------
+def run(manifest_path, outdir=None, deltas=PRECISION_DELTAS, streaming=False,
+        cache_dir=CACHE_DIR, n_boot=N_BOOT, seed=RNG_SEED, ci_method=CI_METHOD, workers=None,
+        pooled=True, per_cohort=False, verbose=True, store=STORE_PATH):
+    """
+    清单中的全部队列：run_cohorts → 跨队列表（cohort_ci.csv 长表、cohort_ci_report.csv 论文宽表、
+    cohort_friedman.csv、cohort_posthoc.csv）；pooled=True 时另加合并全部参与者的 CI 行；
+    per_cohort=True 时每个队列的完整表写到 outdir/<cohort>/。store 不为 None 时每个队列
+    作为一次 objective 运行写进结果库。返回 (outdir, ci_long)。
+    """
+    manifest = read_manifest(manifest_path)
+    if outdir is None:
+        outdir = f"cohorts_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    os.makedirs(outdir, exist_ok=True)
+
+    config = {"deltas": list(deltas), "streaming": streaming, "cache_dir": cache_dir,
+              "n_boot": n_boot, "seed": seed, "ci_method": ci_method, "workers": workers,
+              "pooled": pooled, "per_cohort": per_cohort}
+    with recording("cohorts", outdir, inputs={"manifest": os.path.abspath(manifest_path),
+                                              "cohorts": dict(zip(manifest["cohort"],
+                                                                  manifest["csv"]))},
+                   config=config) as rec:
+        results = run_cohorts(manifest, deltas, streaming=streaming, cache_dir=cache_dir,
+                              n_boot=n_boot, seed=seed, ci_method=ci_method, workers=workers,
+                              outdir=outdir if per_cohort else None)
+        pool_ci = None
+        if pooled:
+            with stage("bootstrap:pooled", rows=sum(len(r["metrics"]["coll_wide"]) for r in results),
+                       n_boot=n_boot, method=ci_method):
+                pool_ci = pooled_ci(results, deltas, n_boot=n_boot, seed=seed,
+                                    ci_method=ci_method, workers=workers)
+        with stage("export"):
+            ci_long = cohort_ci_table(results, manifest, pool_ci)
+            ci_long.to_csv(os.path.join(outdir, "cohort_ci.csv"), index=False)
+            cohort_report(ci_long).to_csv(os.path.join(outdir, "cohort_ci_report.csv"))
+            cohort_friedman(results, manifest).to_csv(
+                os.path.join(outdir, "cohort_friedman.csv"), index=False)
+            cohort_posthoc(results, manifest).to_csv(
+                os.path.join(outdir, "cohort_posthoc.csv"), index=False)
+        if store is not None:
+            with stage("store"):
+                rec["store"] = {"path": os.path.abspath(store), "run_ids": {
+                    r["cohort"]: save_results(
+                        store, csv, os.path.join(outdir, r["cohort"]) if per_cohort else outdir,
+                        r["metrics"], r["stats"],
+                        {**config, "cohort": r["cohort"], "curves": False}, cache_dir,
+                        started=rec["started"])
+                    for r, csv in zip(results, manifest["csv"])}}
+    if verbose:
+        print(f"\n=== COHORTS ({len(results)}) ===")
+        print("Output dir:", outdir)
+        print(cohort_report(ci_long).to_string())
+        print("\nRun manifest:", os.path.join(outdir, MANIFEST_NAME))
+        if store is not None:
+            print(f"Results store: {store} (runs {', '.join(map(str, rec['store']['run_ids'].values()))})")
+    return outdir, ci_long
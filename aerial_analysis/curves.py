@@ -0,0 +1,64 @@
+# curves.py
+# Precision-vs-threshold curves.  Successful-trial gaps are sorted once per
+# (participant, mode) group; Precision@delta at any number of thresholds is
+# then one searchsorted per group, giving a participant x mode x delta array
+# whose slices are the precision_at_* tables.
+
+import numpy as np
+import pandas as pd
+
+from .accumulate import sorted_gaps
+
+CURVE_DELTAS = np.round(np.arange(0, 101) * 0.001, 3)   # 0–10 cm，1 mm 步长
+
+def frame_groups(df):
+    """
+    整表（已清洗、已 normalize_modes）->
+    {(participant, mode): (n_trials, 成功试次 gap 升序数组, n_fail)}。
+    全部成功试次按 (组, gap) 只排序一次，再按组切开。
+    """
+    grouped = df.groupby(["participant", "mode"], observed=True)
+    sizes = grouped.size()
+    gid = grouped.ngroup().to_numpy()
+    n_fail = np.bincount(gid, weights=(df["failure"] == "yes").to_numpy(), minlength=len(sizes))
+    gap = df["gap_to_wall"].to_numpy(float)
+    ok = (df["failure"] == "no").to_numpy() & ~np.isnan(gap)
+    gid, gap = gid[ok], gap[ok]
+    order = np.lexsort((gap, gid))
+    gid, gap = gid[order], gap[order]
+    bounds = np.searchsorted(gid, np.arange(len(sizes) + 1))
+    return {key: (int(n), gap[bounds[i]:bounds[i + 1]], int(n_fail[i]))
+            for i, (key, n) in enumerate(sizes.items())}
+
+def state_groups(state):
+    """累加器（accumulate.new_state）-> 同 frame_groups；未归并的 gap 缓冲在这里并入"""
+    return {key: (c[0], sorted_gaps(state, key), c[1]) for key, c in state["counts"].items()}
+
+def precision_curves(groups, deltas, participants, modes):
+    """
+    Precision@delta 三维数组 [participant, mode, delta]：
+    成功且 gap<=delta 的试次数 / 该组试次数；没有试次的 (participant, mode) 为 NaN。
+    """
+    deltas = np.asarray(deltas, dtype=float)
+    p_pos = {p: i for i, p in enumerate(participants)}
+    m_pos = {m: j for j, m in enumerate(modes)}
+    out = np.full((len(p_pos), len(m_pos), len(deltas)), np.nan)
+    for (p, m), (n, gaps, _) in groups.items():
+        if p in p_pos and m in m_pos:
+            out[p_pos[p], m_pos[m]] = np.searchsorted(gaps, deltas, side="right") / n
+    return out
+
+def curve_slices(curves, deltas, like):
+    """三维数组在各阈值处的切片 -> {delta: 宽表}，索引/列与 like（coll_wide）相同"""
+    return {d: pd.DataFrame(curves[:, :, k], index=like.index, columns=like.columns)
+            for k, d in enumerate(deltas)}
+
+def curve_long(curves, deltas, like):
+    """三维数组 -> 长表 participant, mode, delta_m, precision（缺组的行去掉）"""
+    p, m, d = np.meshgrid(np.arange(curves.shape[0]), np.arange(curves.shape[1]),
+                          np.arange(curves.shape[2]), indexing="ij")
+    long = pd.DataFrame({"participant": np.asarray(like.index)[p.ravel()],
+                         "mode": np.asarray(like.columns)[m.ravel()],
+                         "delta_m": np.asarray(deltas, dtype=float)[d.ravel()],
+                         "precision": curves.ravel()})
+    return long.dropna(subset=["precision"]).reset_index(drop=True)
@@ -0,0 +1,95 @@
+# data_cache.py
+# Fingerprinted columnar cache for the parsed/cleaned input tables of both
+# analysis scripts.  A table is stored as an uncompressed Arrow IPC (Feather v2)
+# file named after the content hash of its source file plus the mapping config
+# that produced it, and is memory-mapped on later runs.  Without pyarrow the
+# cache is simply skipped.
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # 可选依赖：没有 pyarrow 时每次重新解析
+    pa = feather = None
+
+CACHE_VERSION = 2
+_HASH_INDEX = "file_hashes.json"
+
+def _file_hash(path, cache_dir, block=1 << 20):
+    """
+    源文件内容的 sha256；按 (size, mtime) 记在 cache_dir 里，未改动的文件不重算
+    （cache_dir 为 None 或不存在时每次都读全文件）。
+    """
+    st = os.stat(path)
+    key = os.path.abspath(path)
+    stamp = [st.st_size, st.st_mtime_ns]
+    index_path = os.path.join(cache_dir, _HASH_INDEX) if cache_dir and os.path.isdir(cache_dir) else None
+    try:
+        with open(index_path, encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, TypeError, ValueError):
+        index = {}
+    hit = index.get(key)
+    if hit and hit["stamp"] == stamp:
+        return hit["sha256"]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for buf in iter(lambda: f.read(block), b""):
+            h.update(buf)
+    index[key] = {"stamp": stamp, "sha256": h.hexdigest()}
+    if index_path is not None:
+        tmp = f"{index_path}.{os.getpid()}.tmp"     # 批量运行时多个进程会同时更新索引
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp, index_path)
+    return index[key]["sha256"]
+
+def fingerprint(path, config, cache_dir):
+    """源文件内容哈希 + 映射配置（COND_MAP、同义词表等）→ 缓存键"""
+    h = hashlib.sha256()
+    h.update(_file_hash(path, cache_dir).encode())
+    h.update(json.dumps([CACHE_VERSION, config], sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+def inputs_fingerprint(paths, config=None, cache_dir=None):
+    """一组输入文件（顺序无关）的内容哈希 + 配置 → 结果库里标识“同一份输入”的指纹"""
+    h = hashlib.sha256()
+    for digest in sorted(_file_hash(p, cache_dir) for p in paths):
+        h.update(digest.encode())
+    h.update(json.dumps([CACHE_VERSION, config], sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+def _arrow_safe(df):
+    """混合类型的 object 列（问卷常见）转为 string，便于写 Arrow"""
+    out = df.copy()
+    for c in out.columns:
+        if out[c].dtype == object:
+            try:
+                pa.array(out[c], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                out[c] = out[c].astype("string")
+    return out
+
+def cached_table(path, build, config=None, cache_dir=".analysis_cache", name="table"):
+    """
+    返回 build(path) 的结果；相同源文件内容 + 相同 config 时直接内存映射读取缓存。
+    build: path -> DataFrame（解析、清洗、规范化都在这里完成）
+    """
+    if feather is None or cache_dir is None:
+        return build(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    fp = fingerprint(path, config, cache_dir)
+    target = os.path.join(cache_dir, f"{stem}.{name}.{fp[:20]}.arrow")
+    if os.path.exists(target):
+        return feather.read_table(target, memory_map=True).to_pandas()
+    df = build(path)
+    tmp = target + ".tmp"
+    feather.write_feather(_arrow_safe(df), tmp, compression="uncompressed")
+    os.replace(tmp, target)
+    return df
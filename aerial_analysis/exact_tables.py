@@ -0,0 +1,96 @@
+# exact_tables.py
+# Process-wide exact null distributions for the paired tests used by both
+# analysis scripts (Wilcoxon signed-rank, sign test).  Each distribution only
+# depends on the number of non-zero pairs n, so it is built once per n and
+# every later test is a table lookup.
+
+import numpy as np
+
+# _SIGNED_RANK_CDF[n][w] = P(W+ <= w)，W+ 为 n 个无结秩的正号秩和
+# _BINOM_CDF[n][k]       = P(K <= k)，K ~ Binomial(n, 0.5)
+_SIGNED_RANK_CDF = [np.array([1.0])]
+_BINOM_CDF = [np.array([1.0])]
+_sr_pmf = np.array([1.0])
+_bn_pmf = np.array([1.0])
+
+def _extend_tables(max_n):
+    """把两张表递推到 max_n（pmf_n = (pmf_{n-1} + 右移后的 pmf_{n-1}) / 2）"""
+    global _sr_pmf, _bn_pmf
+    for n in range(len(_SIGNED_RANK_CDF), max_n + 1):
+        sr = np.zeros(len(_sr_pmf) + n)
+        sr[:len(_sr_pmf)] += _sr_pmf
+        sr[n:] += _sr_pmf
+        _sr_pmf = sr * 0.5
+        bn = np.zeros(n + 1)
+        bn[:-1] += _bn_pmf
+        bn[1:] += _bn_pmf
+        _bn_pmf = bn * 0.5
+        for table, pmf in ((_SIGNED_RANK_CDF, _sr_pmf), (_BINOM_CDF, _bn_pmf)):
+            cdf = np.cumsum(pmf)
+            cdf.setflags(write=False)
+            table.append(cdf)
+
+def precompute(max_n=50):
+    """预先建好 n <= max_n 的全部精确分布（重复调用不会重算）"""
+    _extend_tables(int(max_n))
+
+def signed_rank_cdf(n):
+    """n 对非零差值时 W+ 的精确 CDF（只读数组，下标为 W+ 取值）"""
+    _extend_tables(n)
+    return _SIGNED_RANK_CDF[n]
+
+def binom_half_cdf(n):
+    """Binomial(n, 0.5) 的精确 CDF（只读数组）"""
+    _extend_tables(n)
+    return _BINOM_CDF[n]
+
+def average_ranks(a):
+    """与 scipy.stats.rankdata(method='average') 一致的秩（1 起）"""
+    a = np.asarray(a, float)
+    order = np.argsort(a, kind="mergesort")
+    s = a[order]
+    new = np.r_[True, s[1:] != s[:-1]]
+    bounds = np.r_[np.flatnonzero(new), len(a)]
+    grp = np.cumsum(new) - 1
+    ranks = np.empty(len(a))
+    ranks[order] = 0.5 * (bounds[grp] + 1 + bounds[grp + 1])
+    return ranks
+
+def sign_test_p(pos, neg):
+    """双侧符号检验 p 值（等价于 binomtest(min(pos,neg), pos+neg, 0.5)）"""
+    n = int(pos) + int(neg)
+    if n == 0:
+        return np.nan
+    k = min(int(pos), int(neg))
+    return float(min(1.0, 2.0 * binom_half_cdf(n)[k]))
+
+def signed_rank_test(x, y, method="exact"):
+    """
+    成对 Wilcoxon 符号秩检验（zero_method="wilcox"，双侧），返回 (W, p)。
+    method="exact": 查表，与 scipy 的 method="exact" 一致（有结时 W+ 取整的保守做法相同）；
+    method="auto":  无结且无零差、n<=50 时查表，否则交给 scipy.stats.wilcoxon 默认行为。
+    """
+    x = np.asarray(x, float)
+    y = np.asarray(y, float)
+    d = x - y
+    nz = d != 0
+    n = int(nz.sum())
+    if method == "auto":
+        if n != len(d) or n > 50 or len(np.unique(np.abs(d))) != n:
+            from scipy.stats import wilcoxon
+            stat, p = wilcoxon(x, y)
+            return float(stat), float(p)
+    if n == 0:
+        return np.nan, np.nan
+    d = d[nz]
+    r = average_ranks(np.abs(d))
+    r_plus = float(r[d > 0].sum())
+    r_minus = float(r[d < 0].sum())
+    cdf = signed_rank_cdf(n)
+    total = len(cdf) - 1                                    # n(n+1)/2
+    lower = cdf[int(np.ceil(r_plus))]                       # P(W+ <= ceil(r+))
+    upper = cdf[total - int(np.floor(r_plus))]              # P(W+ >= floor(r+))，由对称性
+    p = float(np.clip(2.0 * min(lower, upper), 0.0, 1.0))
+    return min(r_plus, r_minus), p
+
+precompute()
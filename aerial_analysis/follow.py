@@ -0,0 +1,205 @@
+# follow.py
+# Live tail of the trial CSV while the Unity session is still appending to it.
+# The file is polled for growth; only the bytes appended since the last offset
+# are parsed and folded into the per-(participant, mode) accumulators, and a
+# per-condition summary (optionally also the collision / precision figures) is
+# refreshed on a debounce interval.
+
+import io
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .accumulate import fold_chunk, group_rows, new_state
+from .incremental import complete_end, read_appended, tail_hash
+from .modes import CONDITION_ORDER
+from .render import figure_job, render_figures
+
+POLL_SECONDS = 0.2        # 检查文件是否变长的间隔
+DEBOUNCE_SECONDS = 0.5    # 有新试次后最多这么久刷新一次汇总（试次结束到可见 < 1 秒）
+PLOT_SECONDS = 10.0       # 图的刷新间隔（画图比汇总慢得多）
+SUMMARY_NAME = "live_summary.csv"
+CHUNK_ROWS = 100_000
+
+def new_tail(csv_path, deltas=(0.03, 0.04)):
+    """跟踪状态：已消费到的字节 offset、表头、累加器与每组汇总行"""
+    return {"path": csv_path, "deltas": [float(d) for d in deltas], "offset": 0, "size": -1,
+            "header": None, "tail_hash": None, "acc": new_state(), "rows": {}, "trials": 0,
+            "resets": 0}
+
+def _reset(tail):
+    tail.update(offset=0, size=-1, header=None, tail_hash=None, acc=new_state(), rows={},
+                trials=0)
+    tail["resets"] += 1
+
+def _read_header(f):
+    """第一行（已写完整时）-> 列名列表与表头之后的 offset；还没有完整的一行时返回 (None, 0)"""
+    f.seek(0)
+    line = f.readline()
+    if not line.endswith(b"\n"):
+        return None, 0
+    return list(pd.read_csv(io.BytesIO(line), nrows=0).columns), len(line)
+
+def poll(tail, chunksize=CHUNK_ROWS):
+    """
+    读一次文件：只解析上次 offset 之后追加的完整行并折叠进累加器，返回新试次数。
+    文件变短或 offset 之前的内容变了（重新开始记录 / 被覆盖）时从头重建。
+    文件还不存在时返回 0。
+    """
+    try:
+        f = open(tail["path"], "rb")
+    except FileNotFoundError:
+        return 0
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if size == tail["size"]:
+            return 0
+        if tail["header"] is not None and (
+                size < tail["offset"] or tail_hash(f, tail["offset"]) != tail["tail_hash"]):
+            _reset(tail)
+        end = complete_end(f, size)
+        if tail["header"] is None:
+            tail["header"], tail["offset"] = _read_header(f)
+            if tail["header"] is None:
+                return 0
+        new_rows = 0
+        if end > tail["offset"]:
+            for chunk in read_appended(f, tail["offset"], end, tail["header"], chunksize):
+                fold_chunk(tail["acc"], chunk)
+                new_rows += len(chunk)
+            tail["offset"] = end
+        tail["size"], tail["tail_hash"] = size, tail_hash(f, tail["offset"])
+    tail["trials"] += new_rows
+    return new_rows
+
+def update_rows(tail):
+    """只重算有新试次的 (participant, mode) 组的汇总行（含 Precision@delta）"""
+    acc = tail["acc"]
+    for row in group_rows(acc, list(acc["dirty"])):
+        key = (row["participant"], row["mode"])
+        row["n_fail"] = acc["counts"][key][1]
+        gaps = acc["sorted"].get(key, np.empty(0))
+        for d in tail["deltas"]:
+            row[f"precision_at_{d:.3f}m"] = np.searchsorted(gaps, d, side="right") / row["n_trials"]
+        tail["rows"][key] = row
+
+def _prec_cols(tail):
+    return [f"precision_at_{d:.3f}m" for d in tail["deltas"]]
+
+def live_summary(tail):
+    """
+    每个条件一行：participants, trials, collisions, collision_rate（参与者均值，与论文口径一致）,
+    pooled_collision_rate（全部试次合计）, median_safe_distance（参与者中位数的均值）, precision_at_*。
+    """
+    update_rows(tail)
+    prec = _prec_cols(tail)
+    cols = ["mode", "participants", "trials", "collisions", "collision_rate",
+            "pooled_collision_rate", "median_safe_distance", *prec]
+    if not tail["rows"]:
+        return pd.DataFrame(columns=cols)
+    agg = pd.DataFrame(list(tail["rows"].values()))
+    g = agg.groupby("mode")
+    out = pd.DataFrame({"participants": g["participant"].nunique(), "trials": g["n_trials"].sum(),
+                        "collisions": g["n_fail"].sum(),
+                        "collision_rate": g["collision_rate"].mean(),
+                        "median_safe_distance": g["median_safe_distance"].mean(),
+                        **{c: g[c].mean() for c in prec}})
+    out["pooled_collision_rate"] = out["collisions"] / out["trials"]
+    order = [m for m in CONDITION_ORDER if m in out.index] + \
+            sorted(m for m in out.index if m not in CONDITION_ORDER)
+    return out.reindex(order).rename_axis("mode").reset_index()[cols]
+
+def live_wide(tail, value):
+    """当前的 participant × condition 宽表（value 为汇总行里的字段）"""
+    agg = pd.DataFrame(list(tail["rows"].values()))
+    wide = agg.pivot(index="participant", columns="mode", values=value)
+    return wide[[m for m in CONDITION_ORDER if m in wide.columns]]
+
+def live_figure_jobs(tail, outdir):
+    """碰撞率与各阈值 Precision@delta 的均值±95%CI 图（CI 由 plots 现算参与者 bootstrap）"""
+    coll = live_wide(tail, "collision_rate")
+    jobs = [figure_job("plot_dot_ci_with_swarm",
+                       os.path.join(outdir, "collision_rate_mean_ci_swarm.png"), wide=coll,
+                       ylabel="Collision rate (0..1)",
+                       title=f"Collision rate by condition (live; N={coll.shape[0]})")]
+    for d, col in zip(tail["deltas"], _prec_cols(tail)):
+        thr_cm = int(round(d * 100))
+        jobs.append(figure_job("plot_dot_ci_with_swarm",
+                               os.path.join(outdir, f"precision_at_{thr_cm}cm_mean_ci_swarm.png"),
+                               wide=live_wide(tail, col), ylabel="Rate (0..1)",
+                               title=f"Precision @ ≤{thr_cm} cm (live)"))
+    return jobs
+
+def write_summary(summary, outdir):
+    """先写临时文件再改名，读者不会看到写了一半的表"""
+    path = os.path.join(outdir, SUMMARY_NAME)
+    tmp = path + ".tmp"
+    summary.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return path
+
+def _print_summary(tail, summary):
+    stamp = datetime.now().strftime("%H:%M:%S")
+    print(f"\n[{stamp}] {tail['trials']} trials, {len({k[0] for k in tail['rows']})} participants"
+          + (f" (file restarted {tail['resets']}x)" if tail["resets"] else ""))
+    if len(summary):
+        print(summary.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+
+def follow(csv_path, outdir=None, deltas=(0.03, 0.04), poll_seconds=POLL_SECONDS,
+           debounce=DEBOUNCE_SECONDS, plots=False, plot_seconds=PLOT_SECONDS, duration=None,
+           idle_exit=None, on_refresh=None, verbose=True):
+    """
+    跟踪正在被追加的试次 CSV，直到 Ctrl-C（或 duration 秒 / idle_exit 秒没有新试次）。
+    每 poll_seconds 检查一次文件；有新试次时至多每 debounce 秒刷新一次汇总：
+    打印、写 outdir/live_summary.csv（outdir 不为 None 时）、调用 on_refresh(summary, tail)。
+    plots=True 时另每 plot_seconds 重画碰撞率 / Precision@delta 图到 outdir。
+    返回最后一次的汇总表。
+    """
+    if outdir is not None:
+        os.makedirs(outdir, exist_ok=True)
+    tail = new_tail(csv_path, deltas)
+    started = last_data = time.monotonic()
+    last_refresh = last_plot = -np.inf
+    pending = plot_pending = False
+    resets = 0
+    summary = live_summary(tail)
+
+    def refresh(now):
+        nonlocal summary, last_refresh, pending
+        summary = live_summary(tail)
+        if outdir is not None:
+            write_summary(summary, outdir)
+        if verbose:
+            _print_summary(tail, summary)
+        if on_refresh is not None:
+            on_refresh(summary, tail)
+        last_refresh, pending = now, False
+
+    if verbose:
+        print(f"Following {csv_path} (Ctrl-C to stop)")
+    try:
+        while True:
+            if poll(tail) or tail["resets"] != resets:    # 新试次，或文件重新开始（汇总要清空）
+                resets = tail["resets"]
+                last_data = time.monotonic()
+                pending = plot_pending = True
+            now = time.monotonic()
+            if pending and now - last_refresh >= debounce:
+                refresh(now)
+            if plots and outdir is not None and plot_pending and tail["rows"] \
+                    and now - last_plot >= plot_seconds:
+                render_figures(live_figure_jobs(tail, outdir), cache_dir=None, workers=1)
+                last_plot, plot_pending = time.monotonic(), False
+            if duration is not None and now - started >= duration:
+                break
+            if idle_exit is not None and now - last_data >= idle_exit:
+                break
+            time.sleep(poll_seconds)
+    except KeyboardInterrupt:
+        pass
+    if pending:
+        refresh(time.monotonic())
+    return summary
@@ -0,0 +1,323 @@
+# geometry.py
+# Offline replay of EndEffectorNoPenetration's clamp: the face-filtered sphere
+# cast plus the OverlapsAt bisection, against a wall model of half-space planes
+# and axis-aligned boxes.  All trials of a study step through their frames
+# together (one vectorized update per frame index), so a whole study can be
+# re-run under other radius / epsilon settings and its metrics recomputed.
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .objective import PRECISION_DELTAS, metric_tables, normalize_trials, trial_tables
+from .trajectory import open_trajectory, trial_runs
+
+# EndEffectorNoPenetration.cs 的默认参数
+RADIUS = 0.15
+BINARY_SEARCH_ITERS = 18
+BINARY_SEARCH_EPSILON = 0.0005
+MICRO_EPSILON = 0.001
+FACE_ALIGN_DOT = 0.5
+RELEASE_HYSTERESIS = 0.01
+INIT_PUSH_STEPS = 80        # 初始化时沿 -up 把球推出墙面的最多步数
+STILL_DIST = 1e-6           # tipDist <= 此值视为没动（MaintainStickState）
+UP = (0.0, 0.0, 1.0)        # tip.up（日志里没有朝向，整段按固定方向处理）
+TRACE_ITERS = 64            # 盒子的 sphere cast 用球面追踪求首次接触
+TRACE_TOL = 1e-6
+CHUNK_FRAMES = 2_000_000    # 按整试次分块重放，临时数组不随文件大小增长
+REPLAY_COLUMNS = ["trial", "frames", "contact_events", "contact_frames", "min_gap", "final_gap"]
+
+# ---------- 墙面模型 ----------
+def wall_model(planes=(), boxes=()):
+    """
+    planes: [(point, normal)]，normal 指向自由空间，背面是实体半空间；
+    boxes: [(min, max)] 轴对齐实心盒。返回数组字典。
+    """
+    planes, boxes = list(planes), list(boxes)
+    if not planes and not boxes:
+        raise ValueError("wall model needs at least one plane or box")
+    point = np.asarray([p for p, _ in planes], float).reshape(-1, 3)
+    normal = np.asarray([n for _, n in planes], float).reshape(-1, 3)
+    normal = normal / np.linalg.norm(normal, axis=1, keepdims=True)
+    lo = np.asarray([b[0] for b in boxes], float).reshape(-1, 3)
+    hi = np.asarray([b[1] for b in boxes], float).reshape(-1, 3)
+    if (lo > hi).any():
+        raise ValueError("box min must not exceed box max")
+    return {"plane_normal": normal, "plane_offset": (point * normal).sum(1),
+            "box_min": lo, "box_max": hi}
+
+def load_walls(path):
+    """JSON：{"planes": [{"point": [x,y,z], "normal": [x,y,z]}], "boxes": [{"min": [...], "max": [...]}]}"""
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    return wall_model([(p["point"], p["normal"]) for p in spec.get("planes", [])],
+                      [(b["min"], b["max"]) for b in spec.get("boxes", [])])
+
+# ---------- 几何查询（x: (B,3)） ----------
+def _box_dist(x, walls):
+    """x: (B,3) 或 (B,Nb,3) -> 到每个盒子的距离 (B,Nb)（盒内为 0）及最近点"""
+    x = x[:, None, :] if x.ndim == 2 else x
+    closest = np.clip(x, walls["box_min"], walls["box_max"])
+    return np.linalg.norm(x - closest, axis=2), closest
+
+def wall_distance(x, walls):
+    """每个点到最近墙面的距离（米；平面背面为负，盒内为 0）"""
+    parts = [x @ walls["plane_normal"].T - walls["plane_offset"], _box_dist(x, walls)[0]]
+    return np.concatenate(parts, axis=1).min(1)
+
+def overlaps(x, walls, radius=RADIUS):
+    """OverlapsAt：半径 radius 的球与任一墙面相交"""
+    return wall_distance(x, walls) < radius
+
+def sphere_cast(origin, direction, max_dist, walls, up, radius=RADIUS, face_align=FACE_ALIGN_DOT):
+    """
+    SphereCastFrontFiltered：沿单位向量 direction 扫掠 max_dist，只保留 dot(normal, up) <= -face_align
+    的命中并取最近者。起点已与墙相交时按 Unity 的约定记 distance=0、normal=-direction。
+    返回 (hit, distance, normal)。
+    """
+    B = len(origin)
+    best, best_n = np.full(B, np.inf), np.zeros((B, 3))
+    rows = np.arange(B)
+
+    def take(dist, normal):
+        dist = np.where(normal @ up <= -face_align, dist, np.inf)
+        k = dist.argmin(1)
+        d = dist[rows, k]
+        better = d < best
+        best[better], best_n[better] = d[better], normal[better, k[better]]
+
+    inward = np.broadcast_to(-direction[:, None, :], (B, 1, 3))
+    if len(walls["plane_offset"]):
+        s0 = origin @ walls["plane_normal"].T - walls["plane_offset"]
+        nd = direction @ walls["plane_normal"].T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = (s0 - radius) / -nd
+        dist = np.where(s0 < radius, 0.0,
+                        np.where((nd < 0) & (t <= max_dist[:, None]), t, np.inf))
+        normal = np.where((s0 < radius)[..., None], inward, walls["plane_normal"])
+        take(dist, normal)
+    if len(walls["box_min"]):
+        d0, _ = _box_dist(origin, walls)
+        t = np.zeros_like(d0)
+        for _ in range(TRACE_ITERS):
+            p = origin[:, None, :] + t[..., None] * direction[:, None, :]
+            gap = _box_dist(p, walls)[0] - radius
+            t = t + np.maximum(gap, 0.0)
+            if ((gap < TRACE_TOL) | (t > max_dist[:, None])).all():
+                break
+        p = origin[:, None, :] + t[..., None] * direction[:, None, :]
+        d, closest = _box_dist(p, walls)
+        hit = (d - radius < TRACE_TOL) & (t <= max_dist[:, None])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            normal = (p - closest) / d[..., None]
+        start = d0 < radius
+        dist = np.where(start, 0.0, np.where(hit, t, np.inf))
+        normal = np.where(start[..., None], inward, np.nan_to_num(normal))
+        take(dist, normal)
+    return np.isfinite(best), best, best_n
+
+def bisect_boundary(start, end, walls, radius=RADIUS, iters=BINARY_SEARCH_ITERS,
+                    epsilon=BINARY_SEARCH_EPSILON):
+    """FindBoundaryByBisection：start→end 线段上最后一个不相交的位置（区间 * 长度 < epsilon 即停）"""
+    seg = end - start
+    length = np.linalg.norm(seg, axis=1)
+    lo, hi = np.zeros(len(start)), np.ones(len(start))
+    active = np.ones(len(start), bool)
+    for _ in range(iters):
+        if not active.any():
+            break
+        mid = (lo + hi) * 0.5
+        inside = overlaps(start + mid[:, None] * seg, walls, radius)
+        hi = np.where(active & inside, mid, hi)
+        lo = np.where(active & ~inside, mid, lo)
+        active &= (hi - lo) * length >= epsilon
+    return start + lo[:, None] * seg
+
+# ---------- 重放 ----------
+def clamp_params(radius=RADIUS, epsilon=BINARY_SEARCH_EPSILON, iters=BINARY_SEARCH_ITERS,
+                 face_align=FACE_ALIGN_DOT, hysteresis=RELEASE_HYSTERESIS,
+                 micro_epsilon=MICRO_EPSILON, up=UP):
+    up = np.asarray(up, float)
+    return {"radius": float(radius), "epsilon": float(epsilon), "iters": int(iters),
+            "face_align": float(face_align), "hysteresis": float(hysteresis),
+            "micro_epsilon": float(micro_epsilon), "up": up / np.linalg.norm(up)}
+
+def _replay_chunk(rec, walls, p):
+    """整试次的一段记录 -> (每帧 tip, contact, gap, 每试次表)；各试次从第一帧的记录位置重新初始化"""
+    r, up = p["radius"], p["up"]
+    starts, ids = trial_runs(rec["trial"])
+    n = len(rec)
+    lengths = np.r_[starts[1:], n] - starts
+    recorded = rec["tip"].astype(float)
+    wanted = rec["desired"].astype(float) if "desired" in rec.dtype.names else recorded
+    # 每帧的操纵增量 = 本帧夹紧前的期望位置 - 上一帧（夹紧后）的记录位置
+    delta = np.zeros((n, 3))
+    delta[1:] = wanted[1:] - recorded[:-1]
+    dt = np.r_[0.0, np.diff(rec["t"])]
+
+    order = np.argsort(-lengths, kind="stable")     # 按长度降序：第 k 帧仍在进行的试次是前缀
+    first, length = starts[order], lengths[order]
+    B = len(first)
+    safe = recorded[first].copy()
+    for _ in range(INIT_PUSH_STEPS):
+        inside = overlaps(safe, walls, r)
+        if not inside.any():
+            break
+        safe[inside] -= up * p["micro_epsilon"]
+    was = np.zeros(B, bool)
+    release = np.full(B, np.inf)
+    last_normal = np.zeros((B, 3))
+    bumps = np.zeros(B, np.int64)
+    tip = np.empty((n, 3))
+    contact = np.zeros(n, bool)
+    tip[first] = safe
+
+    for k in range(1, int(length.max()) if B else 0):
+        b = int(np.searchsorted(-length, -k, side="left"))
+        rows = first[:b] + k
+        d, S = delta[rows], safe[:b]
+        dist = np.linalg.norm(d, axis=1)
+        moving = dist > STILL_DIST
+        new, hit_now = S + d, np.zeros(b, bool)
+        normal_now = np.zeros((b, 3))
+
+        mv = np.flatnonzero(moving)
+        if len(mv):
+            direction = d[mv] / np.maximum(dist[mv], 1e-7)[:, None]
+            hit, h_dist, h_normal = sphere_cast(S[mv], direction, dist[mv], walls, up, r,
+                                                p["face_align"])
+            i = mv[hit]
+            new[i] = S[i] + direction[hit] * np.maximum(h_dist[hit], 0.0)[:, None]
+            normal_now[i] = h_normal[hit]
+            rest = mv[~hit]
+            i = rest[overlaps(new[rest], walls, r)]
+            new[i] = bisect_boundary(S[i], new[i], walls, r, p["iters"], p["epsilon"])
+            normal_now[i] = -up
+            hit_now[mv[hit]] = True
+            hit_now[i] = True
+
+        w, rel = was[:b], release[:b]          # 视图：就地更新各试次的状态
+        # 已贴墙：屏蔽朝墙分量，允许后退/切向
+        slide = moving & ~hit_now & w
+        if slide.any():
+            nrm = last_normal[:b][slide]
+            zero = ~nrm.any(axis=1)
+            nrm[zero] = -up
+            nrm /= np.linalg.norm(nrm, axis=1, keepdims=True)
+            ds = d[slide]
+            along = (ds * nrm).sum(1)                        # >0 离墙
+            new[slide] = np.where((along < 0)[:, None], S[slide], S[slide] + ds - along[:, None] * nrm)
+            rel[slide] += np.maximum(along, 0.0)
+        still = ~moving & w
+        rel[still] += dt[rows[still]] * 0.001
+
+        bumps[:b] += hit_now & ~w & (rel >= p["hysteresis"])
+        rel[hit_now] = 0.0
+        w[hit_now] = True
+        last_normal[:b][hit_now] = normal_now[hit_now]
+        released = (slide | still) & (rel >= p["hysteresis"])
+        w[released] = False
+        last_normal[:b][released] = 0.0
+
+        safe[:b] = np.where(moving[:, None], new, S)
+        tip[rows] = safe[:b]
+        contact[rows] = w
+
+    gap = np.where(contact, 0.0, np.maximum(wall_distance(tip, walls) - r, 0.0))
+    per_trial = np.empty(B, np.int64)
+    per_trial[order] = bumps
+    seg_end = starts + lengths - 1
+    table = pd.DataFrame({
+        "trial": ids.astype(np.int64), "frames": lengths, "contact_events": per_trial,
+        "contact_frames": np.add.reduceat(contact.astype(np.int64), starts),
+        "min_gap": np.minimum.reduceat(gap, starts), "final_gap": gap[seg_end],
+    })
+    return tip, contact, gap, table
+
+def _chunks(rec, chunk_frames):
+    starts, _ = trial_runs(rec["trial"])
+    bounds = [0]
+    for s in starts[1:]:
+        if s - bounds[-1] >= chunk_frames:
+            bounds.append(int(s))
+    bounds.append(len(rec))
+    return zip(bounds[:-1], bounds[1:])
+
+def replay_records(rec, walls, **params):
+    """
+    用给定参数重放整段记录，返回同 dtype 的副本（tip / gap / contact 换成重放结果，其余字段不变），
+    可直接交给 trajectory.trajectory_metrics。rec 需含 desired 字段（版本 2 日志）才能还原贴墙时
+    被夹掉的推进；版本 1 日志只能用记录的（已夹紧）位移近似。
+    """
+    p = clamp_params(**params)
+    out = np.array(rec)
+    if len(out) == 0:
+        return out
+    tip, contact, gap, _ = _replay_chunk(out, walls, p)
+    out["tip"], out["contact"], out["gap"] = tip, contact, gap
+    return out
+
+def replay_trials(rec, walls, chunk_frames=CHUNK_FRAMES, **params):
+    """
+    重放 -> 每试次一行：frames, contact_events（BumpCount 的增量）, contact_frames,
+    min_gap, final_gap（最后一帧的 gap，即停下时的安全距离）。按整试次分块，内存与文件大小无关。
+    """
+    p = clamp_params(**params)
+    if len(rec) == 0:
+        return pd.DataFrame(columns=REPLAY_COLUMNS)
+    parts = [_replay_chunk(rec[a:b], walls, p)[3] for a, b in _chunks(rec, chunk_frames)]
+    return pd.concat(parts, ignore_index=True)
+
+def file_replay(paths, walls, **kwargs):
+    """多个轨迹文件 -> 合并的重放每试次表（带 source 列）"""
+    tables = []
+    for path in paths:
+        table = replay_trials(open_trajectory(path), walls, **kwargs)
+        table.insert(0, "source", os.path.basename(path))
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+# ---------- 研究级指标 ----------
+def trial_outcomes(replayed, trial_info):
+    """
+    重放表 + 试次信息（trial, participant, mode；多个日志时另有 source）-> 与 Unity 试次 CSV
+    同列的表：failure = 重放中发生过接触（yes/no），gap_to_wall = final_gap（碰撞试次为 0）。
+    试次信息里没有的试次丢弃。
+    """
+    keys = ["source", "trial"] if "source" in trial_info.columns and "source" in replayed.columns \
+        else ["trial"]
+    df = replayed.merge(trial_info, on=keys, how="inner")
+    fail = df["contact_events"] > 0
+    return pd.DataFrame({"participant": df["participant"].astype(str).str.strip(),
+                         "mode": df["mode"], "failure": np.where(fail, "yes", "no"),
+                         "gap_to_wall": np.where(fail, 0.0, df["final_gap"])})
+
+def replay_metrics(trials, deltas=PRECISION_DELTAS):
+    """trial_outcomes 的表 -> objective.metric_tables 的指标字典（可接 compute_stats / export_tables）"""
+    return metric_tables(*trial_tables(normalize_trials(trials)), deltas)
+
+def replay_sweep(tables, trial_info, deltas=PRECISION_DELTAS):
+    """
+    tables: {(radius, epsilon): 重放每试次表}（见 sweep_logs）-> 每个设置 × 条件一行：
+    participants, collision_rate（参与者均值）, median_safe_distance, precision_at_*。
+    """
+    rows = []
+    for (radius, epsilon), replayed in tables.items():
+        metrics = replay_metrics(trial_outcomes(replayed, trial_info), deltas)
+        coll = metrics["coll_wide"]
+        for mode in coll.columns:
+            row = {"radius": radius, "epsilon": epsilon, "mode": mode,
+                   "participants": int(coll[mode].notna().sum()),
+                   "collision_rate": coll[mode].mean(),
+                   "median_safe_distance": metrics["prec_wide"][mode].mean()}
+            for d in deltas:
+                row[f"precision_at_{d:.3f}m"] = metrics["prec_at"][d][mode].mean()
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+def sweep_logs(paths, walls, radii=(RADIUS,), epsilons=(BINARY_SEARCH_EPSILON,), **params):
+    """每个 (radius, epsilon) 组合重放一遍全部日志 -> {(radius, epsilon): 每试次表}"""
+    return {(r, e): file_replay(paths, walls, radius=r, epsilon=e, **params)
+            for r in radii for e in epsilons}
@@ -0,0 +1,116 @@
+# incremental.py
+# Incremental objective metrics across runs.  The per-(participant, mode)
+# accumulators of the previous run are kept in the cache directory together
+# with the byte offset already consumed; when the trial CSV has only grown,
+# just the appended rows are parsed and only the participants they touch are
+# recomputed.  Any other change to the file falls back to a full rebuild.
+
+import hashlib
+import io
+import os
+
+import pandas as pd
+
+from .accumulate import fold_chunk, group_rows, new_state, read_chunks, wide_tables
+from .curves import state_groups
+
+STATE_SUBDIR = "incremental"
+STATE_VERSION = 2
+TAIL_BYTES = 1 << 16
+
+class _Window(io.RawIOBase):
+    """只读到 end 为止的文件视图（未写完的最后一行不交给 read_csv）"""
+    def __init__(self, f, end):
+        self.f, self.end = f, end
+    def readable(self):
+        return True
+    def readinto(self, b):
+        n = min(len(b), self.end - self.f.tell())
+        if n <= 0:
+            return 0
+        data = self.f.read(n)
+        b[:len(data)] = data
+        return len(data)
+
+def state_path(csv_path, cache_dir):
+    key = hashlib.sha1(os.path.abspath(csv_path).encode()).hexdigest()[:12]
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir, STATE_SUBDIR, f"{stem}-{key}.pkl")
+
+def complete_end(f, size):
+    """最后一个换行符之后的位置；其后的半行留给下一次读取"""
+    pos = size
+    while pos > 0:
+        step = min(TAIL_BYTES, pos)
+        f.seek(pos - step)
+        i = f.read(step).rfind(b"\n")
+        if i >= 0:
+            return pos - step + i + 1
+        pos -= step
+    return 0
+
+def tail_hash(f, offset):
+    """offset 之前最后 TAIL_BYTES 字节的哈希，用来确认文件只是被追加"""
+    start = max(0, offset - TAIL_BYTES)
+    f.seek(start)
+    return hashlib.sha256(f.read(offset - start)).hexdigest()
+
+def read_appended(f, offset, end, header, chunksize):
+    """读取 [offset, end) 之间的新行（不含表头），返回分块迭代器"""
+    f.seek(offset)
+    source = io.BufferedReader(_Window(f, end))
+    return read_chunks(source, chunksize, header=None, names=header)
+
+def _load_state(path):
+    try:
+        state = pd.read_pickle(path)
+    except (OSError, EOFError, ValueError):
+        return None
+    return state if state.get("version") == STATE_VERSION else None
+
+def incremental_tables(csv_path, cache_dir, chunksize=500_000):
+    """
+    增量版 stream_trial_tables。返回 (coll_wide, prec_wide, groups, info)，
+    info = {"mode": "full"|"append"|"unchanged", "new_rows": n, "participants_recomputed": [...]}。
+    上次的累加器与汇总行存于 cache_dir/incremental/；只有新行涉及的 participant 会被重算。
+    """
+    if cache_dir is None:
+        raise ValueError("incremental mode needs a cache_dir to keep state between runs")
+    path = state_path(csv_path, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    state = _load_state(path)
+
+    with open(csv_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        end = complete_end(f, size)
+        appendable = (state is not None and end >= state["offset"]
+                      and tail_hash(f, state["offset"]) == state["tail_hash"])
+        if appendable:
+            mode = "append" if end > state["offset"] else "unchanged"
+            acc, new_rows = state["acc"], 0
+            if end > state["offset"]:
+                for chunk in read_appended(f, state["offset"], end, state["header"], chunksize):
+                    fold_chunk(acc, chunk)
+                    new_rows += len(chunk)
+        else:
+            mode, acc, new_rows = "full", new_state(), 0
+            f.seek(0)
+            for chunk in read_chunks(io.BufferedReader(_Window(f, end)), chunksize):
+                fold_chunk(acc, chunk)
+                new_rows += len(chunk)
+            f.seek(0)
+            header = list(pd.read_csv(f, nrows=0).columns)
+            state = {"version": STATE_VERSION, "header": header, "rows": {}}
+        state["offset"], state["tail_hash"] = end, tail_hash(f, end)
+
+    # 只重算有新试次的 participant（其全部 mode）；阈值与汇总行无关，换阈值无需重算
+    changed = {k[0] for k in acc["dirty"]}
+    keys = [k for k in acc["counts"] if k[0] in changed]
+    for row in group_rows(acc, keys):
+        state["rows"][(row["participant"], row["mode"])] = row
+    state["acc"] = acc
+    pd.to_pickle(state, path)
+
+    agg = pd.DataFrame(list(state["rows"].values()))
+    info = {"mode": mode, "new_rows": new_rows, "participants_recomputed": sorted(changed)}
+    return (*wide_tables(agg, acc["mappings"].values()), state_groups(acc), info)
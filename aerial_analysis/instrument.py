@@ -0,0 +1,178 @@
+# instrument.py
+# Per-stage instrumentation for pipeline runs.  Stages are marked with
+# `with stage(name):` anywhere in the package; while a run is being recorded
+# each stage gets wall/CPU time, the process RSS high-water mark (and, with
+# trace_memory, its tracemalloc peak) and row counts, and the run is written
+# as a JSON manifest next to its outputs.  Outside a recorded run stage()
+# does nothing.
+
+import cProfile
+import json
+import os
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+MANIFEST_NAME = "run_manifest.json"
+_ACTIVE = []    # 正在记录的 run（栈顶为当前 run）
+
+def machine_info():
+    """环境信息（写进 manifest / benchmark 结果；同一台机器上的数字才可比）"""
+    info = {"python": sys.version.split()[0], "platform": platform.platform(),
+            "machine": platform.machine(), "cpu_count": os.cpu_count(),
+            "numpy": np.__version__, "pandas": pd.__version__}
+    try:
+        import scipy
+        info["scipy"] = scipy.__version__
+    except ImportError:
+        info["scipy"] = None
+    return info
+
+def max_rss_bytes():
+    """本进程 RSS 峰值（Linux 上 ru_maxrss 以 KiB 计；无 resource 模块时为 None）"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return int(rss if sys.platform == "darwin" else rss * 1024)
+
+def tracing():
+    """当前是否在记录内存（图任务据此决定在工作进程里是否也跟踪）"""
+    return bool(_ACTIVE) and tracemalloc.is_tracing()
+
+def _profile_file(run, name):
+    """该阶段是否要 cProfile；是则返回输出路径（"friedman" 也匹配 "friedman:xxx"）"""
+    want = run["profile"]
+    if not want or not (name == want or name.startswith(want + ":")):
+        return None
+    return os.path.join(run["outdir"], f"profile_{re.sub(r'[^A-Za-z0-9_.-]+', '_', name)}.prof")
+
+@contextmanager
+def stage(name, rows=None, **info):
+    """
+    记录一个阶段：wall_s / cpu_s / max_rss_bytes（结束时的进程 RSS 峰值）与 rss_growth_bytes
+    （本阶段把 RSS 峰值抬高了多少）/ rows 及其它字段；跟踪内存时另有 peak_mem_bytes
+    （阶段内相对开始时的 tracemalloc 峰值）。yield 出记录字典，可在阶段内补写 rows 等。
+    阶段可嵌套（记录 parent）；没有正在记录的 run 时不做任何事。
+    """
+    run = _ACTIVE[-1] if _ACTIVE else None
+    if run is None:
+        yield {}
+        return
+    stack = run["_stack"]
+    rec = {"stage": name, "parent": stack[-1]["stage"] if stack else None, "rows": rows, **info}
+    run["stages"].append(rec)
+    mem = tracemalloc.is_tracing()
+    if mem:
+        cur, peak = tracemalloc.get_traced_memory()
+        if stack:                             # 父阶段到此为止的峰值先记下，再清零峰值
+            stack[-1]["_peak"] = max(stack[-1]["_peak"], peak)
+        tracemalloc.reset_peak()
+        rec["_start"], rec["_peak"] = cur, cur
+    prof_path = _profile_file(run, name)
+    prof = cProfile.Profile() if prof_path else None
+
+    stack.append(rec)
+    rss0 = max_rss_bytes()
+    t0, c0 = time.perf_counter(), time.process_time()
+    if prof:
+        prof.enable()
+    try:
+        yield rec
+    finally:
+        if prof:
+            prof.disable()
+            prof.dump_stats(prof_path)
+            rec["profile"] = os.path.basename(prof_path)
+        rec["wall_s"] = round(time.perf_counter() - t0, 6)
+        rec["cpu_s"] = round(time.process_time() - c0, 6)
+        stack.pop()
+        if mem:
+            peak = max(rec.pop("_peak"), tracemalloc.get_traced_memory()[1])
+            rec["peak_mem_bytes"] = int(peak - rec.pop("_start"))
+            if stack:
+                stack[-1]["_peak"] = max(stack[-1]["_peak"], peak)
+        rec["max_rss_bytes"] = max_rss_bytes()
+        if rss0 is not None:
+            rec["rss_growth_bytes"] = rec["max_rss_bytes"] - rss0
+
+def add_record(name, **fields):
+    """直接追加一条已测好的记录（如进程池里画的图），parent 为当前阶段"""
+    if not _ACTIVE:
+        return
+    run = _ACTIVE[-1]
+    parent = run["_stack"][-1]["stage"] if run["_stack"] else None
+    run["stages"].append({"stage": name, "parent": parent, **fields})
+
+def measured(func, *args, trace=False, **kwargs):
+    """在本进程里运行 func，返回 (结果, {wall_s, cpu_s, peak_mem_bytes, max_rss_bytes})"""
+    started = trace and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    if trace:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+    t0, c0 = time.perf_counter(), time.process_time()
+    try:
+        out = func(*args, **kwargs)
+    finally:
+        info = {"wall_s": round(time.perf_counter() - t0, 6),
+                "cpu_s": round(time.process_time() - c0, 6)}
+        if trace:
+            info["peak_mem_bytes"] = int(tracemalloc.get_traced_memory()[1] - base)
+        if started:
+            tracemalloc.stop()
+        info["max_rss_bytes"] = max_rss_bytes()
+    return out, info
+
+@contextmanager
+def recording(pipeline, outdir, profile=None, trace_memory=False, **info):
+    """
+    记录一次运行：期间的 stage() 都写进 manifest，结束时写出 outdir/run_manifest.json。
+    profile: 要 cProfile 的阶段名（输出 outdir/profile_<stage>.prof，可用 snakeviz / pstats 查看）；
+    trace_memory: 另用 tracemalloc 统计各阶段峰值内存（Python 分配会慢数倍，默认关）。
+    yield 出 manifest 字典。
+    """
+    run = {"pipeline": pipeline, "outdir": outdir, "profile": profile,
+           "started": datetime.now().isoformat(timespec="seconds"),
+           **info, "machine": machine_info(), "stages": [], "_stack": []}
+    started = trace_memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    _ACTIVE.append(run)
+    t0, c0 = time.perf_counter(), time.process_time()
+    try:
+        yield run
+    finally:
+        _ACTIVE.remove(run)
+        run["wall_s"] = round(time.perf_counter() - t0, 6)
+        run["cpu_s"] = round(time.process_time() - c0, 6)
+        if started:
+            run["peak_mem_bytes"] = int(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        run["max_rss_bytes"] = max_rss_bytes()
+        del run["_stack"]
+        write_manifest(run)
+
+def write_manifest(run, path=None):
+    """manifest 写成 JSON（默认 outdir/run_manifest.json），返回路径"""
+    path = path or os.path.join(run["outdir"], MANIFEST_NAME)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(run, f, indent=1, default=str)
+    return path
+
+def stage_table(run):
+    """manifest 的阶段记录 -> DataFrame（便于打印或比较）"""
+    cols = ["stage", "parent", "rows", "wall_s", "cpu_s", "max_rss_bytes", "rss_growth_bytes",
+            "peak_mem_bytes"]
+    table = pd.DataFrame(run["stages"])
+    return table.reindex(columns=cols + [c for c in table.columns if c not in cols])
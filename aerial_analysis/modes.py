@@ -0,0 +1,83 @@
+# modes.py
+# Condition vocabulary shared by both analyses: the canonical condition order
+# and the mode-name normalization used for the Unity trial logs.
+
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+CONDITION_ORDER = ["None", "Color", "Audio", "Gamepad"]
+
+# mode 同义词表（精确匹配）与模糊匹配关键词；也是 CSV 缓存指纹的一部分
+MODE_SYNONYMS = {
+    "none": "None", "no feedback": "None", "no-feedback": "None",
+    "nofeedback": "None", "baseline": "None", "control": "None", "nf":"None",
+    "visual": "Color", "vision": "Color", "colour": "Color", "color": "Color",
+    "audio": "Audio", "sound": "Audio", "beep": "Audio", "beeps": "Audio",
+    "haptic": "Gamepad", "gamepad": "Gamepad", "vibration": "Gamepad",
+    "rumble":"Gamepad", "vibrotactile":"Gamepad", "vibro":"Gamepad"
+}
+MODE_KEYWORDS = {
+    "Color":   ["visual","vision","colour","color"],
+    "Audio":   ["audio","sound","beep"],
+    "Gamepad": ["haptic","gamepad","vibration","rumble","vibro"],
+}
+
+def mode_vocabulary(exclude=()):
+    """
+    自由文本里识别模态用的词表（见 coding.compile_vocabulary）：
+    -> ({条件: [词]}，按 CONDITION_ORDER；整词匹配的词集合）。MODE_KEYWORDS 按前缀匹配，
+    其余同义词只匹配整个单词；exclude 中的词不用。
+    """
+    keywords = {k for keys in MODE_KEYWORDS.values() for k in keys}
+    vocab = {c: [] for c in CONDITION_ORDER}
+    for term, mode in MODE_SYNONYMS.items():
+        if term not in exclude:
+            vocab[mode].append(term)
+    for mode, keys in MODE_KEYWORDS.items():
+        vocab[mode] += [k for k in keys if k not in vocab[mode] and k not in exclude]
+    whole = {t for t in MODE_SYNONYMS if t not in keywords and t not in exclude}
+    return vocab, whole
+
+def canonical_mode(raw):
+    """
+    单个原始拼写 -> (规范名, 匹配方式)；匹配方式为 "exact"（同义词表）、
+    "fuzzy"（关键词子串回退）或 "unmatched"（原样返回清洗后的小写串）。
+    """
+    t = re.sub(r"\s+", " ", unicodedata.normalize("NFKC", str(raw))).strip().lower()
+    if t in MODE_SYNONYMS:
+        return MODE_SYNONYMS[t], "exact"
+    if ("no" in t and "feed" in t) or t in {"baseline","control","nf"}:
+        return "None", "fuzzy"
+    for name, keys in MODE_KEYWORDS.items():
+        if any(k in t for k in keys):
+            return name, "fuzzy"
+    return t, "unmatched"
+
+def normalize_modes(df, col="mode"):
+    """
+    把 mode 名称统一为: None/Color/Audio/Gamepad。
+    先转 category，每个不同的原始拼写只规范化一次，再按 codes 映射回各行；
+    结果列为 category。映射记录 {raw, mode, match} 存于 df.attrs["mode_mapping"]。
+    """
+    cat = df[col].astype("category")
+    raw = [str(r) for r in cat.cat.categories]
+    canon = [canonical_mode(r) for r in raw]
+    names, inverse = np.unique([c[0] for c in canon], return_inverse=True)
+    inverse = np.append(inverse, -1)          # code -1（缺失值）保持缺失
+    df[col] = pd.Categorical.from_codes(inverse[cat.cat.codes.to_numpy()], categories=names)
+    df.attrs["mode_mapping"] = [{"raw": r, "mode": m, "match": how}
+                                for r, (m, how) in zip(raw, canon)]
+    return df
+
+def fuzzy_mode_report(df):
+    """经模糊回退/未能识别的原始拼写（来自 normalize_modes 的映射表）"""
+    mapping = pd.DataFrame(df.attrs.get("mode_mapping", []), columns=["raw", "mode", "match"])
+    return mapping[mapping["match"] != "exact"].drop_duplicates("raw", ignore_index=True)
+
+def reorder_columns(wide_df, order=CONDITION_ORDER):
+    front = [c for c in order if c in wide_df.columns]
+    back  = [c for c in wide_df.columns if c not in order]
+    return wide_df[front + back]
@@ -0,0 +1,368 @@
+# objective.py
+# Objective (trial-log) analysis: collision rate, median safe distance and
+# Precision@delta per participant x condition, Friedman/Wilcoxon tests,
+# paper-friendly exports and figures.  Each stage is a plain function;
+# run() chains them the way objective_data_analysis.py used to.
+
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .accumulate import fold_chunk, group_rows, new_state, read_chunks, wide_tables
+from .bootstrap import N_BOOT, bootstrap_ci_table, hierarchical_ci_table
+from .curves import (CURVE_DELTAS, curve_long, curve_slices, frame_groups,
+                     precision_curves, state_groups)
+from .data_cache import cached_table, inputs_fingerprint
+from .incremental import incremental_tables
+from .instrument import MANIFEST_NAME, recording, stage
+from .render import figure_job, render_figures
+from .modes import (MODE_KEYWORDS, MODE_SYNONYMS, fuzzy_mode_report,
+                    normalize_modes, reorder_columns)
+from .stats import (batch_tests, family_adjust, friedman_table, join_posthoc, split_posthoc,
+                    stack_wide)
+from .store import STORE_PATH, report_strings, save_run, wide_long
+
+PRECISION_DELTAS = [0.03, 0.04]  # meters
+EXPORT_NA_AS_BLANK = True
+SIMPLE_PLOTS = True               # True=论文主图；False=附加图也导出
+RNG_SEED = 42
+CI_METHOD = "hierarchical"        # "hierarchical"=participant→trial 分层 bootstrap；"participant"=只重抽参与者均值
+CHUNK_ROWS = 500_000              # 流式读取每块行数
+CACHE_DIR = ".analysis_cache"     # 解析+规范化后的列式缓存；None=不缓存
+SWARM = "auto"                    # 个体层："points"=逐点 jitter；"density"=分箱密度条；"auto"=大 N 时用密度条
+
+# ---------- 1) Load ----------
+def read_trials(path):
+    """读取并清洗试次 CSV（不做 mode 规范化）"""
+    df = pd.read_csv(path, keep_default_na=False)   # 保留 "None" 条件名
+    df["participant"] = df["participant"].astype(str).str.strip()
+    df["failure"]     = df["failure"].astype(str).str.strip().str.lower()
+    df["gap_to_wall"] = pd.to_numeric(df["gap_to_wall"], errors="coerce")
+    return df
+
+# ---------- 2) Normalize ----------
+def normalize_trials(df):
+    """normalize_modes，participant/mode/failure 转为 category"""
+    df = normalize_modes(df, "mode")
+    for c in ["participant", "mode", "failure"]:
+        df[c] = df[c].astype("category")
+    return df
+
+def clean_trials(path):
+    """read_trials + normalize_trials"""
+    with stage("load") as st:
+        df = read_trials(path)
+        st["rows"] = len(df)
+    with stage("normalize", rows=len(df)):
+        return normalize_trials(df)
+
+def load_trials(path, cache_dir=CACHE_DIR):
+    """clean_trials 的结果，按 (文件内容, 同义词表) 指纹缓存"""
+    return cached_table(path, clean_trials, cache_dir=cache_dir, name="trials",
+                        config={"synonyms": MODE_SYNONYMS, "keywords": MODE_KEYWORDS})
+
+# ---------- 3) Metrics ----------
+def trial_tables(df):
+    """
+    由整表（已清洗、已 normalize_modes）计算宽表：碰撞率、成功试次中位安全距离；
+    另返回每组排好序的成功 gap（见 curves.frame_groups），用于 Precision@delta 曲线。
+    """
+    # Safety: collision rate
+    coll_rate = (
+        df.assign(is_fail=(df["failure"]=="yes").astype(int))
+          .groupby(["participant","mode"], as_index=False, observed=True)["is_fail"]
+          .mean()
+          .rename(columns={"is_fail":"collision_rate"})
+    )
+    coll_wide = coll_rate.pivot(index="participant", columns="mode", values="collision_rate")
+    coll_wide = reorder_columns(coll_wide)
+
+    # Precision: median safe distance（成功试次）
+    success = df[df["failure"]=="no"]
+    prec = (success.groupby(["participant","mode"], as_index=False, observed=True)["gap_to_wall"]
+            .median().rename(columns={"gap_to_wall":"median_safe_distance"}))
+    prec_wide = prec.pivot(index="participant", columns="mode", values="median_safe_distance")
+    prec_wide = reorder_columns(prec_wide)
+
+    return coll_wide, prec_wide, frame_groups(df)
+
+def stream_trial_tables(path, chunksize=CHUNK_ROWS):
+    """
+    流式版 trial_tables：分块读取 CSV（participant/mode/failure 读为 category，
+    failure 折算为布尔），每块折叠进 (participant, mode) 累加器：
+    试次数、失败数、成功数，以及成功试次 gap_to_wall 的缓冲（最后排序求精确中位数
+    与 Precision@delta 曲线）。字符串清洗只作用在每块的 categories 上，不做逐行处理。
+    """
+    state = new_state()
+    for chunk in read_chunks(path, chunksize):
+        fold_chunk(state, chunk)
+    agg = pd.DataFrame(group_rows(state))
+    return (*wide_tables(agg, state["mappings"].values()), state_groups(state))
+
+def compute_metrics(csv_path, deltas=PRECISION_DELTAS, streaming=False,
+                    chunk_rows=CHUNK_ROWS, cache_dir=CACHE_DIR, incremental=False,
+                    curve_deltas=None):
+    """
+    Load → normalize → metrics，返回宽表字典：
+    coll_wide, succ_wide, prec_wide, prec_at{delta: wide}, curves, mode_report
+    （incremental=True 时另有 incremental 信息，见 incremental.incremental_tables）。
+    curves = {"deltas": 阈值网格, "values": [participant, mode, delta] 数组}，网格为
+    deltas ∪ curve_deltas；prec_at 是其中 deltas 处的切片。
+    不涉及 scipy / matplotlib，可在实验服务器进程里直接调用。
+    """
+    extra = {}
+    if incremental:
+        # 沿用上次运行的 (participant, mode) 累加器，只读追加的行、只重算受影响的 participant
+        with stage("ingest", mode="incremental") as st:
+            coll_wide, prec_wide, groups, extra["incremental"] = incremental_tables(
+                csv_path, cache_dir, chunk_rows)
+            st["rows"] = extra["incremental"]["new_rows"]
+        mode_report = fuzzy_mode_report(coll_wide)
+    elif streaming:
+        # 分块读入并直接折叠为宽表
+        with stage("ingest", mode="streaming") as st:
+            coll_wide, prec_wide, groups = stream_trial_tables(csv_path, chunk_rows)
+            st["rows"] = sum(g[0] for g in groups.values())
+        mode_report = fuzzy_mode_report(coll_wide)
+    else:
+        # 缓存未命中时内含 load / normalize 两个子阶段
+        with stage("ingest", mode="cached" if cache_dir is not None else "memory") as st:
+            df = load_trials(csv_path, cache_dir=cache_dir)
+            st["rows"] = len(df)
+        mode_report = fuzzy_mode_report(df)
+        with stage("aggregate", rows=len(df)):
+            coll_wide, prec_wide, groups = trial_tables(df)
+    with stage("precision_curves", rows=len(groups)):
+        metrics = metric_tables(coll_wide, prec_wide, groups, deltas, curve_deltas)
+    return {**metrics, "mode_report": mode_report, **extra}
+
+def metric_tables(coll_wide, prec_wide, groups, deltas=PRECISION_DELTAS, curve_deltas=None):
+    """宽表 + 每组已排序的成功 gap -> compute_metrics 的指标字典（不含 mode_report；groups 供分层 bootstrap）"""
+    # Precision@delta：每组 gap 已排序，任意多个阈值只是一次 searchsorted
+    grid = sorted(set(deltas) | set(() if curve_deltas is None else map(float, curve_deltas)))
+    values = precision_curves(groups, grid, coll_wide.index, coll_wide.columns)
+    at = [grid.index(d) for d in deltas]
+    prec_at = curve_slices(values[:, :, at], deltas, coll_wide)
+    return {"coll_wide": coll_wide, "succ_wide": 1.0 - coll_wide,
+            "prec_wide": prec_wide, "prec_at": prec_at,
+            "curves": {"deltas": np.asarray(grid), "values": values}, "groups": groups}
+
+# ---------- 4) Stats ----------
+def compute_stats(metrics, n_boot=N_BOOT, seed=RNG_SEED, ci_method=CI_METHOD, workers=None):
+    """
+    Friedman + 成对 Wilcoxon（碰撞率、中位安全距离；stats.batch_tests 一次算完，两项指标的
+    成对比较作为一个检验族另做 Bonferroni/Holm），以及所有指标的 bootstrap CI。
+    ci_method="hierarchical" 时 CI 来自 participant→trial 分层 bootstrap（考虑每人的试次数，
+    见 bootstrap.hierarchical_ci_table）；"participant" 时只重抽每人的汇总值。
+    """
+    out = {}
+    tests = {"coll": "collision_rate", "prec": "median_safe_distance"}
+    wide = {name: metrics[f"{key}_wide"] for key, name in tests.items()}
+    with stage("friedman+pairwise", rows=len(metrics["coll_wide"]), metrics=len(wide)):
+        friedman, posthoc = batch_tests(stack_wide(wide), list(wide),
+                                        list(metrics["coll_wide"].columns), sign_test=True,
+                                        pairwise_requires_friedman=True)
+        pairs = split_posthoc(family_adjust(posthoc), list(wide))
+    for key, name in tests.items():
+        out[f"friedman_{key}"] = friedman[name]
+        out[f"pair_{key}"] = pairs[name] if friedman[name] is not None else pd.DataFrame()
+    out["friedman_table"] = friedman_table(friedman)
+    # Bootstrap CI（所有指标一次算完）
+    tables = {"collision_rate": metrics["coll_wide"],
+              "median_safe_distance": metrics["prec_wide"],
+              **{f"precision_at_{d:.3f}m": wide for d, wide in metrics["prec_at"].items()}}
+    with stage("bootstrap", rows=len(metrics["coll_wide"]), n_boot=n_boot, metrics=len(tables),
+               method=ci_method):
+        if ci_method == "hierarchical":
+            coll_wide = metrics["coll_wide"]
+            out["ci_table"] = hierarchical_ci_table(
+                metrics["groups"], list(metrics["prec_at"]), list(coll_wide.index),
+                list(coll_wide.columns), n_boot=n_boot, rng=seed, workers=workers)
+        elif ci_method == "participant":
+            out["ci_table"] = bootstrap_ci_table(tables, n_boot=n_boot, rng=seed)
+        else:
+            raise ValueError(f"unknown ci_method {ci_method!r}")
+    return out
+
+# ---------- 5) Export ----------
+def export_report_friendly(df, path, na_as_blank=True, fmt=".3f", na_str="N/A"):
+    """论文友好导出：NaN 输出为空白/自定义字符串（整列格式化，见 store.report_strings）"""
+    report_strings(df, fmt, "" if na_as_blank else na_str).to_csv(path, index=True)
+
+def export_tables(outdir, metrics, stats, na_as_blank=EXPORT_NA_AS_BLANK, curves=False):
+    """写出全部宽表、检验结果与 CI 表（curves=True 时另写 Precision@delta 曲线长表）"""
+    coll_wide, prec_wide = metrics["coll_wide"], metrics["prec_wide"]
+    coll_wide.to_csv(os.path.join(outdir, "collision_rate_per_participant.csv"))
+    metrics["succ_wide"].to_csv(os.path.join(outdir, "success_rate_per_participant.csv"))
+    prec_wide.to_csv(os.path.join(outdir, "median_safe_distance_per_participant_raw.csv"))
+    export_report_friendly(
+        prec_wide,
+        os.path.join(outdir, "median_safe_distance_per_participant.csv"),
+        na_as_blank=na_as_blank, fmt=".3f", na_str="N/A"
+    )
+    for d, wide in metrics["prec_at"].items():
+        wide.to_csv(os.path.join(outdir, f"precision_at_{d:.3f}m_per_participant.csv"))
+    if curves:
+        curve_long(metrics["curves"]["values"], metrics["curves"]["deltas"], coll_wide).to_csv(
+            os.path.join(outdir, "precision_curve_per_participant.csv"), index=False)
+
+    if stats["friedman_coll"] is not None:
+        with open(os.path.join(outdir, "friedman_collision.txt"), "w") as f:
+            f.write(str(stats["friedman_coll"]))
+    if stats["friedman_prec"] is not None:
+        with open(os.path.join(outdir, "friedman_precision.txt"), "w") as f:
+            f.write(str(stats["friedman_prec"]))
+    stats["pair_coll"].to_csv(os.path.join(outdir, "pairwise_wilcoxon_collisions.csv"), index=False)
+    stats["pair_prec"].to_csv(os.path.join(outdir, "pairwise_wilcoxon_precision.csv"), index=False)
+    stats["friedman_table"].to_csv(os.path.join(outdir, "friedman_summary.csv"), index=False)
+    stats["ci_table"].to_csv(os.path.join(outdir, "bootstrap_mean_ci_all_metrics.csv"))
+    if len(metrics["mode_report"]):
+        metrics["mode_report"].to_csv(os.path.join(outdir, "mode_fuzzy_matches.csv"), index=False)
+
+def store_tables(metrics, stats):
+    """结果库里的一次运行：参与者 × 条件的指标值、Friedman 汇总、成对比较长表、CI 表"""
+    wide = {"collision_rate": metrics["coll_wide"], "success_rate": metrics["succ_wide"],
+            "median_safe_distance": metrics["prec_wide"],
+            **{f"precision_at_{d:.3f}m": w for d, w in metrics["prec_at"].items()}}
+    pairs = {"collision_rate": stats["pair_coll"], "median_safe_distance": stats["pair_prec"]}
+    pairs = {m: t for m, t in pairs.items() if len(t)}       # Friedman 未能计算的指标没有成对表
+    return {"values": wide_long(wide), "friedman": stats["friedman_table"],
+            "pairwise": join_posthoc(pairs) if pairs else None, "ci": stats["ci_table"]}
+
+def save_results(store, csv_path, outdir, metrics, stats, config, cache_dir=CACHE_DIR,
+                 started=None):
+    """把本次运行写进结果库 store（见 store.save_run），返回 run_id"""
+    fp = inputs_fingerprint([csv_path], {"synonyms": MODE_SYNONYMS, "keywords": MODE_KEYWORDS,
+                                         "deltas": config.get("deltas")}, cache_dir)
+    return save_run(store, "objective", inputs={"csv": os.path.abspath(csv_path)}, config=config,
+                    fingerprint=fp, outdir=outdir, started=started, **store_tables(metrics, stats))
+
+# ---------- 6) Plot ----------
+def figure_jobs(outdir, metrics, stats, simple=SIMPLE_PLOTS, seed=RNG_SEED, curves=False,
+                swarm=SWARM):
+    """本次运行的全部图任务（见 render.figure_job；swarm 见 plots.plot_dot_ci_with_swarm）"""
+    coll_wide, ci_table = metrics["coll_wide"], stats["ci_table"]
+    # 主图：碰撞率（mean点+95%CI + 背景个体散点）
+    jobs = [figure_job(
+        "plot_dot_ci_with_swarm", os.path.join(outdir, "collision_rate_mean_ci_swarm.png"),
+        wide=coll_wide,
+        ylabel="Collision rate (0..1)",
+        title=f"Collision rate by condition (mean ±95% CI; N={coll_wide.shape[0]})",
+        ci_rng=seed, ci=ci_table.loc["collision_rate"], swarm=swarm
+    )]
+
+    # 主图：Precision@delta（每个阈值各一张）
+    for d, wide in metrics["prec_at"].items():
+        thr_cm = int(round(d*100))
+        jobs.append(figure_job(
+            "plot_dot_ci_with_swarm",
+            os.path.join(outdir, f"precision_at_{thr_cm}cm_mean_ci_swarm.png"),
+            wide=wide,
+            ylabel="Rate (0..1)",
+            title=f"Precision @ ≤{thr_cm} cm (mean ±95% CI)",
+            ci_rng=seed, ci=ci_table.loc[f"precision_at_{d:.3f}m"], swarm=swarm
+        ))
+
+    # 主图：中位安全距离（成功试次）箱线图 + 个体散点
+    jobs.append(figure_job("plot_safe_distance_box",
+                           os.path.join(outdir, "safe_distance_box_scatter.png"),
+                           prec_wide=metrics["prec_wide"], rng_seed=seed, swarm=swarm))
+
+    # Precision@delta 曲线（可选）
+    if curves:
+        jobs.append(figure_job("plot_precision_curves",
+                               os.path.join(outdir, "precision_curve_mean_se.png"),
+                               values=metrics["curves"]["values"],
+                               deltas=metrics["curves"]["deltas"],
+                               modes=list(coll_wide.columns)))
+
+    # 附加图（可选）
+    if not simple:
+        # 碰撞率热力图
+        jobs.append(figure_job("plot_heatmap01",
+                               os.path.join(outdir, "collision_rate_heatmap.png"),
+                               wide=coll_wide, title="Collision rate (heatmap)"))
+        # Precision@delta 热力图
+        for d, wide in metrics["prec_at"].items():
+            thr_cm = int(round(d*100))
+            jobs.append(figure_job("plot_heatmap01",
+                                   os.path.join(outdir, f"precision_at_{thr_cm}cm_heatmap.png"),
+                                   wide=wide, title=f"Precision @ ≤{thr_cm} cm (heatmap)"))
+    return jobs
+
+def plot_figures(outdir, metrics, stats, simple=SIMPLE_PLOTS, seed=RNG_SEED,
+                 cache_dir=CACHE_DIR, workers=None, curves=False, swarm=SWARM):
+    """论文主图（simple=False 时附加热力图）；进程池并行绘制，未变化的图从缓存复制"""
+    return render_figures(figure_jobs(outdir, metrics, stats, simple=simple, seed=seed,
+                                      curves=curves, swarm=swarm),
+                          cache_dir=cache_dir, workers=workers)
+
+def print_summary(outdir, metrics, stats):
+    print("\n=== SUMMARY ===")
+    print("Output dir:", outdir)
+    if "incremental" in metrics:
+        info = metrics["incremental"]
+        print(f"Incremental: {info['mode']}, {info['new_rows']} new rows, "
+              f"recomputed participants: {info['participants_recomputed']}")
+    if len(metrics["mode_report"]):
+        print("\nMode spellings resolved by fuzzy fallback / unmatched:\n", metrics["mode_report"])
+    print("\nCollision rate (per participant):\n", metrics["coll_wide"])
+    print("\nSuccess rate (per participant):\n", metrics["succ_wide"])
+    print("\nMedian safe distance (per participant, successful only):\n", metrics["prec_wide"])
+    if stats["friedman_coll"] is not None: print("\nFriedman (collision):", stats["friedman_coll"])
+    if stats["friedman_prec"] is not None: print("\nFriedman (precision):", stats["friedman_prec"])
+    print("\nPairwise Wilcoxon (collision):\n", stats["pair_coll"])
+    print("\nPairwise Wilcoxon (precision):\n", stats["pair_prec"])
+
+def run(csv_path, outdir=None, deltas=PRECISION_DELTAS, streaming=False,
+        incremental=False, chunk_rows=CHUNK_ROWS, cache_dir=CACHE_DIR,
+        n_boot=N_BOOT, seed=RNG_SEED, na_as_blank=EXPORT_NA_AS_BLANK,
+        simple_plots=SIMPLE_PLOTS, plots=True, workers=None, verbose=True, curves=False,
+        profile=None, trace_memory=False, ci_method=CI_METHOD, store=STORE_PATH, swarm=SWARM):
+    """
+    完整流程：load → normalize → metrics → stats → export → plot；返回 (outdir, metrics, stats)。
+    curves=True 时在 CURVE_DELTAS（0–10 cm，1 mm 步长）上另外导出 Precision@delta 曲线表与曲线图。
+    各阶段的耗时/CPU/RSS 峰值/行数写入 outdir/run_manifest.json（见 instrument.recording）；
+    trace_memory=True 时另用 tracemalloc 统计各阶段峰值内存（明显变慢）；
+    profile 为阶段名时该阶段另存 cProfile 结果 outdir/profile_<stage>.prof。
+    store 不为 None 时结果另写入该 SQLite 结果库（run_id 记在 manifest 的 store 字段）。
+    swarm 控制图中个体层的画法；参与者很多时（plots.LARGE_N 以上）默认改为分箱密度条，
+    热力图合并相邻参与者，图的大小与绘制时间不随 N 增长。
+    """
+    if outdir is None:
+        outdir = f"results_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    os.makedirs(outdir, exist_ok=True)
+
+    config = {"deltas": list(deltas), "streaming": streaming, "incremental": incremental,
+              "chunk_rows": chunk_rows, "cache_dir": cache_dir, "n_boot": n_boot, "seed": seed,
+              "ci_method": ci_method,
+              "simple_plots": simple_plots, "plots": plots, "workers": workers, "curves": curves,
+              "swarm": swarm}
+    with recording("objective", outdir, profile=profile, trace_memory=trace_memory,
+                   inputs={"csv": os.path.abspath(csv_path)}, config=config) as manifest:
+        metrics = compute_metrics(csv_path, deltas, streaming=streaming,
+                                  chunk_rows=chunk_rows, cache_dir=cache_dir,
+                                  incremental=incremental,
+                                  curve_deltas=CURVE_DELTAS if curves else None)
+        stats = compute_stats(metrics, n_boot=n_boot, seed=seed, ci_method=ci_method,
+                              workers=workers)
+        with stage("export"):
+            export_tables(outdir, metrics, stats, na_as_blank=na_as_blank, curves=curves)
+        if store is not None:
+            with stage("store"):
+                manifest["store"] = {"path": os.path.abspath(store), "run_id": save_results(
+                    store, csv_path, outdir, metrics, stats, config, cache_dir,
+                    started=manifest["started"])}
+        if plots:
+            with stage("plot") as st:
+                st.update(plot_figures(outdir, metrics, stats, simple=simple_plots, seed=seed,
+                                       cache_dir=cache_dir, workers=workers, curves=curves,
+                                       swarm=swarm))
+    if verbose:
+        print_summary(outdir, metrics, stats)
+        print("\nRun manifest:", os.path.join(outdir, MANIFEST_NAME))
+        if store is not None:
+            print(f"Results store: {store} (run {manifest['store']['run_id']})")
+    return outdir, metrics, stats
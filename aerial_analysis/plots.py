@@ -0,0 +1,192 @@
+# plots.py
+# Figure helpers for both analyses.  This is the only module that imports
+# matplotlib; the pipelines import it lazily from their plot stage.
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+from .bootstrap import bootstrap_ci_table
+
+LARGE_N = 60              # swarm="auto" 时参与者数超过此值改画分箱密度条，不再逐点画
+SWARM_BINS = 40           # 密度条的分箱数（所有条件共用同一组箱边界）
+HEATMAP_MAX_ROWS = 50     # 热力图最多画这么多行；参与者更多时相邻参与者合并为一行（取均值）
+HEATMAP_MAX_HEIGHT = 12   # 热力图高度上限（英寸）
+
+# ---------- 大 N 辅助 ----------
+def _swarm_style(swarm, n):
+    """"auto" -> n <= LARGE_N 时 "points"，否则 "density"；其它值原样返回"""
+    if swarm == "auto":
+        return "points" if n <= LARGE_N else "density"
+    if swarm not in ("points", "density"):
+        raise ValueError(f"unknown swarm style {swarm!r}")
+    return swarm
+
+def _point_layer(ax, x, columns, rng, s, alpha, n):
+    """个体散点（jitter）；点多时栅格化（矢量输出里只是一张位图）"""
+    for i, y in zip(x, columns):
+        jitter = (rng.random(len(y)) - 0.5) * 0.18
+        ax.scatter(np.full_like(y, i) + jitter, y, s=s, alpha=alpha, color="grey",
+                   rasterized=n > LARGE_N)
+
+def _density_layer(ax, x, columns, half_width=0.3, bins=SWARM_BINS):
+    """
+    分箱密度条（代替逐点 jitter）：每个条件按共用的箱边界做直方图，画成以 x 为中心、
+    左右对称的阶梯轮廓，最宽处为 half_width（各条件按同一最大计数缩放）。
+    图元数量只取决于 bins，与参与者数无关；填充层栅格化。
+    """
+    finite = [y[np.isfinite(y)] for y in columns]
+    allv = np.concatenate(finite) if finite else np.empty(0)
+    if not len(allv):
+        return
+    lo, hi = allv.min(), allv.max()
+    if hi <= lo:
+        lo, hi = lo - 0.5, hi + 0.5
+    edges = np.linspace(lo, hi, bins + 1)
+    counts = [np.histogram(y, bins=edges)[0] for y in finite]
+    scale = half_width / max(1, max(c.max() for c in counts))
+    ys = np.repeat(edges, 2)[1:-1]
+    for i, c in zip(x, counts):
+        w = np.repeat(c, 2) * scale
+        ax.fill_betweenx(ys, i - w, i + w, color="grey", alpha=0.45, linewidth=0, rasterized=True)
+
+def heatmap_rows(wide, max_rows=HEATMAP_MAX_ROWS):
+    """
+    热力图的行：参与者不超过 max_rows 时原样返回（标签 P<id>）；否则按原顺序把相邻参与者
+    分成 max_rows 组、每组取各条件的均值（忽略 NaN），标签为 P<首>–P<尾>。返回 (values, labels)。
+    """
+    vals = wide.to_numpy(dtype=float)
+    ids = [str(p) for p in wide.index]
+    if len(ids) <= max_rows:
+        return vals, [f"P{p}" for p in ids]
+    starts = np.array([g[0] for g in np.array_split(np.arange(len(ids)), max_rows)])
+    ok = ~np.isnan(vals)
+    sums = np.add.reduceat(np.where(ok, vals, 0.0), starts, axis=0)
+    counts = np.add.reduceat(ok.astype(int), starts, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    ends = np.r_[starts[1:], len(ids)] - 1
+    return means, [f"P{ids[a]}–P{ids[b]}" for a, b in zip(starts, ends)]
+
+# ---------- Objective (无连线) ----------
+def plot_dot_ci_with_swarm(wide, ylabel, title, out_png, ci_rng=42, ci=None, swarm="auto"):
+    """
+    每个条件一个均值点 + 95%CI；背景是个体散点（jitter）。不连线。
+    wide: index=participant, columns=conditions
+    ci:   bootstrap_ci_table 中该指标的行（index=condition）；None 则现算
+    swarm: "points"=逐点 jitter，"density"=分箱密度条，"auto"=参与者超过 LARGE_N 时用密度条
+    """
+    rng = np.random.default_rng(ci_rng)
+    x = np.arange(len(wide.columns))
+    fig, ax = plt.subplots(figsize=(6.5, 4))
+
+    # 背景个体散点 / 密度条
+    columns = [wide[col].values.astype(float) for col in wide.columns]
+    if _swarm_style(swarm, len(wide)) == "points":
+        _point_layer(ax, x, columns, rng, s=24, alpha=0.45, n=len(wide))
+    else:
+        _density_layer(ax, x, columns)
+
+    # 均值 + 95%CI
+    if ci is None:
+        ci = bootstrap_ci_table({"_": wide}, rng=ci_rng).loc["_"]
+    ci = ci.reindex(wide.columns)
+    means, los, his = (ci[k].values.astype(float) for k in ("mean", "ci_lo", "ci_hi"))
+    yerr = np.vstack([means - los, his - means])
+
+    ax.errorbar(x, means, yerr=yerr, fmt='o', capsize=5, linewidth=1.8)
+    ax.set_xticks(x); ax.set_xticklabels(wide.columns)
+    ax.set_ylabel(ylabel); ax.set_title(title)
+    ax.grid(True, axis='y', alpha=0.2)
+    plt.tight_layout(); plt.savefig(out_png, dpi=220); plt.close()
+
+def plot_heatmap01(wide, title, out_png, cmap="magma", max_rows=HEATMAP_MAX_ROWS):
+    """
+    0..1 范围的热力图（行=participant, 列=condition）。参与者超过 max_rows 时相邻参与者
+    合并为一行（见 heatmap_rows），图高不超过 HEATMAP_MAX_HEIGHT 英寸。
+    """
+    vals, labels = heatmap_rows(wide, max_rows)
+    fig, ax = plt.subplots(figsize=(6, min(0.5*len(labels)+1, HEATMAP_MAX_HEIGHT)))
+    im = ax.imshow(vals, vmin=0, vmax=1, aspect="auto", cmap=cmap, interpolation="nearest")
+    ax.set_yticks(np.arange(len(labels)))
+    ax.set_yticklabels(labels, fontsize=None if len(labels) <= 20 else 6)
+    ax.set_xticks(np.arange(len(wide.columns)))
+    ax.set_xticklabels(list(wide.columns))
+    ax.set_title(title)
+    cbar = plt.colorbar(im, ax=ax)
+    cbar.set_label("Rate (0..1)" if len(labels) == len(wide) else
+                   f"Rate (0..1), mean of ~{len(wide) / len(labels):.0f} participants per row")
+    plt.tight_layout(); plt.savefig(out_png, dpi=220); plt.close()
+
+def plot_safe_distance_box(prec_wide, out_png, rng_seed=42, swarm="auto"):
+    """
+    中位安全距离（成功试次）箱线图 + 个体散点
+    （swarm 同 plot_dot_ci_with_swarm；密度条模式下不画离群点，箱体在密度条之上）
+    """
+    n_contrib = prec_wide.notna().sum(axis=0)
+    plt.figure(figsize=(6.8,4.2))
+    box_data = [prec_wide[c].dropna().values for c in prec_wide.columns]
+    labels   = [f"{c}\n(n={int(n_contrib[c])})" for c in prec_wide.columns]
+    points = _swarm_style(swarm, len(prec_wide)) == "points"
+    plt.boxplot(box_data, tick_labels=labels, showmeans=True, showfliers=points,
+                zorder=3 if not points else None)
+    # 叠加散点 / 密度条
+    x = np.arange(1, len(prec_wide.columns) + 1)
+    if points:
+        _point_layer(plt.gca(), x, box_data, np.random.default_rng(rng_seed), s=22, alpha=0.55,
+                     n=len(prec_wide))
+    else:
+        _density_layer(plt.gca(), x, box_data)
+    plt.ylabel("Median safe distance (m)")
+    plt.title("Median safe distance by condition (successful trials only)")
+    plt.grid(True, axis='y', alpha=0.2)
+    plt.tight_layout()
+    plt.savefig(out_png, dpi=220)
+    plt.close()
+
+def plot_precision_curves(values, deltas, modes, out_png):
+    """
+    Precision@delta 曲线：每个条件一条参与者均值线 ± SE 带。
+    values: [participant, mode, delta] 数组（见 curves.precision_curves）
+    """
+    x = np.asarray(deltas, dtype=float) * 100
+    fig, ax = plt.subplots(figsize=(6.8, 4.2))
+    for j, mode in enumerate(modes):
+        y = values[:, j, :]
+        n = np.sum(~np.isnan(y), axis=0)
+        if not n.any():
+            continue
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.nansum(y, axis=0) / n
+            se = np.sqrt(np.nansum((y - mean) ** 2, axis=0) / (n - 1) / n)
+        line, = ax.plot(x, mean, linewidth=1.8, label=f"{mode} (n={int(n.max())})")
+        ax.fill_between(x, mean - se, mean + se, color=line.get_color(), alpha=0.18, linewidth=0)
+    ax.set_xlabel("Threshold δ (cm)"); ax.set_ylabel("Precision @ ≤δ (0..1)")
+    ax.set_ylim(0, 1); ax.set_title("Precision vs threshold (mean ± SE)")
+    ax.grid(True, alpha=0.2); ax.legend(frameon=False)
+    plt.tight_layout(); plt.savefig(out_png, dpi=220); plt.close()
+
+# ---------- Subjective ----------
+def save_boxplot(df_long, value_col, title, outpath, order=("None","Color","Audio","Gamepad")):
+    plt.figure()
+    data = [df_long.loc[df_long["condition"] == c, value_col].dropna().values for c in order if c in df_long["condition"].unique()]
+    labels = [c for c in order if c in df_long["condition"].unique()]
+    plt.boxplot(data, tick_labels=labels, showmeans=True)
+    plt.title(title)
+    plt.ylabel(value_col)
+    plt.tight_layout()
+    plt.savefig(outpath, dpi=200)
+    plt.close()
+
+def save_bar_mean_sd(df_long, metric, outpath, order=("Color","Audio","Gamepad")):
+    """柱状图（均值±SD）"""
+    m = df_long.groupby("condition")[metric].mean().reindex(list(order))
+    s = df_long.groupby("condition")[metric].std().reindex(list(order))
+    x = np.arange(len(m))
+    plt.figure()
+    plt.bar(x, m.values, yerr=s.values, capsize=5)
+    plt.xticks(x, list(order))
+    plt.ylabel(metric)
+    plt.title(f"{metric} (mean ± SD)")
+    plt.tight_layout()
+    plt.savefig(outpath, dpi=200)
+    plt.close()
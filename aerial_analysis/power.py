@@ -0,0 +1,145 @@
+# power.py
+# Monte Carlo power analysis for the repeated-measures design: simulated
+# (replicate x participant x condition) cubes go through the same batch engine
+# as friedman_on_complete / pairwise_wilcoxon (zero differences dropped, exact
+# signed-rank tables, sign test when too few pairs remain), and the share of
+# significant replicates is reported per test over a grid of participant counts.
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .modes import CONDITION_ORDER
+from .stats import batch_friedman, batch_signed_rank, bonferroni, holm_last, sign_test_batch
+
+N_GRID = [8, 12, 16, 20, 24, 32, 40]
+N_REPS = 2000
+REPS_CHUNK = 500              # 每个任务（一个进程一次）模拟的重复数
+POOL_MIN_CELLS = 2 * 10**6    # 重复数 × 人数 × 条件数 的总量超过此值才开进程池
+ALPHA = 0.05
+TARGET_POWER = 0.8
+
+# ---------- 模拟 ----------
+def correlation_matrix(corr, k):
+    """标量 -> 复合对称相关阵（对角为 1）；否则按 k×k 矩阵校验后原样返回"""
+    if np.ndim(corr) == 0:
+        return np.full((k, k), float(corr)) + (1 - float(corr)) * np.eye(k)
+    corr = np.asarray(corr, float)
+    if corr.shape != (k, k) or not np.allclose(corr, corr.T):
+        raise ValueError(f"correlation must be a scalar or a symmetric {k}x{k} matrix")
+    return corr
+
+def simulate_cube(n, reps, means, corr=0.5, sd=1.0, kind="normal", trials=20, decimals=None,
+                  rng=None):
+    """
+    模拟 reps 个重复测量数据集 -> cube[replicate, participant, condition]。
+    每人的条件间潜变量 ~ N(0, sd² · R)，R 由 corr 给出（标量为复合对称）。
+    kind="normal": 值 = means + 潜变量（decimals 不为 None 时取整，制造结，如 TLX 的整数分）；
+    kind="rate":   means 为各条件的失败概率，潜变量加在 logit 上，值 = Binomial(trials, p) / trials
+                   （与每人每条件的碰撞率同口径，零差与结都很常见）。
+    """
+    rng = np.random.default_rng(rng)
+    means = np.asarray(means, float)
+    k = len(means)
+    chol = np.linalg.cholesky(correlation_matrix(corr, k))
+    z = sd * rng.standard_normal((reps, n, k)) @ chol.T
+    if kind == "normal":
+        x = means + z
+        return x if decimals is None else np.round(x, decimals)
+    if kind == "rate":
+        if ((means <= 0) | (means >= 1)).any():
+            raise ValueError("rate means must lie strictly between 0 and 1")
+        p = 1 / (1 + np.exp(-(np.log(means / (1 - means)) + z)))
+        return rng.binomial(trials, p) / trials
+    raise ValueError(f"unknown kind {kind!r}")
+
+# ---------- 批量检验 ----------
+def replicate_pvalues(cube, correction="bonferroni"):
+    """
+    每个重复上与 compute_stats 相同的检验（stats.batch_friedman / batch_signed_rank(method="exact")）：
+    返回 (pairs, friedman_p[rep], pair_p[rep, pair])。pair_p 为条件对数内校正后的 Wilcoxon p；
+    非零差值少于 2 对时 Wilcoxon 不报，按 pairwise_wilcoxon 的做法回退到符号检验（同样校正）。
+    """
+    fr = batch_friedman(cube)
+    pairs, pw = batch_signed_rank(cube, method="exact")
+    low = pw["n"] < 2
+    p = np.where(low, sign_test_batch(pw["pos"], pw["neg"]), pw["p"])
+    if correction == "bonferroni":
+        p = bonferroni(p, max(1, len(pairs)))
+    elif correction == "holm":
+        p = holm_last(p)
+    elif correction != "none":
+        raise ValueError(f"unknown correction {correction!r}")
+    return pairs, fr["pvalue"], p
+
+def _power_chunk(job):
+    """一个任务：模拟 job["m"] 个重复并计数各检验显著的次数"""
+    cube = simulate_cube(job["n"], job["m"], rng=job["seed"], **job["model"])
+    _, fp, pp = replicate_pvalues(cube, job["correction"])
+    alpha = job["alpha"]
+    f_sig = fp < alpha
+    p_sig = pp < alpha
+    if job["protected"]:
+        p_sig &= f_sig[:, None]
+    return {"n": job["n"], "reps": job["m"], "friedman": int(f_sig.sum()),
+            "pairs": p_sig.sum(axis=0), "any_pair": int(p_sig.any(axis=1).sum())}
+
+def power_grid(ns=N_GRID, reps=N_REPS, means=None, corr=0.5, sd=1.0, kind="normal", trials=20,
+               decimals=None, conditions=CONDITION_ORDER, alpha=ALPHA, correction="bonferroni",
+               protected=False, seed=0, workers=None, chunk=REPS_CHUNK):
+    """
+    每个 N 模拟 reps 个数据集，返回长表 n, test, A, B, reps, power, se：
+    test 为 friedman / pairwise（每个条件对一行）/ any_pairwise（至少一对显著）。
+    protected=True 时成对比较只在 Friedman 显著的重复里计为显著。
+    重复按 chunk 分块，每块一个独立子种子（结果与 workers 无关）；总量大时分给 workers 个进程。
+    """
+    conditions = list(conditions)
+    if means is None:
+        raise ValueError("means (one per condition) are required")
+    if len(means) != len(conditions):
+        raise ValueError(f"{len(means)} means for {len(conditions)} conditions")
+    model = {"means": [float(m) for m in means], "corr": corr, "sd": sd, "kind": kind,
+             "trials": trials, "decimals": decimals}
+    jobs = [{"n": int(n), "m": min(chunk, reps - start), "model": model, "alpha": alpha,
+             "correction": correction, "protected": protected}
+            for n in ns for start in range(0, reps, chunk)]
+    for job, child in zip(jobs, np.random.SeedSequence(seed).spawn(len(jobs))):
+        job["seed"] = child
+
+    cells = sum(job["m"] * job["n"] for job in jobs) * len(conditions)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(jobs))
+    if workers <= 1 or cells < POOL_MIN_CELLS:
+        parts = [_power_chunk(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_power_chunk, jobs))
+
+    pairs = list(itertools.combinations(conditions, 2))
+    rows = []
+    for n in ns:
+        mine = [part for part in parts if part["n"] == n]
+        total = sum(part["reps"] for part in mine)
+        hits = [("friedman", "", "", sum(part["friedman"] for part in mine))]
+        counts = np.sum([part["pairs"] for part in mine], axis=0)
+        hits += [("pairwise", a, b, int(c)) for (a, b), c in zip(pairs, counts)]
+        hits.append(("any_pairwise", "", "", sum(part["any_pair"] for part in mine)))
+        for test, a, b, c in hits:
+            power = c / total
+            rows.append({"n": int(n), "test": test, "A": a, "B": b, "reps": total,
+                         "power": power, "se": np.sqrt(power * (1 - power) / total)})
+    return pd.DataFrame(rows)
+
+def required_n(table, target=TARGET_POWER):
+    """power_grid 的表 -> 每个检验达到 target 功效的最小 N（网格内达不到为 NaN）"""
+    rows = []
+    for (test, a, b), g in table.groupby(["test", "A", "B"], sort=False):
+        ok = g.loc[g["power"] >= target, "n"]
+        rows.append({"test": test, "A": a, "B": b, "target": target,
+                     "n_required": int(ok.min()) if len(ok) else np.nan,
+                     "max_power": g["power"].max()})
+    return pd.DataFrame(rows)
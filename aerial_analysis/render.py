@@ -0,0 +1,122 @@
+# render.py
+# Figure rendering stage: figure jobs are keyed by a hash of their input data,
+# plot parameters and the plotting code, rendered in a process pool with the
+# headless Agg backend, and stored in a figure cache so unchanged figures are
+# copied instead of redrawn.
+
+import hashlib
+import inspect
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from . import instrument
+
+FIGURE_SUBDIR = "figures"
+
+def figure_job(func, out_path, **kwargs):
+    """一个图任务：plots 模块中的函数名 + 输出路径 + 其余参数（数据与绘图参数）"""
+    return {"func": func, "out": out_path, "kwargs": kwargs}
+
+def _digest(obj, h):
+    """把任务参数（DataFrame/Series/ndarray/dict/list/标量）按内容喂给哈希"""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        h.update(type(obj).__name__.encode())
+        h.update(repr(list(obj.index)).encode())
+        if isinstance(obj, pd.DataFrame):
+            h.update(repr(list(obj.columns)).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, np.ndarray):
+        h.update(repr((obj.dtype.str, obj.shape)).encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        h.update(b"{")
+        for k in sorted(obj, key=repr):
+            h.update(repr(k).encode())
+            _digest(obj[k], h)
+        h.update(b"}")
+    elif isinstance(obj, (list, tuple)):
+        h.update(b"[")
+        for v in obj:
+            _digest(v, h)
+        h.update(b"]")
+    else:
+        h.update(repr(obj).encode())
+
+def _plots_source_hash():
+    path = os.path.join(os.path.dirname(__file__), "plots.py")
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def job_key(job, code_hash=None):
+    """图的内容地址：函数名 + 参数内容 + plots.py 源码"""
+    h = hashlib.sha256()
+    h.update((code_hash or _plots_source_hash()).encode())
+    h.update(job["func"].encode())
+    h.update(os.path.splitext(job["out"])[1].encode())
+    _digest(job["kwargs"], h)
+    return h.hexdigest()
+
+def _use_headless():
+    import matplotlib
+    matplotlib.use("Agg")
+
+def _render_one(job, target, trace=False):
+    """在当前进程里画一张图到 target（先写临时文件再改名）；返回 (target, 耗时/内存)"""
+    _use_headless()
+    from . import plots
+
+    func = getattr(plots, job["func"])
+    path_arg = "out_png" if "out_png" in inspect.signature(func).parameters else "outpath"
+    root, ext = os.path.splitext(target)
+    tmp = f"{root}.{os.getpid()}.tmp{ext}"
+    _, info = instrument.measured(func, trace=trace, **job["kwargs"], **{path_arg: tmp})
+    os.replace(tmp, target)
+    return target, info
+
+def render_figures(jobs, cache_dir=None, workers=None):
+    """
+    渲染一组图任务。cache_dir 不为 None 时，图按内容哈希存入 cache_dir/figures，
+    命中则直接复制；未命中的任务在进程池（Agg 后端）中并行绘制。
+    workers: 进程数（None=CPU 数；<=1 则在本进程内顺序绘制）。
+    返回 {"rendered": n, "cached": m}；正在记录的 run 里每张图记一条 figure:<文件名>。
+    """
+    code_hash = _plots_source_hash()
+    fig_dir = os.path.join(cache_dir, FIGURE_SUBDIR) if cache_dir is not None else None
+    if fig_dir is not None:
+        os.makedirs(fig_dir, exist_ok=True)
+
+    todo, cached = [], 0
+    for job in jobs:
+        if fig_dir is None:
+            todo.append((job, job["out"]))
+            continue
+        ext = os.path.splitext(job["out"])[1]
+        target = os.path.join(fig_dir, job_key(job, code_hash) + ext)
+        if os.path.exists(target):
+            shutil.copyfile(target, job["out"])
+            cached += 1
+            instrument.add_record(f"figure:{os.path.basename(job['out'])}", cached=True)
+        else:
+            todo.append((job, target))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(todo))
+    trace = instrument.tracing()
+    if workers <= 1:
+        done = [_render_one(job, target, trace) for job, target in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_use_headless) as pool:
+            jobs_, targets = zip(*todo)
+            done = list(pool.map(_render_one, jobs_, targets, [trace] * len(todo)))
+
+    for (job, _), (target, info) in zip(todo, done):
+        if target != job["out"]:
+            shutil.copyfile(target, job["out"])
+        instrument.add_record(f"figure:{os.path.basename(job['out'])}", cached=False,
+                              worker=workers > 1, **info)
+    return {"rendered": len(todo), "cached": cached}
@@ -0,0 +1,294 @@
+# stats.py
+# Friedman and pairwise Wilcoxon/sign tests.  The batch engine stacks every
+# metric into one (metric x participant x condition) array and computes ranks,
+# Friedman chi-square, Kendall's W and all pairwise signed-rank statistics in
+# single array operations, with Bonferroni/Holm both within each metric and
+# across the whole family of tests.  Exact p-values come from the memoized
+# distributions in exact_tables; scipy.special only supplies chi2/normal tails.
+
+import itertools
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .exact_tables import binom_half_cdf, signed_rank_cdf
+
+PERMUTATION_MAX_N = 13   # 与 scipy.stats.wilcoxon(method="auto") 相同：有结/零差且 n<=13 时做精确置换
+EXACT_MAX_N = 50         # 无结无零差时精确分布查表的上限（超过走正态近似）
+
+class FriedmanchisquareResult(namedtuple("FriedmanchisquareResult", "statistic pvalue")):
+    """与 scipy 的同名结果相同（字段、repr，txt 输出不变）；另带 n / k / kendall_w 属性"""
+
+def _friedman_result(stat, p, n, k, w):
+    res = FriedmanchisquareResult(np.float64(stat), np.float64(p))
+    res.n, res.k, res.kendall_w = int(n), int(k), float(w)
+    return res
+
+# ---------- 数组构造 ----------
+def pivot_cube(df_long, value_cols, cond_col="condition", pid_col="participant", order=None):
+    """
+    长表一次透视 -> (cube[metric, participant, condition], 每个指标的宽表 {col: DataFrame})。
+    条件按 order 排（只保留出现过的）；宽表与逐列 df_long.pivot 的结果相同（保留整数 dtype）。
+    """
+    value_cols = list(value_cols)
+    wide = df_long.pivot(index=pid_col, columns=cond_col, values=value_cols)
+    present = set(wide.columns.get_level_values(1))
+    conds = [c for c in (order or sorted(present)) if c in present]
+    wide = wide.reindex(columns=pd.MultiIndex.from_product([value_cols, conds]))
+    cube = wide.to_numpy(float).reshape(len(wide), len(value_cols), len(conds)).transpose(1, 0, 2)
+    pivots = {}
+    for c in value_cols:
+        pv = wide[c]
+        if not pv.isna().to_numpy().any():                    # 多列透视会统一成 float，无缺失时还原
+            pv = pv.astype(df_long[c].dtype)
+        pv.columns.name = cond_col
+        pivots[c] = pv
+    return cube, pivots
+
+def stack_wide(tables):
+    """{name: 宽表}（相同的 participant 索引与条件列）-> cube[metric, participant, condition]"""
+    first = next(iter(tables.values()))
+    return np.stack([t.reindex(index=first.index, columns=first.columns).to_numpy(float)
+                     for t in tables.values()])
+
+# ---------- 向量化秩 ----------
+def rank_last(a):
+    """
+    沿最后一轴的平均秩（1 起，与 scipy.stats.rankdata(method='average') 一致），NaN 不参与排名。
+    返回 (ranks, ties)：ties 为每个元素所在结组的大小（NaN 处秩为 NaN、结组为 0）。
+    """
+    a = np.asarray(a, float)
+    L = a.shape[-1]
+    order = np.argsort(a, axis=-1, kind="mergesort")          # NaN 排在最后
+    s = np.take_along_axis(a, order, -1)
+    idx = np.broadcast_to(np.arange(L), s.shape)
+    new = np.ones(s.shape, bool)
+    new[..., 1:] = s[..., 1:] != s[..., :-1]
+    end = np.ones(s.shape, bool)
+    end[..., :-1] = new[..., 1:]
+    first = np.maximum.accumulate(np.where(new, idx, 0), axis=-1)
+    last = np.minimum.accumulate(np.where(end, idx, L - 1)[..., ::-1], axis=-1)[..., ::-1]
+    ranks, ties = np.empty(a.shape), np.empty(a.shape)
+    np.put_along_axis(ranks, order, 0.5 * (first + last) + 1, -1)
+    np.put_along_axis(ties, order, (last - first + 1).astype(float), -1)
+    missing = np.isnan(a)
+    ranks[missing], ties[missing] = np.nan, 0
+    return ranks, ties
+
+# ---------- Friedman ----------
+def batch_friedman(cube):
+    """
+    每个指标在完整行（该指标所有条件都有值）上的 Friedman 检验，一次算完。
+    返回 dict of arrays（长度 = 指标数）：n, k, statistic, pvalue, kendall_w；
+    n<2 或 k<3 的指标为 NaN。统计量与 scipy.stats.friedmanchisquare 逐位相同（含结校正）。
+    """
+    from scipy.special import chdtrc
+    M, _, k = cube.shape
+    complete = ~np.isnan(cube).any(axis=2)                       # [M, N]
+    n = complete.sum(axis=1)
+    ranks, ties = rank_last(cube)
+    ranks = np.where(complete[:, :, None], ranks, 0.0)
+    tie_sum = np.where(complete[:, :, None], ties * ties - 1, 0.0).sum(axis=(1, 2))
+    ok = (n >= 2) & (k >= 3)
+    n_ = np.where(ok, n, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        c = 1 - tie_sum / (k * (k * k - 1) * n_)
+        ssbn = (ranks.sum(axis=1) ** 2).sum(axis=1)
+        stat = (12.0 / (k * n_ * (k + 1)) * ssbn - 3 * n_ * (k + 1)) / c
+        p = chdtrc(k - 1, stat)
+        w = stat / (n_ * (k - 1))
+    nan = np.full(M, np.nan)
+    return {"n": n, "k": np.full(M, k), "statistic": np.where(ok, stat, nan),
+            "pvalue": np.where(ok, p, nan), "kendall_w": np.where(ok, w, nan)}
+
+# ---------- 成对符号秩 ----------
+def _tied_signed_rank_p(ranks, r_plus):
+    """有结时 W+ 的精确置换分布（2^n 种符号翻转，秩按 2 倍化为整数）下的双侧 p"""
+    pmf = np.array([1.0])
+    for r in np.rint(2 * ranks).astype(int):
+        nxt = np.zeros(len(pmf) + r)
+        nxt[:len(pmf)] += pmf
+        nxt[r:] += pmf
+        pmf = nxt * 0.5
+    t = int(round(2 * r_plus))
+    return float(min(1.0, 2 * min(pmf[:t + 1].sum(), pmf[t:].sum())))
+
+def batch_signed_rank(cube, method="exact"):
+    """
+    所有指标 × 所有条件对的 Wilcoxon 符号秩检验（完整行上，丢弃零差），一次算完。
+    method="exact": 精确分布查表，有结时 W+ 取整的保守做法（同 exact_tables.signed_rank_test）；
+    method="auto":  与 scipy.stats.wilcoxon 默认行为一致——无结无零差且 n<=50 查表，
+                    有结/零差且 n<=13 做精确置换，否则正态近似（结校正，无连续性校正）。
+    返回 (pairs, dict of [metric, pair] arrays: n_pairs, zeros, pos, neg, n, W, p)。
+    """
+    M, _, C = cube.shape
+    pairs = list(itertools.combinations(range(C), 2))
+    ia, ib = (np.array([q[i] for q in pairs], dtype=int) for i in (0, 1))
+    complete = ~np.isnan(cube).any(axis=2)                       # [M, N]
+    d = cube[:, :, ia] - cube[:, :, ib]                          # [M, N, P]
+    d = np.where(complete[:, :, None], d, np.nan).transpose(0, 2, 1)   # [M, P, N]
+    used = ~np.isnan(d)
+    nz = used & (d != 0)
+    n_pairs = np.broadcast_to(complete.sum(axis=1)[:, None], nz.shape[:2]).copy()
+    zeros = (used & (d == 0)).sum(axis=2)
+    pos, neg = (nz & (d > 0)).sum(axis=2), (nz & (d < 0)).sum(axis=2)
+    n = nz.sum(axis=2)
+    ranks, ties = rank_last(np.where(nz, np.abs(d), np.nan))
+    r_plus = np.where(d > 0, ranks, 0.0).sum(axis=2)
+    r_minus = np.where(d < 0, ranks, 0.0).sum(axis=2)
+    has_ties = (ties > 1).any(axis=2)
+    stat = np.minimum(r_plus, r_minus)
+
+    p = np.full(n.shape, np.nan)
+    if method == "exact":
+        exact, stat = n >= 1, np.where(n >= 1, stat, np.nan)
+    elif method == "auto":
+        small = n_pairs <= EXACT_MAX_N
+        exact = small & ~has_ties & (zeros == 0) & (n >= 1)
+        perm = (n_pairs <= PERMUTATION_MAX_N) & (has_ties | (zeros > 0)) & (n >= 1)
+        asym = ~exact & ~perm & (n >= 1)
+        for m, j in zip(*np.nonzero(perm)):
+            p[m, j] = _tied_signed_rank_p(ranks[m, j][nz[m, j]], r_plus[m, j])
+        if asym.any():
+            from scipy.special import ndtr
+            nn = n.astype(float)
+            t_sum = np.where(nz, ties * ties - 1, 0.0).sum(axis=2)     # Σ(t³-t) over 结组
+            se = np.sqrt((nn * (nn + 1) * (2 * nn + 1) - t_sum / 2) / 24)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                z = (r_plus - nn * (nn + 1) * 0.25) / se
+            p = np.where(asym, np.clip(2 * ndtr(-np.abs(z)), 0, 1), p)
+        stat = np.where(n >= 1, stat, np.nan)
+    else:
+        raise ValueError(f"unknown method {method!r}")
+    # 精确分布查表：按非零对数 n 分组，每组一次取值
+    for k in np.unique(n[exact]):
+        sel = exact & (n == k)
+        cdf = signed_rank_cdf(int(k))
+        total = len(cdf) - 1
+        lower = cdf[np.ceil(r_plus[sel]).astype(int)]
+        upper = cdf[total - np.floor(r_plus[sel]).astype(int)]
+        p[sel] = np.clip(2.0 * np.minimum(lower, upper), 0.0, 1.0)
+    return pairs, {"n_pairs": n_pairs, "zeros": zeros, "pos": pos, "neg": neg, "n": n,
+                   "W": stat, "p": p}
+
+def sign_test_batch(pos, neg):
+    """双侧符号检验 p 值（数组版 exact_tables.sign_test_p）"""
+    pos, neg = np.asarray(pos, int), np.asarray(neg, int)
+    p = np.full(pos.shape, np.nan)
+    tot = pos + neg
+    for k in np.unique(tot[tot > 0]):
+        sel = tot == k
+        p[sel] = np.minimum(1.0, 2.0 * binom_half_cdf(int(k))[np.minimum(pos[sel], neg[sel])])
+    return p
+
+# ---------- 多重比较校正 ----------
+def bonferroni(p, m=None):
+    """Bonferroni；m 默认为非 NaN 的 p 个数"""
+    p = np.asarray(p, float)
+    m = int((~np.isnan(p)).sum()) if m is None else m
+    return np.minimum(1.0, p * m)
+
+def holm(p):
+    """Holm 逐步校正（NaN 不计入、原样保留）"""
+    p = np.asarray(p, float)
+    out = np.full(p.shape, np.nan)
+    ok = np.flatnonzero(~np.isnan(p))
+    order = ok[np.argsort(p[ok], kind="mergesort")]
+    m = len(order)
+    out[order] = np.minimum(1.0, np.maximum.accumulate((m - np.arange(m)) * p[order]))
+    return out
+
+def holm_last(p):
+    """沿最后一轴的 Holm（数组版 holm：每行各自校正，NaN 不计入、原样保留）"""
+    p = np.asarray(p, float)
+    m = (~np.isnan(p)).sum(axis=-1, keepdims=True)
+    order = np.argsort(p, axis=-1, kind="mergesort")          # NaN 排在最后
+    s = np.take_along_axis(p, order, -1)
+    adj = np.minimum(1.0, np.fmax.accumulate((m - np.arange(p.shape[-1])) * s, axis=-1))
+    out = np.empty(p.shape)
+    np.put_along_axis(out, order, adj, -1)
+    out[np.isnan(p)] = np.nan
+    return out
+
+def family_adjust(posthoc, col="p_raw"):
+    """对整个检验族（如全部指标的全部成对比较）做 Bonferroni/Holm，追加 p_bonf_family / p_holm_family"""
+    posthoc = posthoc.copy()
+    p = posthoc[col].to_numpy(float)
+    posthoc["p_bonf_family"] = bonferroni(p)
+    posthoc["p_holm_family"] = holm(p)
+    return posthoc
+
+# ---------- 批量入口 ----------
+def batch_tests(cube, metrics, conditions, method="exact", sign_test=False,
+                pairwise_requires_friedman=False):
+    """
+    一个 cube（[metric, participant, condition]）上的全部检验。返回 (friedman, posthoc)：
+    friedman: {metric: FriedmanResult 或 None}（带 n/k/kendall_w）；
+    posthoc:  长表 metric, A, B, N_pairs[, Zeros_dropped], W, p_raw, p_bonf, p_holm[, p_sign]；
+              p_bonf/p_holm 为指标内校正（条件对数），族内校正见 family_adjust。
+    pairwise_requires_friedman=True 时 Friedman 未能计算的指标不做成对比较。
+    """
+    metrics = list(metrics)
+    fr = batch_friedman(cube)
+    friedman = {m: None if np.isnan(fr["statistic"][i]) else
+                _friedman_result(fr["statistic"][i], fr["pvalue"][i], fr["n"][i], fr["k"][i],
+                                 fr["kendall_w"][i])
+                for i, m in enumerate(metrics)}
+    pairs, pw = batch_signed_rank(cube, method=method)
+    n_pairs, W, p = pw["n_pairs"], pw["W"], pw["p"]
+    if method == "exact":
+        low = pw["n"] < 2                                        # 有效对过少：只报符号检验
+    else:
+        low = n_pairs < 2
+    W, p = np.where(low, np.nan, W), np.where(low, np.nan, p)
+    m_pairs = max(1, len(pairs))
+    rows = []
+    for i, name in enumerate(metrics):
+        if pairwise_requires_friedman and friedman[name] is None:
+            continue
+        block = {"metric": name, "A": [conditions[a] for a, _ in pairs],
+                 "B": [conditions[b] for _, b in pairs], "N_pairs": n_pairs[i]}
+        if sign_test:
+            block["Zeros_dropped"] = pw["zeros"][i]
+        block.update({"W": W[i], "p_raw": p[i], "p_bonf": bonferroni(p[i], m_pairs),
+                      "p_holm": holm(p[i])})
+        if sign_test:
+            block["p_sign"] = sign_test_batch(pw["pos"][i], pw["neg"][i])
+        rows.append(pd.DataFrame(block))
+    cols = ["metric", "A", "B", "N_pairs"] + (["Zeros_dropped"] if sign_test else []) + \
+           ["W", "p_raw", "p_bonf", "p_holm"] + (["p_sign"] if sign_test else [])
+    posthoc = pd.concat(rows, ignore_index=True) if rows else pd.DataFrame(columns=cols)
+    return friedman, posthoc
+
+def friedman_table(friedman):
+    """{metric: FriedmanResult/None} -> 汇总表 metric, n, k, chi2, p, kendall_w"""
+    rows = [{"metric": m, "n": r.n, "k": r.k, "chi2": float(r.statistic), "p": float(r.pvalue),
+             "kendall_w": r.kendall_w} for m, r in friedman.items() if r is not None]
+    return pd.DataFrame(rows, columns=["metric", "n", "k", "chi2", "p", "kendall_w"])
+
+def split_posthoc(posthoc, metrics):
+    """族内长表 -> {metric: 该指标的成对表}（去掉 metric 列，行序不变）"""
+    return {m: posthoc[posthoc["metric"] == m].drop(columns="metric").reset_index(drop=True)
+            for m in metrics}
+
+def join_posthoc(tables):
+    """split_posthoc 的逆：{metric: 成对表} -> 带 metric 首列的长表"""
+    return pd.concat([t.assign(metric=m)[["metric", *t.columns]] for m, t in tables.items()],
+                     ignore_index=True)
+
+# ---------- 单表接口（批量引擎的一个指标） ----------
+def friedman_on_complete(wide_df):
+    """Friedman 检验（仅对完整行）"""
+    complete = wide_df.dropna()
+    friedman, _ = batch_tests(stack_wide({"x": wide_df}), ["x"], list(wide_df.columns))
+    return friedman["x"], complete
+
+def pairwise_wilcoxon(df_wide_complete):
+    """
+    成对 Wilcoxon（两两条件），Bonferroni 校正；
+    丢弃差值为0的配对；如有效样本过少，回退符号检验。
+    """
+    _, posthoc = batch_tests(stack_wide({"x": df_wide_complete}), ["x"],
+                             list(df_wide_complete.columns), sign_test=True)
+    return split_posthoc(posthoc, ["x"])["x"]
@@ -0,0 +1,294 @@
+# store.py
+# Embedded results store (SQLite, standard library only).  Every run of either
+# pipeline adds one row to `runs` (pipeline, time, input fingerprint, config)
+# plus typed rows for the per-participant metric values, Friedman results,
+# pairwise tests and bootstrap CIs, so a metric can be compared across past
+# runs with one query.  Paper-friendly CSVs are exported from it on demand.
+
+import json
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .modes import CONDITION_ORDER
+
+STORE_PATH = "analysis_results.sqlite"   # 两条流程默认写入的结果库；None=不写
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    pipeline    TEXT NOT NULL,
+    started     TEXT NOT NULL,
+    outdir      TEXT,
+    fingerprint TEXT,
+    inputs      TEXT,
+    config      TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_by_fingerprint ON runs (fingerprint);
+CREATE TABLE IF NOT EXISTS metric_values (
+    run_id      INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    metric      TEXT NOT NULL,
+    participant TEXT NOT NULL,
+    condition   TEXT NOT NULL,
+    value       REAL,
+    ord         INTEGER NOT NULL,
+    PRIMARY KEY (run_id, metric, participant, condition)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS values_by_metric ON metric_values (metric, condition, participant);
+CREATE TABLE IF NOT EXISTS friedman (
+    run_id      INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    metric      TEXT NOT NULL,
+    n           INTEGER,
+    k           INTEGER,
+    chi2        REAL,
+    p           REAL,
+    kendall_w   REAL,
+    PRIMARY KEY (run_id, metric)
+);
+CREATE TABLE IF NOT EXISTS pairwise (
+    run_id        INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    metric        TEXT NOT NULL,
+    a             TEXT NOT NULL,
+    b             TEXT NOT NULL,
+    n_pairs       INTEGER,
+    zeros_dropped INTEGER,
+    w             REAL,
+    p_raw         REAL,
+    p_bonf        REAL,
+    p_holm        REAL,
+    p_sign        REAL,
+    p_bonf_family REAL,
+    p_holm_family REAL,
+    PRIMARY KEY (run_id, metric, a, b)
+);
+CREATE INDEX IF NOT EXISTS pairwise_by_metric ON pairwise (metric);
+CREATE TABLE IF NOT EXISTS ci (
+    run_id      INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    metric      TEXT NOT NULL,
+    condition   TEXT NOT NULL,
+    mean        REAL,
+    ci_lo       REAL,
+    ci_hi       REAL,
+    n           INTEGER,
+    PRIMARY KEY (run_id, metric, condition)
+);
+"""
+# 各表的列（metric_values 之外都与 stats 模块的 DataFrame 列一一对应，小写）
+_COLUMNS = {
+    "metric_values": ["metric", "participant", "condition", "value", "ord"],
+    "friedman": ["metric", "n", "k", "chi2", "p", "kendall_w"],
+    "pairwise": ["metric", "a", "b", "n_pairs", "zeros_dropped", "w", "p_raw", "p_bonf",
+                 "p_holm", "p_sign", "p_bonf_family", "p_holm_family"],
+    "ci": ["metric", "condition", "mean", "ci_lo", "ci_hi", "n"],
+}
+# 导出时恢复 stats.batch_tests 的列名
+_PAIRWISE_NAMES = {"a": "A", "b": "B", "n_pairs": "N_pairs", "zeros_dropped": "Zeros_dropped",
+                   "w": "W"}
+
+def connect(path=STORE_PATH):
+    """打开（必要时新建）结果库；返回 sqlite3 连接（外键级联删除已打开）"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    con = sqlite3.connect(path, timeout=30)
+    con.execute("PRAGMA foreign_keys = ON")
+    version = con.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        con.close()
+        raise ValueError(f"{path}: results store schema {version} is newer than this code "
+                         f"({SCHEMA_VERSION})")
+    if version < SCHEMA_VERSION:
+        with con:
+            con.executescript(_SCHEMA)
+            con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return con
+
+# ---------- 写入 ----------
+def wide_long(tables):
+    """{metric: 宽表（index=participant, columns=condition）} -> 长表 metric, participant, condition, value, ord"""
+    parts = []
+    for metric, wide in tables.items():
+        values = wide.to_numpy(float)
+        p, c = np.meshgrid(np.arange(values.shape[0]), np.arange(values.shape[1]), indexing="ij")
+        parts.append(pd.DataFrame({
+            "metric": metric,
+            "participant": np.asarray(wide.index.astype(str))[p.ravel()],
+            "condition": np.asarray(wide.columns.astype(str))[c.ravel()],
+            "value": values.ravel(), "ord": p.ravel()}))
+    if not parts:
+        return pd.DataFrame(columns=_COLUMNS["metric_values"])
+    return pd.concat(parts, ignore_index=True)
+
+def _rows(df, table, run_id):
+    """DataFrame -> executemany 的行（列名不分大小写对应；缺列与缺失值为 NULL），逐列转换"""
+    df = df.rename(columns=str.lower)
+    cols = [[run_id] * len(df)]
+    for c in _COLUMNS[table]:
+        if c not in df.columns:
+            cols.append([None] * len(df))
+        elif pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c]):
+            cols.append(df[c].to_numpy(float).tolist())       # NaN 绑定后即为 NULL
+        else:
+            cols.append(df[c].astype(object).where(df[c].notna(), None).tolist())
+    return zip(*cols)
+
+def save_run(path, pipeline, values, friedman=None, pairwise=None, ci=None, inputs=None,
+             config=None, fingerprint=None, outdir=None, started=None):
+    """
+    一次运行写成一个事务。values: wide_long 的长表；friedman: stats.friedman_table；
+    pairwise: 带 metric 列的成对长表（stats.join_posthoc / family_adjust 的结果）；
+    ci: bootstrap 表（index=(metric, condition)）。返回 run_id。
+    """
+    started = started or datetime.now().isoformat(timespec="seconds")
+    with closing(connect(path)) as con, con:
+        cur = con.execute(
+            "INSERT INTO runs (pipeline, started, outdir, fingerprint, inputs, config) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (pipeline, started, outdir and os.path.abspath(outdir), fingerprint,
+             json.dumps(inputs, default=str), json.dumps(config, default=str)))
+        run_id = cur.lastrowid
+        tables = [("metric_values", values), ("friedman", friedman), ("pairwise", pairwise),
+                  ("ci", None if ci is None else ci.reset_index())]
+        for table, df in tables:
+            if df is None or not len(df):
+                continue
+            cols = _COLUMNS[table]
+            con.executemany(
+                f"INSERT INTO {table} (run_id, {', '.join(cols)}) "
+                f"VALUES (?, {', '.join('?' * len(cols))})", _rows(df, table, run_id))
+    return run_id
+
+def delete_run(path, run_id):
+    with closing(connect(path)) as con, con:
+        con.execute("DELETE FROM runs WHERE run_id = ?", (int(run_id),))
+
+# ---------- 查询 ----------
+def _where(**filters):
+    """{列: 标量/列表/None} -> (WHERE 子句, 参数)"""
+    clauses, params = [], []
+    for col, val in filters.items():
+        if val is None:
+            continue
+        vals = list(val) if isinstance(val, (list, tuple, set, np.ndarray, pd.Index)) else [val]
+        clauses.append(f"{col} IN ({', '.join('?' * len(vals))})")
+        params += [v.item() if isinstance(v, np.generic) else v for v in vals]
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def list_runs(path=STORE_PATH, pipeline=None, fingerprint=None):
+    """runs 表（新的在后）"""
+    where, params = _where(pipeline=pipeline, fingerprint=fingerprint)
+    with closing(connect(path)) as con:
+        return pd.read_sql_query(f"SELECT * FROM runs{where} ORDER BY run_id", con, params=params)
+
+def latest_run(path=STORE_PATH, pipeline=None, fingerprint=None):
+    """最近一次运行的 run_id（没有时为 None）"""
+    runs = list_runs(path, pipeline, fingerprint)
+    return int(runs["run_id"].iloc[-1]) if len(runs) else None
+
+def query(path=STORE_PATH, table="metric_values", run_id=None, metric=None, condition=None,
+          participant=None, pipeline=None, fingerprint=None):
+    """
+    按 run / 指标 / 条件 / 参与者 / 流程 / 输入指纹过滤的一张结果表（各过滤项可为标量或列表），
+    带 runs 的 pipeline、started、fingerprint 列。table: metric_values, friedman, pairwise, ci。
+    """
+    if table not in _COLUMNS:
+        raise ValueError(f"unknown table {table!r}")
+    filters = {"t.run_id": run_id, "t.metric": metric, "r.pipeline": pipeline,
+               "r.fingerprint": fingerprint}
+    if table in ("metric_values", "ci"):
+        filters["t.condition"] = condition
+    if table == "metric_values":
+        filters["t.participant"] = participant
+    where, params = _where(**filters)
+    order = {"metric_values": "t.metric, t.ord, t.condition", "ci": "t.metric, t.condition",
+             "friedman": "t.metric", "pairwise": "t.metric, t.rowid"}[table]
+    sql = (f"SELECT t.run_id, r.pipeline, r.started, r.fingerprint, "
+           f"{', '.join('t.' + c for c in _COLUMNS[table])} "
+           f"FROM {table} t JOIN runs r USING (run_id){where} ORDER BY t.run_id, {order}")
+    with closing(connect(path)) as con:
+        return pd.read_sql_query(sql, con, params=params)
+
+def metric_history(path=STORE_PATH, metric="collision_rate", pipeline=None, fingerprint=None):
+    """
+    一个指标在历次运行中的参与者均值：index=run_id（带 started / fingerprint），columns=condition。
+    在 SQL 里聚合，只读一次索引。
+    """
+    where, params = _where(**{"t.metric": metric, "r.pipeline": pipeline,
+                              "r.fingerprint": fingerprint})
+    sql = ("SELECT t.run_id, r.started, r.fingerprint, t.condition, AVG(t.value) AS mean "
+           f"FROM metric_values t JOIN runs r USING (run_id){where} "
+           "GROUP BY t.run_id, t.condition")
+    with closing(connect(path)) as con:
+        long = pd.read_sql_query(sql, con, params=params)
+    wide = long.pivot(index=["run_id", "started", "fingerprint"], columns="condition",
+                      values="mean")
+    return wide[_condition_order(wide.columns)]
+
+def _condition_order(conds):
+    return [c for c in CONDITION_ORDER if c in conds] + sorted(c for c in conds
+                                                              if c not in CONDITION_ORDER)
+
+def wide_tables(path, run_id):
+    """一次运行的全部指标宽表 {metric: DataFrame}（参与者顺序与写入时相同，条件按 CONDITION_ORDER）"""
+    long = query(path, "metric_values", run_id=run_id)
+    tables = {}
+    for metric, g in long.groupby("metric", sort=False):
+        wide = g.pivot(index=["ord", "participant"], columns="condition", values="value")
+        wide = wide.droplevel("ord")[_condition_order(wide.columns)]
+        wide.index.name, wide.columns.name = "participant", "condition"
+        tables[metric] = wide
+    return tables
+
+# ---------- 导出 ----------
+def report_strings(df, fmt=".3f", na=""):
+    """
+    论文友好格式（整表向量化）：数值按 fmt（printf 风格，如 .3f）格式化，缺失为 na，
+    其它无法转为数值的单元格原样转字符串。
+    """
+    out = {}
+    for c in df.columns:
+        col = df[c]
+        missing = col.isna().to_numpy()
+        try:
+            vals = np.asarray(pd.to_numeric(col, errors="coerce") if col.dtype == object else col,
+                              float)
+        except (TypeError, ValueError):
+            vals = np.full(len(col), np.nan)
+        text = np.char.mod(f"%{fmt}", vals).astype(object)
+        other = np.isnan(vals) & ~missing
+        if other.any():
+            text[other] = col[other].astype(str).to_numpy()
+        text[missing] = na
+        out[c] = text
+    return pd.DataFrame(out, index=df.index, columns=df.columns)
+
+def export_run(path, run_id, outdir, na_as_blank=True, fmt=".3f", na_str="N/A"):
+    """
+    从结果库导出一次运行的论文用 CSV：每个指标的参与者 × 条件宽表（<metric>_per_participant.csv，
+    格式化）、friedman_summary.csv、posthoc_family.csv、bootstrap_mean_ci.csv（有 CI 时）。
+    返回写出的路径列表。
+    """
+    os.makedirs(outdir, exist_ok=True)
+    na = "" if na_as_blank else na_str
+    written = []
+
+    def write(df, name, index):
+        target = os.path.join(outdir, name)
+        df.to_csv(target, index=index)
+        written.append(target)
+
+    for metric, wide in wide_tables(path, run_id).items():
+        write(report_strings(wide, fmt, na), f"{metric}_per_participant.csv", True)
+    meta = ["run_id", "pipeline", "started", "fingerprint"]
+    friedman = query(path, "friedman", run_id=run_id).drop(columns=meta)
+    write(friedman, "friedman_summary.csv", False)
+    pairwise = query(path, "pairwise", run_id=run_id).drop(columns=meta)
+    pairwise = pairwise.dropna(axis=1, how="all").rename(columns=_PAIRWISE_NAMES)
+    write(pairwise, "posthoc_family.csv", False)
+    ci = query(path, "ci", run_id=run_id).drop(columns=meta)
+    if len(ci):
+        write(ci, "bootstrap_mean_ci.csv", False)
+    return written
@@ -0,0 +1,544 @@
+# subjective.py
+# Read the wide-format questionnaire sheet and produce tidy long-format,
+# descriptive stats, Friedman/Wilcoxon tests, and figures.
+
+import glob
+import os
+import re
+import unicodedata
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .coding import code_column, compile_vocabulary
+from .data_cache import cached_table, inputs_fingerprint
+from .instrument import MANIFEST_NAME, recording, stage
+from .modes import CONDITION_ORDER, mode_vocabulary
+from .render import figure_job, render_figures
+from .stats import (batch_tests, family_adjust, friedman_table, join_posthoc, pivot_cube,
+                    split_posthoc)
+from .store import STORE_PATH, save_run, wide_long
+
+OUTROOT = "subjective_results"
+CACHE_DIR = ".analysis_cache"   # 解析后的问卷表按内容指纹缓存；None=每次重读 Excel
+
+# 条件映射（后缀 -> 条件名）
+COND_MAP = {
+    "":  "None",     # 无后缀 -> 基线
+    "2": "Color",
+    "3": "Audio",
+    "4": "Gamepad",
+}
+
+# NASA-TLX 6 维度原始列前缀（和你的表头完全一致）
+TLX_KEYS = [
+    "Mental Demand: How mentally demanding was the task?",
+    "Physical Demand: How physically demanding was the task?",
+    "Temporal Demand: How hurried or rushed was the pace of the task?",
+    "Performance: How successful were you in accomplishing what you were asked to do?",
+    "Effort: How hard did you have to work to accomplish your level of performance?",
+    "Frustration: How insecure, discouraged, irritated, stressed, and annoyed were you?",
+]
+
+# SSQ 7 项（与你的列名一致）
+SSQ_KEYS = [
+    "Nausea",
+    "Eye strain",
+    "Headache",
+    "Dizziness (eyes open)",
+    "Dizziness (eyes closed)",
+    "Blurred vision",
+    "Sweating",
+]
+
+# 三个模态的帮助感知题（注意有 \xa0）
+HELP_COLOR_DIST = "COLOR FEEDBACK: How helpful was this feedback mode in perceiving the distance to the wall? (-7=Extremely worse, 1=Not helpful at all, 7=Extremely helpful)"
+HELP_COLOR_COLL = "COLOR FEEDBACK:\xa0How helpful was this feedback mode in avoiding failure (collision)? (-7=Extremely worse, 1=Not helpful at all, 7=Extremely helpful)"
+
+HELP_AUDIO_DIST = "AUDITORY FEEDBACK: How helpful was this feedback mode in perceiving the distance to the wall? (-7=Extremely worse, 1=Not helpful at all, 7=Extremely helpful)"
+HELP_AUDIO_COLL = "AUDITORY FEEDBACK:\xa0How helpful was this feedback mode in avoiding failure (collision)? (-7=Extremely worse, 1=Not helpful at all, 7=Extremely helpful)"
+
+HELP_HAPTIC_DIST = "HAPTIC FEEDBACK: How helpful was this feedback mode in perceiving the distance to the wall? (-7=Extremely worse, 1=Not helpful at all, 7=Extremely helpful)"
+HELP_HAPTIC_COLL = "HAPTIC FEEDBACK:\xa0How helpful was this feedback mode in avoiding failure (collision)? (-7=Extremely worse, 1=Not helpful at all, 7=Extremely helpful)"
+
+PREF_OPEN_ENDED = "Which feedback mode do you prefer for this task and why? (Open-ended)"
+
+# 开放题编码：偏好的模态用 normalize_modes 的同义词表（modes.mode_vocabulary），理由类别按词前缀匹配
+PREF_EXCLUDED_TERMS = ["control", "nf"]    # 在自由文本里多是普通用词（"better control"），不当作模态
+PREF_REASON_CODES = {
+    "distance":    ["distance", "depth", "how far", "how close", "judge", "proximity", "gap"],
+    "collision":   ["collision", "collid", "crash", "hit", "avoid", "touch"],
+    "distraction": ["distract", "annoy", "intrusive", "overwhelm", "noisy"],
+    "intuitive":   ["intuitiv", "natural", "familiar", "easy to understand"],
+    "salience":    ["notice", "salient", "obvious", "alert", "attention"],
+}
+
+# =============== Helpers ===============
+def get_participant_id(df):
+    # 统一出一个 participant 列
+    if "参与者编号" in df.columns:
+        pid = df["参与者编号"].astype(str).str.strip()
+    elif "ID" in df.columns:
+        pid = df["ID"].astype(str).str.strip()
+    else:
+        pid = pd.Series(np.arange(1, len(df) + 1), index=df.index).astype(str)
+    return pid
+
+def normalize_header(name):
+    """表头规范化：NFKC（NBSP -> 空格）、合并空白、去首尾空格、忽略大小写"""
+    t = unicodedata.normalize("NFKC", str(name)).replace("\xa0", " ")
+    return re.sub(r"\s+", " ", t).strip().casefold()
+
+def configured_keys():
+    """配置里会用到的全部表头：TLX/SSQ × 条件后缀、HELP_* 题目、开放题"""
+    keys = [key + suffix for suffix in COND_MAP for key in TLX_KEYS + SSQ_KEYS]
+    keys += [name for items in HELP_ITEMS.values() for name in items.values()]
+    keys.append(PREF_OPEN_ENDED)
+    return keys
+
+def header_index(columns, keys=None):
+    """
+    表头索引：一次遍历全部表头建立 原名/规范化名 -> 列位置，
+    再把每个配置键（默认 configured_keys()）解析为列位置（先原名，再规范化名）。
+    返回 {"positions": {key: 列位置或 None}, "report": DataFrame}；
+    report 的 status 为 exact / normalized / ambiguous（多列匹配，取第一列）/ unresolved。
+    """
+    exact, norm = {}, {}
+    for pos, c in enumerate(columns):
+        exact.setdefault(c, []).append(pos)
+        norm.setdefault(normalize_header(c), []).append(pos)
+
+    positions, rows = {}, []
+    for key in (configured_keys() if keys is None else keys):
+        if key in positions:
+            continue
+        hits, status = exact.get(key), "exact"
+        if not hits:
+            hits, status = norm.get(normalize_header(key), []), "normalized"
+        if len(hits) > 1:
+            status = "ambiguous"
+        elif not hits:
+            status = "unresolved"
+        positions[key] = hits[0] if hits else None
+        rows.append({"key": key, "status": status, "position": positions[key],
+                     "column": columns[hits[0]] if hits else None,
+                     "candidates": len(hits)})
+    return {"positions": positions, "report": pd.DataFrame(rows)}
+
+def get_column(df, name):
+    # 容忍 NBSP / 空白 / 大小写差异；找不到则返回 None
+    pos = header_index(df.columns, [name])["positions"][name]
+    return df.iloc[:, pos] if pos is not None else None
+
+def friedman_and_wilcoxon_long(df_long, value_col, cond_col="condition", pid_col="participant"):
+    """对重复测量的长表做 Friedman + Wilcoxon（Bonferroni/Holm）；单指标版的 run_all_stats。"""
+    cube, pivots = pivot_cube(df_long, [value_col], cond_col, pid_col, order=CONDITION_ORDER)
+    pivot = pivots[value_col]
+    friedman, posthoc = batch_tests(cube, [value_col], list(pivot.columns), method="auto")
+    return friedman[value_col], split_posthoc(posthoc, [value_col])[value_col], pivot
+
+# =============== 1) Load ===============
+def read_workbook(path, sheet=0, cache_dir=CACHE_DIR):
+    """读取问卷宽表并加 participant 列；read_excel 很慢，按 (文件内容, sheet, COND_MAP) 缓存"""
+    df = cached_table(path, lambda p: pd.read_excel(p, sheet_name=sheet),
+                      config={"sheet": sheet, "cond_map": COND_MAP},
+                      cache_dir=cache_dir, name=f"sheet_{sheet}")
+    df["participant"] = get_participant_id(df)
+    return df
+
+WORKBOOK_EXTS = (".xlsx", ".xlsm", ".xls")
+
+def is_batch(xlsx, sheet=0):
+    """多工作簿 / 多 sheet 输入（目录、通配符、列表，或 sheet 为 None/列表）"""
+    if isinstance(xlsx, (list, tuple)) or isinstance(sheet, (list, tuple)) or sheet is None:
+        return True
+    return os.path.isdir(xlsx) or glob.has_magic(xlsx)
+
+def workbook_paths(sources):
+    """文件 / 目录 / 通配符（或它们的列表）-> 去重后的工作簿路径；跳过 Excel 的锁文件 ~$*"""
+    if isinstance(sources, (str, os.PathLike)):
+        sources = [sources]
+    paths = []
+    for src in map(os.fspath, sources):
+        if os.path.isdir(src):
+            found = sorted(os.path.join(src, f) for f in os.listdir(src))
+        elif glob.has_magic(src):
+            found = sorted(glob.glob(src))
+        else:
+            found = [src]
+        paths += [f for f in found if f.lower().endswith(WORKBOOK_EXTS)
+                  and not os.path.basename(f).startswith("~$")]
+    paths = list(dict.fromkeys(paths))
+    if not paths:
+        raise FileNotFoundError(f"no questionnaire workbooks found in {sources}")
+    return paths
+
+def ingest_sheet(path, sheet=0, cache_dir=CACHE_DIR, source=None):
+    """
+    一个工作表 -> (long, help_long, header report, 开放题原文)。
+    给定 source 时各表都加 source 列；表里没有编号列时 participant 用 "<source>#<行号>"，
+    以免不同表的行号被当成同一个人。
+    """
+    df = read_workbook(path, sheet=sheet, cache_dir=cache_dir)
+    hidx = header_index(df.columns)
+    if source is not None and not {"参与者编号", "ID"} & set(df.columns):
+        df["participant"] = source + "#" + df["participant"]
+    long, help_long = build_long(df, hidx), build_help_long(df, hidx)
+    texts = pref_texts(df, hidx)
+    report = hidx["report"]
+    if source is not None:
+        long.insert(0, "source", source)
+        help_long.insert(0, "source", source)
+        texts.insert(0, "source", source)
+        report = report.assign(source=source)
+    return long, help_long, report, texts
+
+def _merge_sources(frames, items, keys=("participant", "condition")):
+    """
+    拼接各来源的长表；同一 (participant, condition) 来自多个来源时逐题取最后一个非空作答，
+    source 记为全部来源（以 "; " 连接）。只对重复的键做 groupby，其余行原样保留。
+    """
+    table = pd.concat(frames, ignore_index=True)
+    dup = table.duplicated(list(keys), keep=False).to_numpy()
+    if not dup.any():
+        return table
+    merged = (table[dup].groupby(list(keys), sort=False)
+              .agg({"source": lambda s: "; ".join(dict.fromkeys(s)), **{c: "last" for c in items}})
+              .reset_index())
+    first = ~table[list(keys)][dup].duplicated().to_numpy()     # 合并行放在首次出现的位置
+    slots = np.flatnonzero(dup)[first]
+    out = pd.concat([table[~dup], merged.set_index(pd.Index(slots))]).sort_index()
+    return out[table.columns].reset_index(drop=True)
+
+def ingest_workbooks(sources, sheet=0, cache_dir=CACHE_DIR, workers=None):
+    """
+    并行读取多个问卷工作簿 / 工作表并合并成一张长表。
+    sources: 文件、目录、通配符或它们的列表；sheet: 单个 sheet、列表，或 None=每个工作簿的全部 sheet。
+    每个 (工作簿, sheet) 是一个进程池任务（workers<=1 则在本进程内顺序读取），结果按任务顺序拼接。
+    participant 由 get_participant_id 给出；同一人出现在多个来源时逐题取最后一个非空作答。
+    返回 (long, help_long, report, duplicates, texts)；duplicates 列出来自多个来源的 participant，
+    texts 为开放题原文（见 pref_texts，每人一行）。
+    """
+    tasks = []
+    for path in workbook_paths(sources):
+        if sheet is None:
+            sheets = pd.ExcelFile(path).sheet_names
+        else:
+            sheets = list(sheet) if isinstance(sheet, (list, tuple)) else [sheet]
+        tasks += [(path, s, cache_dir, f"{path}::{s}") for s in sheets]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+    if workers <= 1:
+        parts = [ingest_sheet(*t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(ingest_sheet, *zip(*tasks)))
+
+    longs, helps, reports, texts = zip(*parts)
+    long = _merge_sources(longs, [*TLX_ITEMS, *SSQ_ITEMS])
+    long = add_scores(long)
+    help_long = _merge_sources(helps, ["help_distance", "help_collision"])
+    report = pd.concat(reports, ignore_index=True)
+    # 开放题：同一人在多个来源作答时取最后一个非空回答
+    texts = pd.concat(texts, ignore_index=True)
+    answered = texts["pref_text"].notna() & texts["pref_text"].astype(str).str.strip().ne("")
+    texts = (texts.iloc[np.argsort(answered.to_numpy(), kind="stable")]
+             .drop_duplicates("participant", keep="last").sort_index().reset_index(drop=True))
+
+    counts = long.groupby("participant", sort=False)["source"].agg(
+        lambda s: list(dict.fromkeys(x for v in s for x in v.split("; "))))
+    duplicates = pd.DataFrame({"participant": counts.index, "sources": counts.str.join("; "),
+                               "n_sources": counts.str.len()})
+    duplicates = duplicates[duplicates["n_sources"] > 1].reset_index(drop=True)
+    return long, help_long, report, duplicates, texts
+
+# =============== 2) Reshape ===============
+# 长表规格：输出列名 -> 原始列名前缀（实际列名 = 前缀 + COND_MAP 后缀）
+TLX_ITEMS = {f"TLX_{k.split(':')[0]}": k for k in TLX_KEYS}
+SSQ_ITEMS = {f"SSQ_{k}": k for k in SSQ_KEYS}
+
+# 简化版子量表划分（如需严格 SSQ 权重可自行替换）
+# 常见映射（简化示意）：Nausea 子量表（N, SW, …），Oculomotor（ES, H, BV），Disorientation（DO, DC）
+# 这里用直和示意：
+SSQ_SUBSCALES = {
+    "SSQ_Nausea_sub":         ["SSQ_Nausea", "SSQ_Sweating"],
+    "SSQ_Oculomotor_sub":     ["SSQ_Eye strain", "SSQ_Headache", "SSQ_Blurred vision"],
+    "SSQ_Disorientation_sub": ["SSQ_Dizziness (eyes open)", "SSQ_Dizziness (eyes closed)"],
+}
+
+# Helpful（仅三个模态）：条件 -> {输出列名: 原始列名}
+HELP_ITEMS = {
+    "Color":   {"help_distance": HELP_COLOR_DIST,  "help_collision": HELP_COLOR_COLL},
+    "Audio":   {"help_distance": HELP_AUDIO_DIST,  "help_collision": HELP_AUDIO_COLL},
+    "Gamepad": {"help_distance": HELP_HAPTIC_DIST, "help_collision": HELP_HAPTIC_COLL},
+}
+
+def reshape_long(df, blocks, participant_major=False):
+    """
+    声明式宽→长：blocks = {condition: {输出列名: 列位置或 None}}（列位置见 header_index）。
+    每个条件整列取数（数值化；None 为缺列 -> NaN），一次 concat 得到长表，
+    行序为 condition × participant；participant_major=True 时改为 participant × condition。
+    """
+    frames = []
+    for cond, cols in blocks.items():
+        data = {out: (pd.to_numeric(df.iloc[:, pos], errors="coerce") if pos is not None else np.nan)
+                for out, pos in cols.items()}
+        frames.append(pd.DataFrame({"participant": df["participant"], "condition": cond, **data},
+                                   index=df.index))
+    long = pd.concat(frames, ignore_index=True)
+    if participant_major:
+        order = np.arange(len(long)).reshape(len(frames), len(df)).T.ravel()
+        long = long.iloc[order].reset_index(drop=True)
+    return long
+
+def build_long(df, hidx=None):
+    """构建 TLX/SSQ 四条件长表（TLX_overall = 六维均值，SSQ 子量表/总分 = 直和）"""
+    pos = (hidx or header_index(df.columns))["positions"]
+    items = {**TLX_ITEMS, **SSQ_ITEMS}
+    blocks = {cond: {out: pos.get(key + suffix) for out, key in items.items()}  # 无后缀 -> 基线
+              for suffix, cond in COND_MAP.items()}
+    return add_scores(reshape_long(df, blocks))
+
+def add_scores(long):
+    """由题目列计算 TLX_overall 与 SSQ 子量表/总分，并按固定列序返回"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)   # 全缺失的行均值为 NaN
+        long["TLX_overall"] = np.nanmean(long[list(TLX_ITEMS)].to_numpy(float), axis=1)
+    for name, cols in SSQ_SUBSCALES.items():
+        long[name] = np.nansum(long[cols].to_numpy(), axis=1)
+    long["SSQ_total"] = np.nansum(long[list(SSQ_ITEMS)].to_numpy(), axis=1)
+
+    front = [c for c in ("source", "participant", "condition") if c in long.columns]
+    front += [*TLX_ITEMS, "TLX_overall", *SSQ_ITEMS]
+    return long[front + [*SSQ_SUBSCALES, "SSQ_total"]]
+
+def build_help_long(df, hidx=None):
+    """Helpful 长表（仅三个模态；按参与者排列）"""
+    pos = (hidx or header_index(df.columns))["positions"]
+    blocks = {cond: {out: pos.get(name) for out, name in items.items()}
+              for cond, items in HELP_ITEMS.items()}
+    return reshape_long(df, blocks, participant_major=True)
+
+def pref_texts(df, hidx=None):
+    """开放题 PREF_OPEN_ENDED 的原文 -> participant, pref_text（表里没有这一列时全为缺失）"""
+    pos = (hidx or header_index(df.columns))["positions"].get(PREF_OPEN_ENDED)
+    text = df.iloc[:, pos] if pos is not None else pd.Series(np.nan, index=df.index, dtype=object)
+    return pd.DataFrame({"participant": df["participant"].to_numpy(),
+                         "pref_text": text.to_numpy(dtype=object)})
+
+def code_preferences(texts):
+    """
+    开放题编码（coding.code_column：词表预编译为一个正则，整列一次扫描）。texts 为 pref_texts 的表。
+    pref_mode = 最先提到的模态（词表同 normalize_modes），modes_mentioned = 提到的全部模态；
+    pref_status: blank / uncoded（没提到模态）/ single / multiple；reason_<类别> 为是否提到该类理由。
+    """
+    modes = compile_vocabulary(*mode_vocabulary(PREF_EXCLUDED_TERMS))
+    reasons = compile_vocabulary(PREF_REASON_CODES)
+    text = texts["pref_text"]
+    (mode_hits, first), (reason_hits, _) = code_column(text, modes, reasons)
+
+    names = np.array([*modes["codes"], ""], dtype=object)          # 下标 -1 -> ""
+    mentioned = np.full(len(texts), "", dtype=object)
+    for j, name in enumerate(modes["codes"]):
+        mentioned = mentioned + np.where(mode_hits[:, j], "; " + name, "")
+    n_modes = mode_hits.sum(axis=1)
+    blank = (text.isna() | text.astype(str).str.strip().eq("")).to_numpy()
+    status = np.select([blank, n_modes == 0, n_modes == 1], ["blank", "uncoded", "single"],
+                       "multiple")
+    out = texts.drop(columns="pref_text").assign(
+        pref_mode=names[first], modes_mentioned=pd.Series(mentioned).str[2:].to_numpy(),
+        pref_status=status)
+    for j, code in enumerate(reasons["codes"]):
+        out[f"reason_{code}"] = reason_hits[:, j]
+    out["pref_text"] = text.to_numpy()
+    return out
+
+def preference_table(pref):
+    """
+    偏好的描述表（每个条件一行）：n_preferred（最先提到该条件的人数）、n_sole（只提到这一个）、
+    share（占提到任一模态的回答的比例），以及偏好该条件者中各类理由的人数。
+    """
+    reason_cols = [c for c in pref.columns if c.startswith("reason_")]
+    coded = pref[pref["pref_mode"] != ""]
+    table = (coded.assign(n_preferred=1, n_sole=coded["pref_status"].eq("single"))
+             .groupby("pref_mode")[["n_preferred", "n_sole", *reason_cols]].sum()
+             .reindex(CONDITION_ORDER, fill_value=0).astype(int))
+    table.insert(2, "share", table["n_preferred"] / max(len(coded), 1))
+    table.index.name = "condition"
+    return table
+
+# =============== 3) Descriptives & stats ===============
+def tlx_columns(long):
+    return ["TLX_overall"] + [c for c in long.columns if c.startswith("TLX_") and c!="TLX_overall"]
+
+def describe(long, help_long, pref=None):
+    """描述性统计（均值±SD），返回 {name: table}；给出开放题编码 pref 时另有 preference 计数表"""
+    def desc(df_long, cols, order):
+        return df_long.groupby("condition")[cols].agg(["mean","std"]).reindex(order)
+    return {
+        "TLX": desc(long, tlx_columns(long), CONDITION_ORDER),
+        "SSQ": desc(long, [c for c in long.columns if c.startswith("SSQ_")], CONDITION_ORDER),
+        # Helpful（无 None）
+        "helpfulness": desc(help_long, ["help_distance","help_collision"], ["Color","Audio","Gamepad"]),
+        **({"preference": preference_table(pref)} if pref is not None else {}),
+    }
+
+SSQ_TEST_COLS = ["SSQ_total", "SSQ_Nausea_sub", "SSQ_Oculomotor_sub", "SSQ_Disorientation_sub"]
+HELP_TEST_COLS = ["help_distance", "help_collision"]
+
+def run_all_stats(long, help_long):
+    """
+    所有量表的 Friedman + Wilcoxon，返回 {name: (friedman_res, posthoc, pivot)}。
+    每张长表只透视一次成 [量表, 参与者, 条件] 数组，检验在整个数组上一次算完（stats.batch_tests）；
+    posthoc 的 p_bonf/p_holm 为量表内校正，p_bonf_family/p_holm_family 为全部量表整个检验族的校正。
+    """
+    help_only = help_long[help_long["condition"]!="None"]                 # 只在三模态上做
+    blocks = [("scales", long, tlx_columns(long) + SSQ_TEST_COLS, {}),    # TLX overall + 每个维度, SSQ
+              ("help", help_only, HELP_TEST_COLS, {c: f"help_{c}" for c in HELP_TEST_COLS})]
+    friedman, posthoc, pivots = {}, [], {}
+    for block, df_long, cols, rename in blocks:
+        names = [rename.get(c, c) for c in cols]
+        with stage(f"pivot:{block}", rows=len(df_long), metrics=len(cols)):
+            cube, pv = pivot_cube(df_long, cols, order=CONDITION_ORDER)
+        conds = list(pv[cols[0]].columns)
+        with stage(f"friedman+pairwise:{block}", rows=cube.shape[1], metrics=len(cols)):
+            f, ph = batch_tests(cube, names, conds, method="auto")
+        friedman.update(f)
+        posthoc.append(ph)
+        pivots.update({n: pv[c] for c, n in zip(cols, names)})
+    posthoc = split_posthoc(family_adjust(pd.concat(posthoc, ignore_index=True)), list(friedman))
+    return {name: (friedman[name], posthoc[name], pivots[name]) for name in friedman}
+
+# =============== 4) Export ===============
+def export_tables(outdir, long, help_long, desc, stats, hidx=None, pref=None):
+    # 表头解析报告（未解析 / 多列匹配的配置键）
+    if hidx is not None:
+        hidx["report"].to_csv(os.path.join(outdir, "header_resolution.csv"), index=False)
+    # 保存整洁表
+    long.to_csv(os.path.join(outdir, "subjective_long_TLX_SSQ.csv"), index=False)
+    help_long.to_csv(os.path.join(outdir, "subjective_long_helpfulness.csv"), index=False)
+    if pref is not None:
+        pref.to_csv(os.path.join(outdir, "preference_codes_per_participant.csv"), index=False)
+    for name, table in desc.items():
+        table.to_csv(os.path.join(outdir, f"desc_{name}.csv"))
+    # 全部量表：Friedman 汇总（含 Kendall's W）与整个检验族的成对比较
+    friedman_table({name: res for name, (res, _, _) in stats.items()}).to_csv(
+        os.path.join(outdir, "friedman_summary.csv"), index=False)
+    join_posthoc({name: ph for name, (_, ph, _) in stats.items()}).to_csv(
+        os.path.join(outdir, "posthoc_family.csv"), index=False)
+    for name, (friedman_res, posthoc, pivot) in stats.items():
+        pivot.to_csv(os.path.join(outdir, f"pivot_{name}.csv"))
+        if friedman_res is not None:
+            with open(os.path.join(outdir, f"friedman_{name}.txt"), "w") as f:
+                f.write(str(friedman_res))
+        posthoc.to_csv(os.path.join(outdir, f"posthoc_{name}.csv"), index=False)
+
+def save_results(store, sources, outdir, stats, config, cache_dir=CACHE_DIR, started=None):
+    """把本次运行（各量表的参与者 × 条件值、Friedman、成对比较）写进结果库 store，返回 run_id"""
+    fp = inputs_fingerprint(sources, {"sheet": config.get("sheet"), "cond_map": COND_MAP,
+                                      "keys": configured_keys()}, cache_dir)
+    return save_run(
+        store, "subjective", inputs={"workbooks": sources}, config=config, fingerprint=fp,
+        outdir=outdir, started=started,
+        values=wide_long({name: pivot for name, (_, _, pivot) in stats.items()}),
+        friedman=friedman_table({name: res for name, (res, _, _) in stats.items()}),
+        pairwise=join_posthoc({name: ph for name, (_, ph, _) in stats.items()}))
+
+# =============== 5) Plot ===============
+def figure_jobs(outdir, long, help_long):
+    """基本图任务（见 render.figure_job）"""
+    jobs = [
+        # TLX overall 箱线图
+        figure_job("save_boxplot", os.path.join(outdir,"TLX_overall_box.png"),
+                   df_long=long[["condition","TLX_overall"]], value_col="TLX_overall",
+                   title="NASA-TLX overall by condition"),
+        # SSQ total 箱线图
+        figure_job("save_boxplot", os.path.join(outdir,"SSQ_total_box.png"),
+                   df_long=long[["condition","SSQ_total"]], value_col="SSQ_total",
+                   title="SSQ total by condition"),
+    ]
+    # Helpfulness 柱状（均值±SD）
+    for metric, fname in [("help_distance","help_distance_bar.png"),("help_collision","help_collision_bar.png")]:
+        jobs.append(figure_job("save_bar_mean_sd", os.path.join(outdir, fname),
+                               df_long=help_long[["condition", metric]], metric=metric))
+    return jobs
+
+def plot_figures(outdir, long, help_long, cache_dir=CACHE_DIR, workers=None):
+    """进程池并行绘制，未变化的图从缓存复制"""
+    return render_figures(figure_jobs(outdir, long, help_long), cache_dir=cache_dir, workers=workers)
+
+def run(xlsx, sheet=0, outroot=OUTROOT, outdir=None, cache_dir=CACHE_DIR, plots=True,
+        workers=None, verbose=True, profile=None, trace_memory=False, store=STORE_PATH):
+    """
+    完整流程：load → reshape → describe/stats → export → plot；返回 (outdir, long, help_long, stats)。
+    xlsx 为目录 / 通配符 / 列表或 sheet 为 None/列表时按批量模式读取（见 ingest_workbooks），长表多一列 source。
+    各阶段的耗时/CPU/内存/行数写入 outdir/run_manifest.json；profile、trace_memory、store 见 objective.run。
+    """
+    if outdir is None:
+        outdir = os.path.join(outroot, f"run_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(outdir, exist_ok=True)
+
+    duplicates, batch = None, is_batch(xlsx, sheet)
+    sources = [os.path.abspath(p) for p in (workbook_paths(xlsx) if batch else [xlsx])]
+    config = {"sheet": sheet, "cache_dir": cache_dir, "plots": plots, "workers": workers}
+    with recording("subjective", outdir, profile=profile, trace_memory=trace_memory,
+                   inputs={"workbooks": sources}, config=config) as manifest:
+        if batch:
+            with stage("load", mode="batch") as st:
+                long, help_long, report, duplicates, texts = ingest_workbooks(
+                    xlsx, sheet=sheet, cache_dir=cache_dir, workers=workers)
+                st["rows"] = long["participant"].nunique()
+            hidx = {"report": report}
+        else:
+            with stage("load") as st:
+                df = read_workbook(xlsx, sheet=sheet, cache_dir=cache_dir)
+                st["rows"] = len(df)
+            with stage("headers", rows=len(df.columns)):
+                hidx = header_index(df.columns)
+            with stage("reshape", rows=len(df)):
+                long = build_long(df, hidx)
+                help_long = build_help_long(df, hidx)
+                texts = pref_texts(df, hidx)
+
+        with stage("code_preferences", rows=len(texts)):
+            pref = code_preferences(texts)
+        with stage("describe", rows=len(long)):
+            desc = describe(long, help_long, pref)
+        stats = run_all_stats(long, help_long)
+        with stage("export"):
+            export_tables(outdir, long, help_long, desc, stats, hidx, pref)
+            if duplicates is not None and len(duplicates):
+                duplicates.to_csv(os.path.join(outdir, "participant_sources.csv"), index=False)
+        if store is not None:
+            with stage("store"):
+                manifest["store"] = {"path": os.path.abspath(store), "run_id": save_results(
+                    store, sources, outdir, stats, config, cache_dir, started=manifest["started"])}
+        if plots:
+            with stage("plot") as st:
+                st.update(plot_figures(outdir, long, help_long, cache_dir=cache_dir, workers=workers))
+    if verbose:
+        report = hidx["report"]
+        problems = report[report["status"].isin(["unresolved", "ambiguous"])]
+        if len(problems):
+            print(f"\nHeader keys unresolved/ambiguous ({len(problems)}), see header_resolution.csv:")
+            cols = [c for c in ("source", "key", "status", "candidates") if c in problems.columns]
+            print(problems[cols].to_string(index=False))
+        if duplicates is not None:
+            n_src = long["source"].str.split("; ").explode().nunique()
+            print(f"\nIngested {long['participant'].nunique()} participants from {n_src} sheets"
+                  + (f"; {len(duplicates)} appear in several (merged, see participant_sources.csv)"
+                     if len(duplicates) else ""))
+        counts = pref["pref_status"].value_counts()
+        print("\nPreference answers coded: " + ", ".join(
+            f"{counts.get(s, 0)} {s}" for s in ("single", "multiple", "uncoded", "blank"))
+            + " (see preference_codes_per_participant.csv, desc_preference.csv)")
+        print(f"\nDone. Outputs -> {outdir}  (run manifest: {MANIFEST_NAME})")
+        if store is not None:
+            print(f"Results store: {store} (run {manifest['store']['run_id']})")
+        print("\nTip: 在 Results 写法里，'None' 在 helpfulness 中缺失是预期情况（不参与这两道题）。")
+    return outdir, long, help_long, stats
@@ -0,0 +1,185 @@
+# synthetic.py
+# Seeded synthetic inputs with the layout of the real study files: the Unity
+# trial log (messy mode / failure spellings, one block per condition) and the
+# wide questionnaire workbook (COND_MAP suffixes, NBSP headers), plus per-frame
+# trajectory logs.  Used by the benchmark suite and for reproducing slowdowns
+# without participant data.
+
+import numpy as np
+import pandas as pd
+
+from . import subjective as sj
+from .modes import CONDITION_ORDER
+
+# 每个条件的原始拼写及其出现概率（含同义词、大小写/空白变体、需要模糊回退的写法）
+TRIAL_SPELLINGS = {
+    "None":    (["None", "none", " no feedback", "Baseline", "NF", "no-feedback trial"],
+                [0.70, 0.10, 0.08, 0.05, 0.04, 0.03]),
+    "Color":   (["Color", "colour", "Visual ", "color feedback", "COLOR"],
+                [0.75, 0.08, 0.07, 0.05, 0.05]),
+    "Audio":   (["Audio", "sound", "Beeps", "audio cue", " audio"],
+                [0.75, 0.08, 0.07, 0.05, 0.05]),
+    "Gamepad": (["Gamepad", "haptic", "Vibration", "rumble pad", "gamepad "],
+                [0.75, 0.08, 0.07, 0.05, 0.05]),
+}
+FAILURE_SPELLINGS = {True: ["yes", "Yes", "yes ", "YES"], False: ["no", "No", "no ", "NO"]}
+
+# 条件效应：失败概率与成功试次 gap 的中位数（米）
+FAIL_RATE = {"None": 0.30, "Color": 0.20, "Audio": 0.23, "Gamepad": 0.18}
+GAP_MEDIAN = {"None": 0.045, "Color": 0.035, "Audio": 0.038, "Gamepad": 0.033}
+TRIALS_PER_PARTICIPANT = 80
+MISSING_GAP = 0.005          # gap_to_wall 为空的比例
+
+def default_participants(n_trials):
+    """按每人约 TRIALS_PER_PARTICIPANT 个试次估计人数（3..500）"""
+    return int(np.clip(n_trials // TRIALS_PER_PARTICIPANT, 3, 500))
+
+def _spell(rng, idx, table):
+    """每行按概率挑一个原始拼写；idx 为条件下标（对应 CONDITION_ORDER）"""
+    out = np.empty(len(idx), dtype=object)
+    for k, cond in enumerate(CONDITION_ORDER):
+        rows = np.flatnonzero(idx == k)
+        names, p = table[cond]
+        out[rows] = np.asarray(names, dtype=object)[rng.choice(len(names), size=len(rows), p=p)]
+    return out
+
+def _pick(rng, names, n):
+    return np.asarray(names, dtype=object)[rng.integers(0, len(names), n)]
+
+def synth_trials(n_trials, n_participants=None, seed=0, path=None):
+    """
+    合成试次表（participant, mode, failure, gap_to_wall），行按 participant 分块、
+    每人四个条件各一段（条件顺序因人而异）。失败率/gap 有条件效应和个体随机效应。
+    path 不为 None 时写成 CSV。返回 DataFrame（字符串形式，与 Unity 日志一致）。
+    """
+    rng = np.random.default_rng(seed)
+    n_p = n_participants or default_participants(n_trials)
+    n_c = len(CONDITION_ORDER)
+    pid = np.arange(n_trials) * n_p // n_trials
+    start = np.searchsorted(pid, np.arange(n_p))
+    count = np.bincount(pid, minlength=n_p)
+    block = (np.arange(n_trials) - start[pid]) * n_c // count[pid]
+    orders = np.argsort(rng.random((n_p, n_c)), axis=1)
+    cond = orders[pid, block]
+
+    # 个体效应：失败 logit 偏移与 gap 尺度
+    u_fail = rng.normal(0, 0.5, n_p)
+    u_gap = rng.normal(0, 0.2, n_p)
+    base = np.array([FAIL_RATE[c] for c in CONDITION_ORDER])
+    logit = np.log(base / (1 - base))[cond] + u_fail[pid]
+    fail = rng.random(n_trials) < 1 / (1 + np.exp(-logit))
+    med = np.array([GAP_MEDIAN[c] for c in CONDITION_ORDER])[cond] * np.exp(u_gap[pid])
+    gap = np.round(med * np.exp(rng.normal(0, 0.5, n_trials)), 4)
+    gap[fail] = 0.0
+    gap_str = np.char.mod("%.4f", gap).astype(object)
+    gap_str[rng.random(n_trials) < MISSING_GAP] = ""
+
+    failure = np.where(fail, _pick(rng, FAILURE_SPELLINGS[True], n_trials),
+                       _pick(rng, FAILURE_SPELLINGS[False], n_trials))
+    ids = np.char.mod("%d", pid + 1).astype(object)
+    pad = rng.random(n_trials) < 0.05                 # 偶尔带前导空格
+    ids[pad] = " " + ids[pad]
+    df = pd.DataFrame({"participant": ids, "mode": _spell(rng, cond, TRIAL_SPELLINGS),
+                       "failure": failure, "gap_to_wall": gap_str})
+    if path is not None:
+        df.to_csv(path, index=False)
+    return df
+
+# 逐帧轨迹：末端球心沿 +z 靠近 z=WALL_Z 的墙面，Arm 模式下减速微调，偶尔撞墙
+WALL_Z = 2.0
+TIP_RADIUS = 0.15
+FRAME_RATE = 60.0
+
+def synth_trajectories(n_trials, frames_per_trial=600, seed=0, path=None):
+    """
+    合成逐帧轨迹记录（trajectory.RECORD_DTYPE），试次依次排列：每个试次从离墙 0.5–1.5 m 处
+    接近墙面，后半段切换到 Arm 模式，约三分之一的试次贴墙（gap 截到 0、contact=1，desired 压进墙里）。
+    path 不为 None 时写成轨迹文件。返回结构化数组。
+    """
+    from .trajectory import RECORD_DTYPE, write_trajectory
+    rng = np.random.default_rng(seed)
+    n = n_trials * frames_per_trial
+    trial = np.repeat(np.arange(1, n_trials + 1), frames_per_trial)
+    k = np.tile(np.arange(frames_per_trial), n_trials) / frames_per_trial     # 试次内进度 0..1
+    start = rng.uniform(0.5, 1.5, n_trials)[trial - 1]
+    final = rng.normal(0.03, 0.04, n_trials)[trial - 1]          # 最终 gap，<0 即撞墙
+    hover = 0.01 * np.sin(2 * np.pi * rng.uniform(0.2, 0.4, n_trials)[trial - 1] * k
+                          * frames_per_trial / FRAME_RATE)
+    wanted = final + (start - final) * (1 - k) ** 2 + hover     # 操作者想去的位置（可压进墙里）
+    contact = wanted <= 0
+    gap = np.maximum(wanted, 0.0)
+
+    rec = np.zeros(n, RECORD_DTYPE)
+    rec["t"] = np.arange(n) / FRAME_RATE
+    rec["trial"], rec["frame"] = trial, np.arange(n)
+    rec["tip"][:, 0] = rng.normal(0, 0.02, n_trials)[trial - 1]
+    rec["tip"][:, 1] = 1.5
+    rec["tip"][:, 2] = WALL_Z - TIP_RADIUS - gap
+    rec["drone"] = rec["tip"] - np.array([0.0, -0.8, 1.0], np.float32)
+    rec["desired"] = rec["tip"]
+    rec["desired"][:, 2] = WALL_Z - TIP_RADIUS - wanted
+    rec["gap"], rec["contact"], rec["mode"] = gap, contact, k >= 0.5
+    if path is not None:
+        write_trajectory(path, rec)
+    return rec
+
+# 问卷：条件效应（TLX 1..21、SSQ 0..3 的均值偏移）与开放题模板
+TLX_SHIFT = {"None": 2.0, "Color": 0.0, "Audio": 0.5, "Gamepad": -0.5}
+PREF_TEMPLATES = [
+    "I prefer {mode} because it {reason}.",
+    "{mode}, it {reason}",
+    "Probably {mode} - {reason}.",
+    "",
+]
+PREF_REASONS = ["made the distance easier to judge", "was less distracting",
+                "helped me avoid hitting the wall", "felt more natural", "was easier to notice"]
+PREF_SPELLINGS = {"None": ["no feedback", "none"], "Color": ["color", "the visual one"],
+                  "Audio": ["audio", "the sound"], "Gamepad": ["haptic", "vibration"]}
+MISSING_ANSWER = 0.02        # 空答的比例
+
+def _messy_header(name, rng):
+    """随机把一个空格换成 NBSP 或加尾随空格（header_index 的 normalized 解析路径）"""
+    r = rng.random()
+    if r < 0.15 and " " in name:
+        return name.replace(" ", "\xa0", 1)
+    if r < 0.25:
+        return name + " "
+    return name
+
+def synth_questionnaire(n_respondents, seed=0, path=None, messy_headers=True):
+    """
+    合成问卷宽表：ID，每个 COND_MAP 后缀一组 TLX_KEYS + SSQ_KEYS，三个模态的 HELP_* 题，
+    以及 PREF_OPEN_ENDED 开放题。messy_headers=True 时部分表头带 NBSP/尾随空格。
+    path 不为 None 时写成 xlsx。返回 DataFrame。
+    """
+    rng = np.random.default_rng(seed)
+    n = n_respondents
+    cols = {"ID": [f"S{i:05d}" for i in range(1, n + 1)]}
+    u = rng.normal(0, 2.0, n)                         # 个体整体负荷水平
+    for suffix, cond in sj.COND_MAP.items():
+        for key in sj.TLX_KEYS:
+            v = 8 + TLX_SHIFT[cond] + u + rng.normal(0, 3.0, n)
+            cols[key + suffix] = np.clip(np.round(v), 1, 21)
+        for key in sj.SSQ_KEYS:
+            lam = 0.4 + 0.1 * TLX_SHIFT[cond]
+            cols[key + suffix] = np.clip(rng.poisson(max(lam, 0.05), n), 0, 3).astype(float)
+    for cond, items in sj.HELP_ITEMS.items():
+        for name in items.values():
+            cols[name] = np.clip(np.round(4.5 - 0.5 * TLX_SHIFT[cond] + rng.normal(0, 1.5, n)), 1, 7)
+    for name in list(cols)[1:]:
+        cols[name][rng.random(n) < MISSING_ANSWER] = np.nan
+
+    modes = rng.integers(0, len(CONDITION_ORDER), n)
+    templates = rng.integers(0, len(PREF_TEMPLATES), n)
+    reasons = rng.integers(0, len(PREF_REASONS), n)
+    cols[sj.PREF_OPEN_ENDED] = [
+        PREF_TEMPLATES[t].format(mode=PREF_SPELLINGS[CONDITION_ORDER[m]][r % 2],
+                                 reason=PREF_REASONS[r])
+        for m, t, r in zip(modes, templates, reasons)]
+
+    df = pd.DataFrame(cols)
+    if messy_headers:
+        df.columns = ["ID"] + [_messy_header(c, rng) for c in df.columns[1:]]
+    if path is not None:
+        df.to_excel(path, index=False)
+    return df
@@ -0,0 +1,184 @@
+# trajectory.py
+# Per-frame trajectory logs (written by TrajectoryLogger.cs): a 32-byte file
+# header followed by fixed-size little-endian records.  The reader
+# memory-maps the records as a NumPy structured array without copying, and
+# per-trial metrics (minimum gap, time in proximity, approach velocity,
+# contact events) are computed with reduceat over the trial runs.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b"AMTRAJ\x00\x01"
+VERSION = 2
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("version", "<u2"), ("record_size", "<u2"),
+                         ("flags", "<u4"), ("t0_unix", "<f8"), ("reserved", "<u8")])
+# 与 TrajectoryLogger.cs 的 LateUpdate 逐字段对应（8 字节对齐）
+_V1_FIELDS = [
+    ("t", "<f8"),             # 会话内时间（秒，Time.timeAsDouble）
+    ("trial", "<u4"),         # 试次编号
+    ("frame", "<u4"),         # 帧号（Time.frameCount）
+    ("tip", "<f4", (3,)),     # 末端执行器（球心）世界坐标（夹紧后）
+    ("drone", "<f4", (3,)),   # 无人机根节点世界坐标
+    ("gap", "<f4"),           # 球面到最近墙面的距离（米；接触时为 0，未测到为 NaN）
+    ("contact", "u1"),        # EndEffectorNoPenetration.IsContacting
+    ("mode", "u1"),           # 控制模式：0=Drone, 1=Arm
+    ("reserved", "<u2"),
+]
+RECORD_DTYPES = {
+    1: np.dtype(_V1_FIELDS),                                              # 48 字节
+    2: np.dtype(_V1_FIELDS + [("desired", "<f4", (3,)),                   # 夹紧前的期望球心位置
+                              ("reserved2", "<u4")]),                     # 64 字节
+}
+RECORD_DTYPE = RECORD_DTYPES[VERSION]
+MODE_NAMES = ("Drone", "Arm")
+PROXIMITY_M = 0.05        # time_in_proximity 的距离阈值（米）
+APPROACH_WINDOW_S = 0.5   # approach_velocity：最小 gap 之前这段时间内的平均接近速度
+CHUNK_FRAMES = 5_000_000  # 指标按整试次分块计算，临时数组不随文件大小增长
+METRIC_COLUMNS = ["trial", "frames", "t_start", "duration_s", "min_gap", "t_min_gap",
+                  "time_in_proximity_s", "approach_velocity", "contact_events", "arm_time_frac"]
+
+assert HEADER_DTYPE.itemsize == 32 and [d.itemsize for d in RECORD_DTYPES.values()] == [48, 64]
+
+# ---------- 读写 ----------
+def new_header(t0_unix=0.0, version=VERSION):
+    header = np.zeros((), HEADER_DTYPE)
+    header["magic"], header["version"] = MAGIC, version
+    header["record_size"], header["t0_unix"] = RECORD_DTYPES[version].itemsize, t0_unix
+    return header
+
+def read_header(path):
+    """读取并校验文件头（支持 RECORD_DTYPES 中的各版本）；格式不符时 ValueError"""
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_DTYPE.itemsize)
+    if len(raw) < HEADER_DTYPE.itemsize:
+        raise ValueError(f"{path}: too short for a trajectory header")
+    header = np.frombuffer(raw, HEADER_DTYPE)[0]
+    if header["magic"] != MAGIC:
+        raise ValueError(f"{path}: not a trajectory log (bad magic)")
+    dtype = RECORD_DTYPES.get(int(header["version"]))
+    if dtype is None or header["record_size"] != dtype.itemsize:
+        raise ValueError(f"{path}: unsupported trajectory format version {header['version']} "
+                         f"(record size {header['record_size']})")
+    return header
+
+def open_trajectory(path):
+    """
+    把记录区映射为只读结构化数组（零拷贝；rec["tip"] 等字段都是视图），dtype 由文件版本决定
+    （版本 1 没有 desired 字段）。正在写的文件末尾不完整的记录不包括在内。
+    """
+    dtype = RECORD_DTYPES[int(read_header(path)["version"])]
+    n = (os.path.getsize(path) - HEADER_DTYPE.itemsize) // dtype.itemsize
+    if n <= 0:
+        return np.empty(0, dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=HEADER_DTYPE.itemsize, shape=(n,))
+
+def write_trajectory(path, records, t0_unix=0.0, append=False):
+    """
+    把结构化数组写成轨迹文件（版本按 records 的 dtype：RECORD_DTYPES 之一，其它 dtype 转为当前版本）；
+    append=True 时追加到已有文件末尾（版本须一致）。
+    """
+    versions = {d: v for v, d in RECORD_DTYPES.items()}
+    records = np.asarray(records)
+    version = versions.get(records.dtype, VERSION)
+    records = np.asarray(records, RECORD_DTYPES[version])
+    if append and os.path.exists(path):
+        if int(read_header(path)["version"]) != version:
+            raise ValueError(f"{path}: cannot append version {version} records to this file")
+        with open(path, "ab") as f:
+            f.write(records.tobytes())
+        return path
+    with open(path, "wb") as f:
+        f.write(new_header(t0_unix, version).tobytes())
+        f.write(records.tobytes())
+    return path
+
+# ---------- 每试次指标 ----------
+def trial_runs(trial):
+    """
+    试次在记录里应是连续的一段（按时间顺序写入）。返回 (每段起点, 段的试次号)；
+    同一试次出现在多段时 ValueError（先用 np.argsort(trial, kind="stable") 排好）。
+    """
+    trial = np.asarray(trial)
+    if len(trial) == 0:
+        return np.empty(0, np.int64), trial[:0]
+    starts = np.r_[0, np.flatnonzero(trial[1:] != trial[:-1]) + 1]
+    ids = trial[starts]
+    if len(np.unique(ids)) != len(ids):
+        raise ValueError("trial records are not contiguous; sort them by trial first")
+    return starts, ids
+
+def _chunk_metrics(rec, proximity, window):
+    t = rec["t"]
+    gap = rec["gap"].astype(float)
+    contact = rec["contact"].astype(bool)
+    starts, ids = trial_runs(rec["trial"])
+    n = len(t)
+    ends = np.r_[starts[1:], n]
+    seg = np.repeat(np.arange(len(starts)), ends - starts)
+    first = np.zeros(n, bool)
+    first[starts] = True
+
+    # 每帧持续时间 = 到同一试次下一帧的间隔（最后一帧为 0）
+    dt = np.zeros(n)
+    dt[:-1] = np.diff(t)
+    dt[ends - 1] = 0.0
+    duration = np.add.reduceat(dt, starts)
+    near = np.nan_to_num(gap, nan=np.inf) <= proximity
+    in_prox = np.add.reduceat(dt * near, starts)
+    arm_time = np.add.reduceat(dt * (rec["mode"] == 1), starts)
+
+    # 接触事件：接触标志的上升沿（试次第一帧就在接触中也算一次）
+    rising = contact & (first | ~np.r_[False, contact[:-1]])
+    contacts = np.add.reduceat(rising.astype(np.int64), starts)
+
+    # 最小 gap 及其首次出现的帧（NaN 不参与）
+    g = np.where(np.isnan(gap), np.inf, gap)
+    low = np.minimum.reduceat(g, starts)
+    i_min = np.minimum.reduceat(np.where(g == low[seg], np.arange(n), n), starts)
+    min_gap = np.where(np.isinf(low), np.nan, low)
+
+    # 接近速度：最小 gap 之前 window 秒内 gap 的平均下降速度（米/秒，正=靠近）
+    key = seg * (np.ptp(t) + 2 * window + 1.0) + (t - t[starts][seg])    # 各试次时间轴首尾相接
+    j = np.searchsorted(key, key[i_min] - window)
+    j = np.maximum(j, starts)
+    span = t[i_min] - t[j]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        approach = np.where(span > 0, (gap[j] - gap[i_min]) / span, np.nan)
+
+    return pd.DataFrame({
+        "trial": ids.astype(np.int64), "frames": ends - starts, "t_start": t[starts],
+        "duration_s": duration, "min_gap": min_gap, "t_min_gap": t[i_min],
+        "time_in_proximity_s": in_prox, "approach_velocity": approach,
+        "contact_events": contacts,
+        "arm_time_frac": np.where(duration > 0, arm_time / duration, np.nan),
+    })
+
+def trajectory_metrics(rec, proximity=PROXIMITY_M, window=APPROACH_WINDOW_S,
+                       chunk_frames=CHUNK_FRAMES):
+    """
+    每个试次一行：frames, t_start, duration_s, min_gap, t_min_gap,
+    time_in_proximity_s（gap <= proximity 的时长）, approach_velocity, contact_events,
+    arm_time_frac（Arm 控制模式的时间占比）。rec 为 open_trajectory 的结果（或同 dtype 数组）；
+    按整试次切成约 chunk_frames 帧的块计算，内存占用与文件大小无关。
+    """
+    starts, _ = trial_runs(rec["trial"])
+    if len(starts) == 0:
+        return pd.DataFrame(columns=METRIC_COLUMNS)
+    bounds = [0]
+    for s in starts[1:]:
+        if s - bounds[-1] >= chunk_frames:
+            bounds.append(int(s))
+    bounds.append(len(rec))
+    parts = [_chunk_metrics(rec[a:b], proximity, window) for a, b in zip(bounds[:-1], bounds[1:])]
+    return pd.concat(parts, ignore_index=True)
+
+def file_metrics(paths, **kwargs):
+    """多个轨迹文件 -> 合并的每试次指标表（带 source 列）"""
+    tables = []
+    for path in paths:
+        table = trajectory_metrics(open_trajectory(path), **kwargs)
+        table.insert(0, "source", os.path.basename(path))
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)